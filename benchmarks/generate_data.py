@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Generate a synthetic kdini repo: books.db, JSON metadata and kotob/ patches.
+
+Rows are laid out like the real catalog: chapters are one shared topic list,
+and each book has one content row for some of those chapters (a few thousand
+per book). Text is Arabic prose with harakat, plus a Persian translation on
+part of the rows, drawn from a fixed word list so folding, search and SQL
+escaping see realistic input.
+
+The schema is the one build-db produces, and each book's patch is written by
+the same code as export-sql. The same --rows and --seed always give the same
+files; generate() reuses an existing directory when its bench_info.json matches.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "tools"))
+
+import data_ops  # noqa: E402
+
+GENERATOR_VERSION = 1
+INFO_FILE = "bench_info.json"
+ROWS_PER_BOOK = 2000
+MIN_CHAPTERS = 500
+AUDIO_EVERY = 40
+RAW_URL = "https://raw.githubusercontent.com/kerim317gh/kdini/refs/heads/main/kotob/"
+
+ARABIC_WORDS = (
+    "الحمد", "لله", "رب", "العالمين", "كتاب", "الطهارة", "الصلاة", "الزكاة", "الصوم", "الحج", "باب", "فصل",
+    "قال", "رسول", "الله", "صلى", "عليه", "وسلم", "من", "في", "على", "إلى", "عن", "أن", "الماء", "الوضوء",
+    "الغسل", "التيمم", "المسح", "الخفين", "الأذان", "الإمام", "المسجد", "القبلة", "الركوع", "السجود",
+    "الجماعة", "الجمعة", "الجنائز", "البيع", "الربا", "النكاح", "الطلاق", "العدة", "النفقة", "الشهادة",
+    "القاضي", "الوقف", "الهبة", "الوصية", "الميراث", "أبو", "حنيفة", "محمد", "يوسف", "رحمه", "تعالى",
+    "لأن", "لقوله", "وهو", "هذا", "ذلك", "لا", "يجوز", "يكره", "يستحب", "واجب", "فرض", "سنة", "والأصح",
+)
+PERSIAN_WORDS = (
+    "در", "این", "باب", "کتاب", "نماز", "روزه", "زکات", "حج", "وضو", "غسل", "است", "می\u200cشود", "باید",
+    "نمی\u200cشود", "گفته", "شده", "که", "از", "با", "به", "برای", "آن", "را", "و", "هر", "مسلمان", "واجب",
+    "سنت", "مستحب", "مکروه", "حلال", "حرام", "امام", "ابوحنیفه", "فرمود", "پیامبر", "خدا", "حکم", "مسئله",
+    "شرح", "ترجمه", "فصل", "آب", "پاک", "نجس", "وقت", "قبله", "مسجد", "جماعت", "جمعه", "میت", "خرید",
+    "فروش", "ازدواج", "طلاق", "نفقه", "میراث", "وصیت", "قاضی", "شهادت",
+)
+NARRATORS = ("استاد رضا اخوند", "مولوی عبدالله", "قاری محمد", "استاد یوسف", "مولوی احمد")
+AUDIO_LANGS = ("fa", "ar", "tk")
+# fatha, damma, kasra, sukun, shadda
+HARAKAT = ("\u064e", "\u064f", "\u0650", "\u0652", "\u0651")
+LONG_VOWELS = "اويى"
+_STRIP_HARAKAT = str.maketrans("", "", "".join(HARAKAT))
+
+
+def parse_scale(text: str) -> int:
+    """10000, 10k or 1M -> row count."""
+    value = text.strip().lower()
+    factor = 1
+    if value.endswith("k"):
+        value, factor = value[:-1], 1000
+    elif value.endswith("m"):
+        value, factor = value[:-1], 1_000_000
+    rows = int(float(value) * factor)
+    if rows <= 0:
+        raise ValueError(f"scale must be positive: {text}")
+    return rows
+
+
+def scale_label(rows: int) -> str:
+    if rows % 1_000_000 == 0:
+        return f"{rows // 1_000_000}M"
+    if rows % 1000 == 0:
+        return f"{rows // 1000}k"
+    return str(rows)
+
+
+def _arabic(rng: random.Random, words: int) -> str:
+    out: list[str] = []
+    for word in rng.choices(ARABIC_WORDS, k=words):
+        # no haraka on the long vowels, a random one on most other letters
+        out.append(
+            "".join(ch + rng.choice(HARAKAT) if ch not in LONG_VOWELS and rng.random() < 0.6 else ch for ch in word)
+        )
+    return " ".join(out) + "."
+
+
+def _persian(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(PERSIAN_WORDS, k=words)) + "."
+
+
+def _book_sizes(rng: random.Random, rows: int) -> list[int]:
+    books = max(3, round(rows / ROWS_PER_BOOK))
+    weights = [rng.uniform(0.3, 3.0) for _ in range(books)]
+    total = sum(weights)
+    sizes = [max(1, int(rows * w / total)) for w in weights]
+    sizes[0] += rows - sum(sizes)
+    return sizes
+
+
+def _words(rng: random.Random) -> int:
+    # long-tailed like the real books: most rows are a paragraph, a few run to pages
+    return min(2000, max(5, int(rng.lognormvariate(3.7, 0.8))))
+
+
+def _content_rows(
+    rng: random.Random, book_id: int, chapter_ids: list[int], nohareke: bool
+) -> Iterator[tuple[Any, ...]]:
+    for chapter_id in chapter_ids:
+        text = _arabic(rng, _words(rng))
+        text_fa = _persian(rng, _words(rng)) if rng.random() < 0.4 else None
+        yield (chapter_id, book_id, text, text.translate(_STRIP_HARAKAT) if nohareke else None, text_fa)
+
+
+def _write_json(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def _read_info(out_dir: Path) -> dict[str, Any] | None:
+    try:
+        info = json.loads((out_dir / INFO_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return info if isinstance(info, dict) else None
+
+
+def generate(
+    out_dir: Path,
+    rows: int,
+    seed: int = 1,
+    patches: bool = True,
+    indexes: bool = True,
+    log: Callable[[str], None] = print,
+) -> dict[str, Any]:
+    """Create (or reuse) the synthetic repo in out_dir; returns its bench_info.json."""
+    wanted = {"generator": GENERATOR_VERSION, "rows": rows, "seed": seed, "patches": patches, "indexes": indexes}
+    info = _read_info(out_dir)
+    if info is not None and all(info.get(k) == v for k, v in wanted.items()):
+        log(f"{out_dir}: reusing {scale_label(rows)} data set")
+        return info
+    if out_dir.exists() and any(out_dir.iterdir()):
+        if info is None:
+            raise ValueError(f"{out_dir} is not empty and was not made by this generator")
+        shutil.rmtree(out_dir)
+
+    t0 = time.perf_counter()
+    rng = random.Random(seed)
+    sizes = _book_sizes(rng, rows)
+    n_chapters = max(MIN_CHAPTERS, int(max(sizes) * 1.1))
+    sizes = [min(size, n_chapters) for size in sizes]
+    n_categories = max(2, n_chapters // 200)
+    categories = [
+        {"id": c, "title": _persian(rng, 2)[:-1], "sort_order": c, "icon": "assets/icons/knowledge.png"}
+        for c in range(1, n_categories + 1)
+    ]
+    chapters: list[dict[str, Any]] = []
+    parent_id = 0
+    for n in range(n_chapters):
+        chapter_id = n + 1
+        # every tenth chapter is a heading, the next nine hang below it
+        is_heading = n % 10 == 0
+        chapters.append(
+            {
+                "id": chapter_id,
+                "category_id": n * n_categories // n_chapters + 1,
+                "parent_id": 0 if is_heading else parent_id,
+                "title": _arabic(rng, rng.randint(2, 6))[:-1],
+                "icon": "assets/icons/knowledge.png",
+            }
+        )
+        if is_heading:
+            parent_id = chapter_id
+
+    books: list[dict[str, Any]] = []
+    book_chapters: list[list[int]] = []
+    for idx, size in enumerate(sizes):
+        book_id = idx + 1
+        book_chapters.append(sorted(rng.sample(range(1, n_chapters + 1), size)))
+        books.append(
+            {
+                "id": book_id,
+                "title": _arabic(rng, rng.randint(2, 5))[:-1],
+                "description": _persian(rng, rng.randint(10, 30)),
+                "version": f"1.0.{rng.randint(0, 9)}",
+                "sql_download_url": f"{RAW_URL}book_{book_id}.sql",
+                "is_default": 1 if book_id == 1 else 0,
+                "is_downloaded_on_device": 0,
+                "status": rng.choice(("active", "عربی/ ترجمه فارسی", "beta")),
+            }
+        )
+    audio: list[dict[str, Any]] = []
+    for _ in range(max(1, rows // AUDIO_EVERY)):
+        idx = rng.randrange(len(sizes))
+        chapter_id = rng.choice(book_chapters[idx])
+        audio.append(
+            {
+                "kotob_id": idx + 1,
+                "chapters_id": chapter_id,
+                "lang": rng.choice(AUDIO_LANGS),
+                "narrator": rng.choice(NARRATORS),
+                "title": _persian(rng, rng.randint(3, 8))[:-1],
+                "url": f"https://example.invalid/audio/{idx + 1}/{chapter_id}-{len(audio)}.mp3",
+            }
+        )
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _write_json(out_dir / data_ops.BOOKS_JSON, books)
+    _write_json(
+        out_dir / data_ops.STRUCTURE_JSON,
+        {"schema": 1, "data_version": f"bench-{rows}-{seed}", "categories": categories, "chapters": chapters},
+    )
+    _write_json(out_dir / data_ops.AUDIO_JSON, audio)
+
+    db_path = out_dir / "books.db"
+    conn = sqlite3.connect(str(db_path))
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for ddl in data_ops.BUILD_DB_TABLES.values():
+            conn.execute(ddl)
+        conn.executemany(
+            "INSERT INTO kotob VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (b["id"], b["title"], b["description"], b["version"], b["version"], b["sql_download_url"],
+                 b["is_default"], b["is_downloaded_on_device"], b["status"])
+                for b in books
+            ],
+        )
+        conn.executemany("INSERT INTO categories VALUES (:id, :title, :sort_order, :icon)", categories)
+        conn.executemany("INSERT INTO chapters VALUES (:id, :category_id, :parent_id, :title, :icon)", chapters)
+        conn.executemany(
+            "INSERT INTO content_audio (chapters_id, kotob_id, lang, narrator, title, url) "
+            "VALUES (:chapters_id, :kotob_id, :lang, :narrator, :title, :url)",
+            audio,
+        )
+        for idx in range(len(sizes)):
+            conn.executemany(
+                "INSERT INTO content (chapters_id, kotob_id, text, text_nohareke, text_fa) VALUES (?, ?, ?, ?, ?)",
+                _content_rows(rng, idx + 1, book_chapters[idx], nohareke=idx % 3 == 0),
+            )
+        if indexes:
+            for ddl in data_ops.BUILD_DB_INDEXES:
+                conn.execute(ddl)
+        conn.commit()
+        log(f"{db_path}: {sum(sizes)} content rows in {len(sizes)} books ({time.perf_counter() - t0:.1f}s)")
+
+        n_patches = 0
+        if patches:
+            # the columns a real patch carries: everything but the rowid alias
+            cols = [c for c in data_ops._content_columns(conn) if c != "id"]
+            for idx in range(len(sizes)):
+                book_id = idx + 1
+                data_ops._write_export_sql(
+                    conn, cols, book_id, out_dir / "kotob" / f"book_{book_id}.sql",
+                    insert_batch=data_ops.SQL_INSERT_MAX_ROWS,
+                )
+                n_patches += 1
+            log(f"{out_dir / 'kotob'}: {n_patches} patches ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        conn.close()
+
+    info = {
+        **wanted,
+        "content": sum(sizes),
+        "books": len(books),
+        "categories": len(categories),
+        "chapters": len(chapters),
+        "audio": len(audio),
+        "patch_files": n_patches,
+        "largest_book": max(range(len(sizes)), key=lambda i: sizes[i]) + 1,
+        "largest_book_rows": max(sizes),
+        "db_size": db_path.stat().st_size,
+        "seconds": round(time.perf_counter() - t0, 1),
+    }
+    _write_json(out_dir / INFO_FILE, info)
+    return info
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic kdini repo (books.db, JSON metadata, patches)")
+    parser.add_argument("--rows", default="100k", help="content rows, e.g. 10k, 100k, 1M (default: 100k)")
+    parser.add_argument("--out", required=True, help="Output directory (created; replaced if it holds older data)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--no-patches", action="store_true", help="Skip writing kotob/*.sql")
+    parser.add_argument("--no-indexes", action="store_true", help="Leave books.db without the hot-query indexes")
+    args = parser.parse_args()
+
+    try:
+        info = generate(
+            Path(args.out).expanduser().resolve(),
+            parse_scale(args.rows),
+            seed=args.seed,
+            patches=not args.no_patches,
+            indexes=not args.no_indexes,
+        )
+    except (OSError, ValueError, sqlite3.Error) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    print(json.dumps(info, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
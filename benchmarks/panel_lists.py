@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""List-page benchmark for tools/control_panel.py.
+
+Starts the panel in-process on a repo (by default a copy of this one; pass
+--repo to point it at a generate_data.py output) and fetches the books, audio
+and structure list pages: first and last page, a sort and a search, --passes
+times each. Prints per-page latency and how many metadata rows the pages had
+to filter and sort per second.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "tools"))
+
+import control_panel  # noqa: E402
+
+LAST_PAGE = 10**9  # clamped to the last page by the panel
+
+
+class _QuietHandler(control_panel.PanelHandler):
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+
+def list_pages(repo: Path) -> list[tuple[str, int]]:
+    """(path, rows behind the page) for every page fetched in one pass."""
+    books = json.loads((repo / control_panel.BOOKS_JSON_REL).read_text(encoding="utf-8"))
+    audio = json.loads((repo / control_panel.AUDIO_JSON_REL).read_text(encoding="utf-8"))
+    structure = json.loads((repo / control_panel.STRUCTURE_JSON_REL).read_text(encoding="utf-8"))
+    chapters = structure.get("chapters", [])
+    word = urllib.parse.quote("الصلاة")
+    return [
+        ("/books", len(books)),
+        ("/books?sort=-title", len(books)),
+        (f"/books?q={urllib.parse.quote('فارسی')}", len(books)),
+        ("/audio", len(audio)),
+        (f"/audio?page={LAST_PAGE}", len(audio)),
+        ("/audio?sort=narrator&per_page=1000", len(audio)),
+        (f"/audio?q={urllib.parse.quote('استاد')}", len(audio)),
+        ("/structure?section=categories", len(structure.get("categories", []))),
+        ("/structure?section=chapters", len(chapters)),
+        (f"/structure?section=chapters&page={LAST_PAGE}&sort=-title", len(chapters)),
+        (f"/structure?section=chapters&q={word}", len(chapters)),
+    ]
+
+
+def run(repo: Path, passes: int) -> dict[str, object]:
+    pages = list_pages(repo)
+    control_panel.REPO_DIR = repo
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    latencies: dict[str, list[float]] = {path: [] for path, _ in pages}
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for _ in range(passes):
+            for path, n_rows in pages:
+                t0 = time.perf_counter()
+                with urllib.request.urlopen(base + path, timeout=120) as resp:
+                    resp.read()
+                latencies[path].append(time.perf_counter() - t0)
+                rows += n_rows
+    finally:
+        server.shutdown()
+        server.server_close()
+    wall = time.perf_counter() - started
+    return {
+        "passes": passes,
+        "fetches": passes * len(pages),
+        "rows": rows,
+        "seconds": wall,
+        "rows_per_s": rows / wall if wall else 0.0,
+        "pages": [
+            {
+                "path": path,
+                "rows": n_rows,
+                "first_ms": latencies[path][0] * 1000,
+                "best_ms": min(latencies[path]) * 1000,
+            }
+            for path, n_rows in pages
+        ],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the control panel's list pages")
+    parser.add_argument("--repo", default=None, help="Repo with json/ to serve (default: a temp copy of this repo)")
+    parser.add_argument("--passes", type=int, default=5, help="Fetches of every page (default: 5)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="kdini-bench-") as tmp:
+        if args.repo:
+            repo = Path(args.repo).expanduser().resolve()
+        else:
+            repo = Path(tmp)
+            for rel in ("json", "update"):
+                shutil.copytree(REPO_DIR / rel, repo / rel)
+        result = run(repo, max(1, args.passes))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    print(f"{'page':<58} {'rows':>7} {'first ms':>9} {'best ms':>8}")
+    for page in result["pages"]:
+        path = urllib.parse.unquote(page["path"])
+        print(f"{path:<58} {page['rows']:>7} {page['first_ms']:>9.1f} {page['best_ms']:>8.1f}")
+    print(
+        f"{result['fetches']} fetches in {result['seconds']:.2f}s, "
+        f"{result['rows_per_s']:.0f} rows/s filtered and sorted"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Concurrent-save benchmark for tools/control_panel.py.
+
+Copies the JSON metadata into a temp repo (padded with synthetic audio rows),
+starts the panel in-process and lets N client threads save their own audio row
+in a loop. For each concurrency level it prints saves/s and latency, then checks
+that every thread's last save survived and the file still parses.
+
+Saves to one file are serialized by the per-file lock, so saves/s should stay
+roughly flat as threads are added while latency grows linearly; a lost update
+or a torn file is a bug.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "tools"))
+
+import control_panel  # noqa: E402
+
+VERSION_RE = re.compile(r'name="file_version" value="([0-9a-f]+)"')
+
+
+class _QuietHandler(control_panel.PanelHandler):
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+
+def _prepare_repo(dst: Path, rows: int) -> None:
+    for rel in ("json", "update"):
+        shutil.copytree(REPO_DIR / rel, dst / rel)
+    audio_path = dst / control_panel.AUDIO_JSON_REL
+    audio = json.loads(audio_path.read_text(encoding="utf-8"))
+    for n in range(len(audio), rows):
+        audio.append(
+            {
+                "kotob_id": 3,
+                "chapters_id": n,
+                "lang": "fa",
+                "narrator": "bench",
+                "title": f"row {n}",
+                "url": f"https://example.invalid/audio/{n}.mp3",
+            }
+        )
+    audio_path.write_text(json.dumps(audio, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def _post(base: str, path: str, fields: dict[str, str]) -> int:
+    body = urllib.parse.urlencode(fields).encode("utf-8")
+    try:
+        with urllib.request.urlopen(urllib.request.Request(base + path, data=body), timeout=60) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as exc:
+        exc.read()
+        return exc.code
+
+
+def _run_level(base: str, threads: int, seconds: float, versioned: bool) -> dict[str, object]:
+    latencies: list[float] = []
+    last_saved: dict[int, int] = {}
+    conflicts = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(idx: int) -> None:
+        nonlocal conflicts
+        n = 0
+        while time.perf_counter() < deadline:
+            n += 1
+            fields = {
+                "idx": str(idx),
+                "kotob_id": "3",
+                "chapters_id": str(idx),
+                "lang": "fa",
+                "narrator": f"bench-{idx}-{n}",
+                "title": f"row {idx}",
+                "url": f"https://example.invalid/audio/{idx}.mp3",
+            }
+            t0 = time.perf_counter()
+            if versioned:
+                with urllib.request.urlopen(f"{base}/audio-edit?idx={idx}", timeout=60) as resp:
+                    match = VERSION_RE.search(resp.read().decode("utf-8"))
+                fields["file_version"] = match.group(1) if match else ""
+            status = _post(base, "/audio-save", fields)
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                    last_saved[idx] = n
+                elif status == 409:
+                    conflicts += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - started
+
+    try:
+        rows = json.loads((control_panel.REPO_DIR / control_panel.AUDIO_JSON_REL).read_text(encoding="utf-8"))
+    except ValueError:
+        rows = None
+    if rows is None:
+        lost = len(last_saved)
+    else:
+        lost = sum(1 for idx, n in last_saved.items() if rows[idx].get("narrator") != f"bench-{idx}-{n}")
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {
+        "threads": threads,
+        "saves": len(latencies),
+        "saves_per_s": len(latencies) / wall if wall else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "conflicts": conflicts,
+        "lost_updates": lost,
+        "file_ok": rows is not None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark concurrent saves through the control panel")
+    parser.add_argument("--threads", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration per level")
+    parser.add_argument("--rows", type=int, default=2000, help="Pad content_audio_metadata.json to this many rows")
+    parser.add_argument(
+        "--versioned",
+        action="store_true",
+        help="Fetch the edit form first and send its file_version (optimistic concurrency; expect 409s)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.threads.split(",") if x.strip()]
+    with tempfile.TemporaryDirectory(prefix="kdini-bench-") as tmp:
+        repo = Path(tmp)
+        _prepare_repo(repo, max(args.rows, max(levels)))
+        control_panel.REPO_DIR = repo
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _QuietHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            results = [_run_level(base, n, args.seconds, args.versioned) for n in levels]
+        finally:
+            server.shutdown()
+            server.server_close()
+        leftovers = sorted(p.name for p in (repo / "json").glob(".*.tmp"))
+
+    if args.json:
+        print(json.dumps({"results": results, "temp_files_left": leftovers}, indent=2))
+    else:
+        print(
+            f"{'threads':>7} {'saves':>6} {'saves/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}"
+            f" {'409':>5} {'lost':>5}  file"
+        )
+        for r in results:
+            print(
+                f"{r['threads']:>7} {r['saves']:>6} {r['saves_per_s']:>8.1f} {r['p50_ms']:>7.1f}"
+                f" {r['p95_ms']:>7.1f} {r['max_ms']:>7.1f} {r['conflicts']:>5} {r['lost_updates']:>5}"
+                f"  {'ok' if r['file_ok'] else 'CORRUPT'}"
+            )
+        if leftovers:
+            print(f"temp files left behind: {', '.join(leftovers)}")
+    failed = any(r["lost_updates"] or not r["file_ok"] for r in results) or leftovers
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
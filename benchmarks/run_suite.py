@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Scaling benchmark for doctor, export-sql, inspect-sql and the panel's list pages.
+
+For every scale (content rows, e.g. 10k,100k) a synthetic repo is generated
+with generate_data.py (and reused on later runs). Each command then runs as its
+own process, so wall time and peak RSS are that command's alone. Rows/s is
+content rows handled per second; for the panel it is metadata rows listed.
+
+--save-baseline records the results; later runs are compared with the baseline
+and exit 1 when a command got slower or bigger than --tolerance allows. The
+baseline is only meaningful on the machine that wrote it.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(REPO_DIR / "tools"))
+
+import data_ops  # noqa: E402
+import generate_data  # noqa: E402
+
+COMMANDS = ("doctor", "export-sql", "inspect-sql", "panel-lists")
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DATA_DIR = REPO_DIR / data_ops.DOCTOR_CACHE_DIR / "bench"
+PANEL_PASSES = 3
+
+
+def _command(name: str, repo: Path, info: dict[str, Any], tmp: Path, jobs: int) -> tuple[list[str], int]:
+    """(argv, rows it processes) for one benchmarked command."""
+    data_ops_cli = [sys.executable, str(REPO_DIR / "tools" / "data_ops.py"), "--repo-root", str(repo)]
+    db = str(repo / "books.db")
+    if name == "doctor":
+        return data_ops_cli + ["doctor", "--db", db, "--no-cache", "--format", "json"], info["content"]
+    if name == "export-sql":
+        argv = ["export-sql", "--db", db, "--book-id", str(info["largest_book"]), "--out", str(tmp / "export.sql")]
+        return data_ops_cli + argv + ["--insert-batch", str(data_ops.SQL_INSERT_MAX_ROWS)], info["largest_book_rows"]
+    if name == "inspect-sql":
+        argv = ["inspect-sql", "--dir", str(repo / "kotob"), "--jobs", str(jobs), "--json"]
+        return data_ops_cli + argv, info["content"]
+    if name == "panel-lists":
+        argv = [sys.executable, str(BENCH_DIR / "panel_lists.py"), "--repo", str(repo), "--passes", str(PANEL_PASSES)]
+        rows = sum(n for _, n in _panel_list_pages(repo)) * PANEL_PASSES
+        return argv + ["--json"], rows
+    raise ValueError(f"unknown command: {name}")
+
+
+def _panel_list_pages(repo: Path) -> list[tuple[str, int]]:
+    import panel_lists  # imports the panel; only needed for this command
+
+    return panel_lists.list_pages(repo)
+
+
+def _peak_rss_bytes(ru_maxrss: int) -> int:
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return ru_maxrss if sys.platform == "darwin" else ru_maxrss * 1024
+
+
+def measure(argv: list[str]) -> dict[str, Any]:
+    """Run argv to completion; wall seconds and the peak RSS of that process alone."""
+    with tempfile.TemporaryFile() as err:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=err)
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - t0
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        err.seek(0)
+        stderr = err.read().decode("utf-8", "replace").strip()
+    return {
+        "seconds": seconds,
+        "peak_rss_mb": _peak_rss_bytes(usage.ru_maxrss) / (1 << 20),
+        "returncode": proc.returncode,
+        "stderr": stderr[-2000:],
+    }
+
+
+def compare(results: list[dict[str, Any]], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Regressions against the baseline: more time or memory than tolerance allows."""
+    regressions: list[str] = []
+    old = baseline.get("results", {})
+    for r in results:
+        base = old.get(r["key"])
+        if not base:
+            continue
+        r["baseline_seconds"] = base["seconds"]
+        r["baseline_peak_rss_mb"] = base["peak_rss_mb"]
+        for metric, unit in (("seconds", "s"), ("peak_rss_mb", " MB")):
+            if base[metric] > 0 and r[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{r['key']}: {metric} {r[metric]:.2f}{unit} vs baseline {base[metric]:.2f}{unit} "
+                    f"(+{(r[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark kdini commands on synthetic data at several scales")
+    parser.add_argument("--scales", default="10k,100k", help="Comma-separated content row counts (default: 10k,100k)")
+    parser.add_argument(
+        "--commands",
+        default=",".join(COMMANDS),
+        help=f"Comma-separated subset of: {', '.join(COMMANDS)}",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per command; the fastest counts (default: 1)")
+    parser.add_argument("--jobs", type=int, default=1, help="--jobs passed to inspect-sql (default: 1)")
+    parser.add_argument("--data-dir", default=str(DATA_DIR), help="Where generated data sets are kept")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed (default: 1)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline file to compare with / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown or memory growth before it counts as a regression (default: 0.25 = 25%%)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    try:
+        scales = [generate_data.parse_scale(s) for s in args.scales.split(",") if s.strip()]
+    except ValueError as exc:
+        parser.error(str(exc))
+    commands = [c.strip() for c in args.commands.split(",") if c.strip()]
+    unknown = [c for c in commands if c not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(unknown)}")
+    log = (lambda line: print(line, file=sys.stderr)) if args.json else print
+
+    results: list[dict[str, Any]] = []
+    failed: list[str] = []
+    with tempfile.TemporaryDirectory(prefix="kdini-bench-") as tmp:
+        for rows in scales:
+            label = generate_data.scale_label(rows)
+            repo = Path(args.data_dir).expanduser().resolve() / label
+            info = generate_data.generate(repo, rows, seed=args.seed, log=log)
+            for name in commands:
+                argv, n_rows = _command(name, repo, info, Path(tmp), args.jobs)
+                runs = [measure(argv) for _ in range(max(1, args.repeat))]
+                best = min(runs, key=lambda r: r["seconds"])
+                key = f"{label}/{name}"
+                if best["returncode"] != 0:
+                    failed.append(f"{key}: exit {best['returncode']}: {best['stderr']}")
+                result = {
+                    "key": key,
+                    "scale": label,
+                    "command": name,
+                    "rows": n_rows,
+                    "seconds": round(best["seconds"], 4),
+                    "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+                    "rows_per_s": round(n_rows / best["seconds"]) if best["seconds"] else 0,
+                }
+                results.append(result)
+                log(
+                    f"{key:<24} {result['seconds']:>8.2f}s {result['peak_rss_mb']:>8.1f} MB "
+                    f"{result['rows_per_s']:>10} rows/s"
+                )
+
+    baseline_path = Path(args.baseline).expanduser().resolve()
+    regressions: list[str] = []
+    if args.save_baseline:
+        baseline = {
+            "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+            "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "results": {r["key"]: r for r in results},
+        }
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+        log(f"Baseline saved to {baseline_path}")
+    elif baseline_path.exists():
+        regressions = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.tolerance)
+
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions, "failed": failed}, indent=2))
+    else:
+        if any("baseline_seconds" in r for r in results):
+            print()
+            print(f"{'vs baseline':<24} {'time':>8} {'memory':>8}")
+            for r in results:
+                if "baseline_seconds" in r:
+                    dt = (r["seconds"] / r["baseline_seconds"] - 1) * 100 if r["baseline_seconds"] else 0.0
+                    dm = (r["peak_rss_mb"] / r["baseline_peak_rss_mb"] - 1) * 100 if r["baseline_peak_rss_mb"] else 0.0
+                    print(f"{r['key']:<24} {dt:>+7.0f}% {dm:>+7.0f}%")
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        for line in failed:
+            print(f"FAILED {line}")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
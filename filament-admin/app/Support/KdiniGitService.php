@@ -56,7 +56,7 @@ public static function pullRebase(): array
      */
     public static function reorganizeAssets(): array
     {
-        return self::run(['zsh', 'tools/reorganize_assets.sh']);
+        return self::run(['python3', 'tools/reorganize.py']);
     }
 
     /**
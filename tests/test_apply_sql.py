@@ -0,0 +1,91 @@
+"""Tests for apply-sql: transactions, index handling and what it reports."""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import data_ops  # noqa: E402
+
+
+def _books_db(path: Path) -> Path:
+    conn = sqlite3.connect(path)
+    conn.execute(data_ops.BUILD_DB_TABLES["content"])
+    conn.execute("CREATE INDEX idx_content_kotob ON content (kotob_id)")
+    conn.execute("INSERT INTO content (chapters_id, kotob_id, text) VALUES (1, 7, 'old')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _patch(path: Path, rows: int = 3) -> Path:
+    values = ",\n".join(f"({c}, 7, 'new {c}')" for c in range(1, rows + 1))
+    path.write_text(
+        "BEGIN TRANSACTION;\nDELETE FROM content WHERE kotob_id = 7;\n"
+        f"INSERT INTO content (chapters_id, kotob_id, text) VALUES {values};\nCOMMIT;\n",
+        encoding="utf-8",
+    )
+    return path
+
+
+def _indexes(db: Path) -> list[str]:
+    conn = sqlite3.connect(db)
+    try:
+        return [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name")]
+    finally:
+        conn.close()
+
+
+def test_sqlite_error_rolls_back_and_rebuilds_indexes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    db = _books_db(tmp_path / "books.db")
+    real_apply = data_ops._apply_sql_patch
+
+    def busy_apply(conn: sqlite3.Connection, sql_path: Path, **kwargs: object) -> tuple[int, int]:
+        real_apply(conn, sql_path)
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(data_ops, "_apply_sql_patch", busy_apply)
+    rc = data_ops.run_apply_sql(db, [_patch(tmp_path / "p.sql")], jobs=1, indexes="drop")
+    assert rc == 2
+    assert _indexes(db) == ["idx_content_kotob"]
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT text FROM content").fetchall() == [("old",)]
+    conn.close()
+
+
+def test_reports_inserted_rows_not_deletes(tmp_path: Path) -> None:
+    db = _books_db(tmp_path / "books.db")
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute("BEGIN")
+    assert data_ops._apply_sql_patch(conn, _patch(tmp_path / "p.sql", rows=4)) == (2, 4)
+    conn.execute("ROLLBACK")
+    conn.close()
+
+
+def test_rollback_is_refused_even_with_force(tmp_path: Path) -> None:
+    db = _books_db(tmp_path / "books.db")
+    patch = _patch(tmp_path / "p.sql")
+    patch.write_text(patch.read_text(encoding="utf-8").replace("COMMIT;", "ROLLBACK;"), encoding="utf-8")
+    assert data_ops.run_apply_sql(db, [patch], jobs=1, force=True) == 2
+
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute("BEGIN")
+    with pytest.raises(ValueError, match="ROLLBACK"):
+        data_ops._apply_sql_patch(conn, patch)
+    conn.execute("ROLLBACK")
+    conn.close()
+
+
+def test_skipped_transaction_statements_are_reported(tmp_path: Path) -> None:
+    db = _books_db(tmp_path / "books.db")
+    skipped: list[tuple[int, str]] = []
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute("BEGIN")
+    data_ops._apply_sql_patch(conn, _patch(tmp_path / "p.sql"), on_skip=lambda n, verb: skipped.append((n, verb)))
+    conn.execute("ROLLBACK")
+    conn.close()
+    assert skipped == [(1, "BEGIN"), (4, "COMMIT")]
@@ -0,0 +1,30 @@
+"""Tests for the shared atomic file write."""
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import atomic_io  # noqa: E402
+import reorganize  # noqa: E402
+
+
+def test_replaces_content_and_keeps_the_mode(tmp_path: Path) -> None:
+    path = tmp_path / "books_metadata.json"
+    path.write_text("old", encoding="utf-8")
+    path.chmod(0o600)
+    atomic_io.atomic_write_text(path, "new")
+    assert path.read_text(encoding="utf-8") == "new"
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ["books_metadata.json"]
+
+
+def test_reorganize_saves_through_it(tmp_path: Path) -> None:
+    (tmp_path / "json").mkdir()
+    reorganize._save_books_file(tmp_path, "json/books_metadata.json", [{"id": 1, "title": "کتاب"}])
+    assert (tmp_path / "json" / "books_metadata.json").read_text(encoding="utf-8") == (
+        '[\n  {\n    "id": 1,\n    "title": "کتاب"\n  }\n]\n'
+    )
+    assert os.listdir(tmp_path / "json") == ["books_metadata.json"]
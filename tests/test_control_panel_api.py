@@ -0,0 +1,95 @@
+"""Tests for the control panel's JSON API writes."""
+from __future__ import annotations
+
+import json
+import shutil
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "tools"))
+
+import control_panel  # noqa: E402
+
+
+class _QuietHandler(control_panel.PanelHandler):
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+
+@pytest.fixture()
+def panel(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    for rel in ("json", "update"):
+        shutil.copytree(REPO_DIR / rel, tmp_path / rel)
+    monkeypatch.setattr(control_panel, "REPO_DIR", tmp_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _call(url: str, method: str, body: dict) -> tuple[int, dict]:
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def test_patch_coerces_ints_like_the_forms(panel: str) -> None:
+    update = {"idx": 0, "set": {"chapters_id": "7", "kotob_id": ""}}
+    status, _ = _call(f"{panel}/api/audio", "PATCH", {"updates": [update]})
+    assert status == 200
+    _, listing = _call(f"{panel}/api/audio?per_page=1", "GET", {})
+    row = listing["items"][0]["row"]
+    assert row["chapters_id"] == 7 and row["kotob_id"] is None
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [{"id": "abc"}, {"title": {"nested": 1}}, {"no_such_field": "x"}, {"is_default": True}, {"title": 5}],
+)
+def test_patch_rejects_bad_values_and_writes_nothing(panel: str, changes: dict) -> None:
+    before = (control_panel.REPO_DIR / control_panel.BOOKS_JSON_REL).read_bytes()
+    status, answer = _call(f"{panel}/api/books", "PATCH", {"updates": [{"idx": 0, "set": changes}]})
+    assert status == 400 and "error" in answer
+    assert (control_panel.REPO_DIR / control_panel.BOOKS_JSON_REL).read_bytes() == before
+
+
+def test_insert_validates_every_row(panel: str) -> None:
+    rows = [{"id": 1, "title": "ok"}, {"id": 2, "title": ["x"]}]
+    status, _ = _call(f"{panel}/api/structure/categories", "POST", {"rows": rows})
+    assert status == 400
+    status, answer = _call(f"{panel}/api/structure/categories", "POST", {"rows": [{"id": "9", "title": " t "}]})
+    assert status == 200 and answer["inserted"] == 1
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [{"build": "abc"}, {"mandatory": "yes"}, {"changes": "one line"}, {"changes": [1]}, {"no_such_key": "x"}],
+)
+def test_update_patch_rejects_what_the_form_would_not_save(panel: str, changes: dict) -> None:
+    before = (control_panel.REPO_DIR / control_panel.UPDATE_JSON_REL).read_bytes()
+    status, answer = _call(f"{panel}/api/update", "PATCH", {"set": changes})
+    assert status == 400 and "error" in answer
+    assert (control_panel.REPO_DIR / control_panel.UPDATE_JSON_REL).read_bytes() == before
+
+
+def test_update_patch_coerces_like_the_form(panel: str) -> None:
+    changes = {"build": "43", "mandatory": 1, "changes": [" a ", "", "b"], "version": " 1.0.4 "}
+    status, _ = _call(f"{panel}/api/update", "PATCH", {"set": changes})
+    assert status == 200
+    data = json.loads((control_panel.REPO_DIR / control_panel.UPDATE_JSON_REL).read_text(encoding="utf-8"))
+    assert (data["build"], data["mandatory"], data["changes"], data["version"]) == (43, True, ["a", "b"], "1.0.4")
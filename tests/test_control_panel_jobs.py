@@ -0,0 +1,26 @@
+"""Tests for the control panel's background git job queue."""
+from __future__ import annotations
+
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import control_panel  # noqa: E402
+
+
+def test_job_queue_dedupes_only_identical_requests() -> None:
+    jobs = control_panel.JobQueue()
+    gate = threading.Event()
+
+    def blocked(log: object) -> bool:
+        return gate.wait(30)
+
+    try:
+        first = jobs.submit("push", "Commit & Push: a", blocked, params="a")
+        assert jobs.submit("push", "Commit & Push: a", blocked, params="a") is first
+        second = jobs.submit("push", "Commit & Push: b", blocked, params="b")
+        assert second is not first and second.params == "b"
+    finally:
+        gate.set()
@@ -0,0 +1,70 @@
+"""Tests for export-sql's row selection and order."""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import data_ops  # noqa: E402
+
+CHAPTER_IDS = [3.5, "3.5", 0, None, "  2", "10", 2, "abc", 3.0, "", 1, "3", 0.0, "0", -1, "99999999999999999999999"]
+
+
+@pytest.mark.parametrize("chapters_type", ["", "INTEGER", "TEXT"])
+def test_export_order_matches_the_python_sort(chapters_type: str) -> None:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE content (id INTEGER PRIMARY KEY, chapters_id {chapters_type}, kotob_id, text)")
+    conn.executemany(
+        "INSERT INTO content (chapters_id, kotob_id, text) VALUES (?, 5, ?)",
+        [(chid, str(i)) for i, chid in enumerate(CHAPTER_IDS)],
+    )
+    # the sort export-sql used before rows were selected in SQLite
+    rows = conn.execute("SELECT chapters_id, text FROM content").fetchall()
+    expected = [text for chid, text in sorted(rows, key=lambda r: (data_ops._as_int(r[0]) or 0, str(r[0] or "")))]
+
+    sql = data_ops._export_select_sql(conn, "chapters_id, text", "kotob_id = ?")
+    assert [text for _, text in conn.execute(sql, [5])] == expected
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_book_filter_matches_every_spelling_with_one_scan_without_an_index(indexed: bool) -> None:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE content (id INTEGER PRIMARY KEY, chapters_id, kotob_id, text)")
+    kotob_ids = [5, 5.0, "5", " 5", "05", 5.5, "5.5", "x", 6, "6", None]
+    conn.executemany(
+        "INSERT INTO content (chapters_id, kotob_id, text) VALUES (1, ?, ?)",
+        [(kid, str(i)) for i, kid in enumerate(kotob_ids)],
+    )
+    if indexed:
+        conn.execute("CREATE INDEX content_kotob ON content (kotob_id)")
+    expected = {"0", "1", "2", "3", "4"}  # 5, 5.0, '5', ' 5', '05'
+
+    statements: list[str] = []
+    conn.set_trace_callback(statements.append)
+    where, params = data_ops._book_id_filter(conn, 5)
+    assert {text for (text,) in conn.execute(f"SELECT text FROM content WHERE {where}", params)} == expected
+    assert any("DISTINCT" in sql for sql in statements) == indexed
+
+
+def test_a_failed_export_leaves_the_old_patch_and_no_temp_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE content (id INTEGER PRIMARY KEY, chapters_id, kotob_id, text)")
+    conn.executemany("INSERT INTO content (chapters_id, kotob_id, text) VALUES (?, 5, ?)", [(1, "a"), (2, "b")])
+    out = tmp_path / "kotob" / "book_5.sql"
+    out.parent.mkdir()
+    out.write_text("old\n", encoding="utf-8")
+
+    def quote(value: object) -> str:
+        if value == "b":
+            raise OSError("disk full")
+        return repr(value)
+
+    monkeypatch.setattr(data_ops, "_sql_quote", quote)
+    with pytest.raises(OSError):
+        data_ops._write_export_sql(conn, ["chapters_id", "kotob_id", "text"], 5, out)
+    assert out.read_text(encoding="utf-8") == "old\n"
+    assert [p.name for p in out.parent.iterdir()] == ["book_5.sql"]
@@ -0,0 +1,80 @@
+"""Tests for how the SQL patch tools read patches written by export-sql."""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import data_ops  # noqa: E402
+
+
+def _books_db(path: Path) -> Path:
+    conn = sqlite3.connect(path)
+    conn.execute(data_ops.BUILD_DB_TABLES["content"])
+    conn.executemany(
+        "INSERT INTO content (chapters_id, kotob_id, text, text_fa) VALUES (?, ?, ?, ?)",
+        [(1, 7, "a", "x"), (2, 7, "b", None), (1, 8, "c", "z")],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _export(db: Path, out: Path, compact: bool) -> Path:
+    conn = sqlite3.connect(db)
+    try:
+        data_ops._write_export_sql(conn, data_ops._content_columns(conn), 7, out, insert_batch=10, compact=compact)
+    finally:
+        conn.close()
+    return out
+
+
+def test_compact_patch_replays_like_a_full_one(tmp_path: Path) -> None:
+    db = _books_db(tmp_path / "books.db")
+    full = _export(db, tmp_path / "full.sql", compact=False)
+    compact = _export(db, tmp_path / "compact.sql", compact=True)
+    assert data_ops._patch_tables(compact) == data_ops._patch_tables(full)
+
+    rows = []
+    for patch in (full, compact):
+        conn = sqlite3.connect(":memory:")
+        data_ops._apply_patch_to_scratch(conn, patch)
+        rows.append(conn.execute("SELECT kotob_id, chapters_id, text, text_fa FROM content ORDER BY rowid").fetchall())
+        conn.close()
+    assert rows[0] == rows[1] == [(7, 1, "a", "x"), (7, 2, "b", None)]
+
+
+def test_compact_patch_delete_coverage(tmp_path: Path) -> None:
+    db = _books_db(tmp_path / "books.db")
+    report = data_ops._scan_sql_patch(_export(db, tmp_path / "compact.sql", compact=True))
+    assert report["insert_book_ids"] == [7]
+    assert report["coverage"]["content"]["covered"] == 2
+    assert report["coverage"]["content"]["unchecked"] == 0
+
+
+def test_scan_warnings_carry_a_code(tmp_path: Path) -> None:
+    patch = tmp_path / "p.sql"
+    patch.write_text("INSERT INTO content (kotob_id, chapters_id, text) VALUES (7, 1, 'a'), (7, 1, 'b');\n")
+    report = data_ops._scan_sql_patch(patch)
+    assert [w["code"] for w in report["warnings"]] == ["uncovered_rows", "duplicate_keys", "incomplete_transaction"]
+
+
+def test_compact_refuses_a_reordered_content_table(tmp_path: Path) -> None:
+    db = tmp_path / "books.db"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE content (id INTEGER PRIMARY KEY, kotob_id, chapters_id, text)")
+    conn.execute("INSERT INTO content (kotob_id, chapters_id, text) VALUES (7, 100, 'a')")
+    conn.commit()
+    conn.close()
+    out = tmp_path / "book_7.sql"
+    assert data_ops.run_export_sql(db, 7, out, None, compact=True) == 2
+    assert not out.exists()
+    with pytest.raises(ValueError, match="--compact"):
+        _export(db, out, compact=True)
+    # with the column list the same table exports fine
+    assert data_ops.run_export_sql(db, 7, out, None) == 0
+    assert data_ops._scan_sql_patch(out)["insert_book_ids"] == [7]
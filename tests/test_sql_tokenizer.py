@@ -0,0 +1,61 @@
+"""Tests for the streaming SQL tokenizer behind inspect-sql, apply-sql and build-db."""
+from __future__ import annotations
+
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import data_ops  # noqa: E402
+
+
+def _tokens(sql: str, chunk_size: int = data_ops.SQL_READ_CHUNK) -> list[tuple[str, str]]:
+    return list(data_ops._SqlTokenizer(io.StringIO(sql), chunk_size=chunk_size))
+
+
+def test_basic_insert() -> None:
+    assert _tokens("INSERT INTO content (id, text) VALUES (1, 'a''b');") == [
+        ("word", "INSERT"),
+        ("word", "INTO"),
+        ("word", "content"),
+        ("op", "("),
+        ("word", "id"),
+        ("op", ","),
+        ("word", "text"),
+        ("op", ")"),
+        ("word", "VALUES"),
+        ("op", "("),
+        ("number", "1"),
+        ("op", ","),
+        ("string", "a'b"),
+        ("op", ")"),
+        ("end", ";"),
+    ]
+
+
+def test_comments_and_quoted_identifiers() -> None:
+    sql = '-- note\nSELECT /* x; y */ "a b", `c` FROM t;'
+    assert _tokens(sql) == [
+        ("word", "SELECT"),
+        ("ident", "a b"),
+        ("op", ","),
+        ("ident", "c"),
+        ("word", "FROM"),
+        ("word", "t"),
+        ("end", ";"),
+    ]
+
+
+def test_digit_that_is_not_a_decimal_digit_advances() -> None:
+    # "²".isdigit() is true but \d does not match it; this used to loop forever
+    assert _tokens("SELECT ²;") == [("word", "SELECT"), ("op", "²"), ("end", ";")]
+
+
+def test_non_ascii_decimal_digits_are_numbers() -> None:
+    assert _tokens("SELECT ١٢;") == [("word", "SELECT"), ("number", "١٢"), ("end", ";")]
+
+
+def test_tokens_split_across_chunks() -> None:
+    sql = "INSERT INTO content VALUES (12345.5e3, 'long text here');"
+    assert _tokens(sql, chunk_size=3) == _tokens(sql)
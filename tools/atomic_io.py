@@ -0,0 +1,54 @@
+"""Crash-safe file writes shared by the control panel, reorganize.py and data_ops.py."""
+from __future__ import annotations
+
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """Yield a temp path next to path for the caller to write, then rename it over path.
+
+    The temp file is named .<name>.<random>.tmp (ignored by git) and is removed
+    if the block raises. If the block deletes it, path is left as it was. On
+    success the file keeps path's permission bits, and both the file and the
+    directory are fsynced so the rename itself survives a crash.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode = (path.stat().st_mode & 0o777) if path.exists() else 0o644
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        yield tmp_path
+        if not tmp_path.exists():
+            return
+        _fsync(tmp_path)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    _fsync(path.parent)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write text to path through atomic_path."""
+    with atomic_path(path) as tmp_path:
+        tmp_path.write_text(text, encoding="utf-8")
+
+
+def _fsync(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
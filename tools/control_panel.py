@@ -2,14 +2,28 @@
 from __future__ import annotations
 
 import argparse
+import email.utils
+import gzip
+import hashlib
 import html
+import itertools
 import json
-import re
+import os
+import queue
+import shlex
+import sqlite3
 import subprocess
+import threading
+import time
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from urllib.parse import parse_qs, urlparse
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import atomic_io
+import data_ops
+import reorganize
 
 REPO_DIR = Path(__file__).resolve().parent.parent
 BOOKS_JSON_REL = "json/books_metadata.json"
@@ -24,10 +38,9 @@ DEFAULT_EDIT_FILES = [
     "README.md",
 ]
 MAX_EDIT_SIZE = 2_000_000
+GIT_JOB_TIMEOUT = 600
+GZIP_MIN_BYTES = 1024
 URL_KEYS = ("sql_download_url", "download_url", "url")
-RAW_SQL_PATTERN = re.compile(
-    r"(https://raw\.githubusercontent\.com/kerim317gh/kdini/refs/heads/main/)(?!kotob/)([^\"\s]+\.(?:sql|sql\.gz|db))"
-)
 
 
 def run_cmd(cmd: list[str], timeout: int = 180) -> tuple[int, str]:
@@ -51,6 +64,47 @@ def run_cmd(cmd: list[str], timeout: int = 180) -> tuple[int, str]:
     return proc.returncode, output.strip()
 
 
+def stream_cmd(cmd: list[str], log: Callable[[str], None], timeout: int = GIT_JOB_TIMEOUT) -> int:
+    """Run cmd in the repo, passing each output line (stdout and stderr) to log as it arrives."""
+    log(f"$ {shlex.join(cmd)}")
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            cwd=REPO_DIR,
+            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+        )
+    except OSError as exc:
+        log(str(exc))
+        return 127
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            log(line.rstrip("\r\n"))
+        code = proc.wait()
+    finally:
+        timer.cancel()
+    if timed_out.is_set():
+        log(f"زمان اجرای دستور تمام شد: {' '.join(cmd)}")
+        return 124
+    return code
+
+
+def current_branch() -> str:
+    code, branch = run_cmd(["git", "branch", "--show-current"])
+    return branch.strip() if code == 0 and branch.strip() else "main"
+
+
 def resolve_repo_path(rel_path: str) -> Path:
     rel_path = rel_path.strip().replace("\\", "/")
     if not rel_path:
@@ -63,14 +117,492 @@ def resolve_repo_path(rel_path: str) -> Path:
     return full_path
 
 
-def read_json_file(rel_path: str) -> object:
+class VersionConflict(ValueError):
+    pass
+
+
+_FILE_LOCKS: dict[Path, threading.RLock] = {}
+_FILE_LOCKS_GUARD = threading.Lock()
+
+
+def file_lock(rel_path: str) -> threading.RLock:
+    """Per-file lock; hold it around every read-modify-write of that file."""
     path = resolve_repo_path(rel_path)
-    return json.loads(path.read_text(encoding="utf-8"))
+    with _FILE_LOCKS_GUARD:
+        lock = _FILE_LOCKS.get(path)
+        if lock is None:
+            lock = _FILE_LOCKS[path] = threading.RLock()
+        return lock
+
 
+def content_version(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:16]
 
-def write_json_file(rel_path: str, data: object) -> None:
+
+def read_json_file(rel_path: str, expected_version: str = "") -> object:
+    """Private copy of a JSON file. With expected_version, raise VersionConflict if it moved on."""
     path = resolve_repo_path(rel_path)
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    raw = path.read_bytes()
+    if expected_version and content_version(raw) != expected_version:
+        raise VersionConflict(
+            "این فایل بعد از باز شدن فرم تغییر کرده است؛ صفحه را دوباره باز کن و تغییرات را دوباره وارد کن."
+        )
+    return json.loads(raw.decode("utf-8"))
+
+
+def write_json_file(rel_path: str, data: object) -> str:
+    """Atomically replace a JSON file; returns its new content version."""
+    path = resolve_repo_path(rel_path)
+    text = json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+    version = content_version(text.encode("utf-8"))
+    with file_lock(rel_path):
+        atomic_io.atomic_write_text(path, text)
+        STORE.put(path, data, version)
+    GIT_INFO.invalidate()
+    return version
+
+
+class _StoreEntry:
+    __slots__ = ("stamp", "data", "version", "derived")
+
+    def __init__(self, stamp: tuple[int, int], data: object, version: str) -> None:
+        self.stamp = stamp
+        self.data = data
+        self.version = version
+        self.derived: dict[str, Any] = {}
+
+
+class MetadataStore:
+    """Parsed JSON files shared by all handler threads.
+
+    A document is re-read only when its mtime or size changes, and is replaced
+    directly when the panel writes it. Returned objects are shared between
+    requests: code that modifies them must use read_json_file() for its own copy.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[Path, _StoreEntry] = {}
+        self._stats: dict[str, dict[str, int]] = {}
+
+    @staticmethod
+    def _stamp(path: Path) -> tuple[int, int]:
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def _count(self, path: Path, key: str) -> None:
+        name = str(path.relative_to(REPO_DIR.resolve())) if REPO_DIR.resolve() in path.parents else str(path)
+        counters = self._stats.setdefault(name, {"hits": 0, "misses": 0, "writes": 0, "derived_builds": 0})
+        counters[key] += 1
+
+    def _entry(self, rel_path: str) -> _StoreEntry:
+        path = resolve_repo_path(rel_path)
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stamp == stamp:
+                self._count(path, "hits")
+                return entry
+            self._count(path, "misses")
+        # Parse outside the lock so a large file does not stall other documents.
+        raw = path.read_bytes()
+        entry = _StoreEntry(stamp, json.loads(raw.decode("utf-8")), content_version(raw))
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def get(self, rel_path: str) -> object:
+        return self._entry(rel_path).data
+
+    def get_versioned(self, rel_path: str) -> tuple[object, str]:
+        """Document plus the content version that edit forms send back on save."""
+        entry = self._entry(rel_path)
+        return entry.data, entry.version
+
+    def derived(self, rel_path: str, name: str, build: Callable[[object], Any]) -> Any:
+        """Value computed from the current document; rebuilt only when the document changes."""
+        entry = self._entry(rel_path)
+        with self._lock:
+            if name in entry.derived:
+                return entry.derived[name]
+        value = build(entry.data)
+        with self._lock:
+            entry.derived[name] = value
+            self._count(resolve_repo_path(rel_path), "derived_builds")
+        return value
+
+    def put(self, path: Path, data: object, version: str) -> None:
+        entry = _StoreEntry(self._stamp(path), data, version)
+        with self._lock:
+            self._entries[path] = entry
+            self._count(path, "writes")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            files = {name: dict(counters) for name, counters in sorted(self._stats.items())}
+        totals = {key: sum(c[key] for c in files.values()) for key in ("hits", "misses", "writes", "derived_builds")}
+        return {"files": files, "totals": totals}
+
+
+STORE = MetadataStore()
+
+
+class GitInfoCache:
+    """git status/log/remote output for the dashboard.
+
+    Refreshed only when git's own bookkeeping files change (index, HEAD, the
+    current branch and its origin ref, packed-refs, FETCH_HEAD, config), when
+    the panel writes a file, or after MAX_AGE seconds for edits made outside.
+    """
+
+    MAX_AGE = 30.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stamp: tuple | None = None
+        self._taken = 0.0
+        self._value: dict[str, str] = {}
+        self.refreshes = 0
+
+    @staticmethod
+    def _git_dir() -> Path:
+        dot_git = REPO_DIR / ".git"
+        if dot_git.is_file():
+            text = dot_git.read_text(encoding="utf-8").strip()
+            if text.startswith("gitdir:"):
+                return (REPO_DIR / text[len("gitdir:") :].strip()).resolve()
+        return dot_git
+
+    def _current_stamp(self) -> tuple:
+        git_dir = self._git_dir()
+        paths = [git_dir / name for name in ("index", "HEAD", "config", "packed-refs", "FETCH_HEAD")]
+        try:
+            head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+        except OSError:
+            head = ""
+        if head.startswith("ref:"):
+            ref = head[len("ref:") :].strip()
+            paths.append(git_dir / ref)
+            if ref.startswith("refs/heads/"):
+                paths.append(git_dir / "refs/remotes/origin" / ref[len("refs/heads/") :])
+        stamp: list[object] = [head]
+        for path in paths:
+            try:
+                st = path.stat()
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def get(self) -> dict[str, str]:
+        with self._lock:
+            stamp = self._current_stamp()
+            if stamp != self._stamp or time.monotonic() - self._taken > self.MAX_AGE:
+                # --no-optional-locks: status must not rewrite the index it is keyed on.
+                self._value = {
+                    "status": run_cmd(["git", "--no-optional-locks", "status", "--short", "-b"])[1],
+                    "commits": run_cmd(["git", "log", "--oneline", "-n", "6"])[1],
+                    "remotes": run_cmd(["git", "remote", "-v"])[1],
+                }
+                self._stamp = stamp
+                self._taken = time.monotonic()
+                self.refreshes += 1
+            return dict(self._value)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stamp = None
+
+
+GIT_INFO = GitInfoCache()
+
+
+class Job:
+    def __init__(self, job_id: str, action: str, title: str, params: str = "") -> None:
+        self.id = job_id
+        self.action = action
+        self.title = title
+        self.params = params
+        self.status = "queued"
+        self.lines: list[str] = []
+        self.created = time.time()
+        self.finished: float | None = None
+        self.changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in {"ok", "failed"}
+
+    def log(self, text: str) -> None:
+        with self.changed:
+            self.lines.extend(text.splitlines() or [""])
+            self.changed.notify_all()
+
+    def set_status(self, status: str) -> None:
+        with self.changed:
+            self.status = status
+            if self.done:
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> tuple[list[str], bool]:
+        """Lines after the first `seen`, waiting up to timeout for new ones; plus whether the job is done."""
+        with self.changed:
+            if len(self.lines) <= seen and not self.done:
+                self.changed.wait(timeout)
+            return self.lines[seen:], self.done
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.changed:
+            return {
+                "id": self.id,
+                "action": self.action,
+                "title": self.title,
+                "status": self.status,
+                "created": self.created,
+                "finished": self.finished,
+                "log": list(self.lines),
+            }
+
+
+class JobQueue:
+    """Git jobs run one at a time on a background thread, so no request handler waits on git."""
+
+    KEEP = 20
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._pending: queue.Queue[tuple[Job, Callable[[Callable[[str], None]], bool]]] = queue.Queue()
+        self._ids = itertools.count(1)
+        self._worker: threading.Thread | None = None
+
+    def submit(
+        self, action: str, title: str, fn: Callable[[Callable[[str], None]], bool], params: str = ""
+    ) -> Job:
+        """Queue fn(log) -> ok.
+
+        An unfinished job with the same action and params (e.g. the commit
+        message of a push) is returned instead of a duplicate; different
+        params get a job of their own.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.action == action and job.params == params and not job.done:
+                    return job
+            job = Job(str(next(self._ids)), action, title, params)
+            self._jobs[job.id] = job
+            for old in [j for j in self._jobs.values() if j.done][: max(len(self._jobs) - self.KEEP, 0)]:
+                del self._jobs[old.id]
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="panel-jobs", daemon=True)
+                self._worker.start()
+        self._pending.put((job, fn))
+        return job
+
+    def _run(self) -> None:
+        while True:
+            job, fn = self._pending.get()
+            job.set_status("running")
+            try:
+                ok = fn(job.log)
+            except Exception as exc:  # noqa: BLE001
+                job.log(f"خطا: {exc}")
+                ok = False
+            GIT_INFO.invalidate()
+            job.set_status("ok" if ok else "failed")
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self) -> list[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+
+JOBS = JobQueue()
+JOB_STATUS_LABELS = {"queued": "در صف", "running": "در حال اجرا", "ok": "انجام شد", "failed": "خطا"}
+
+# GET pages rendered purely from these files; their ETag is derived from the file versions.
+PAGE_SOURCES: dict[str, tuple[str, ...]] = {
+    "/books": (BOOKS_JSON_REL,),
+    "/book-edit": (BOOKS_JSON_REL,),
+    "/audio": (AUDIO_JSON_REL, BOOKS_JSON_REL),
+    "/audio-edit": (AUDIO_JSON_REL,),
+    "/structure": (STRUCTURE_JSON_REL,),
+    "/structure-edit": (STRUCTURE_JSON_REL,),
+    "/app-update": (UPDATE_JSON_REL,),
+}
+# Part of every ETag so that pages rendered by an older panel are not reused after an upgrade.
+PANEL_BUILD = content_version(Path(__file__).read_bytes())
+
+
+def id_index(rows: object) -> dict[object, int]:
+    """Map each row's id to its position among the dict rows (the idx used by edit links)."""
+    index: dict[object, int] = {}
+    if isinstance(rows, list):
+        for idx, row in enumerate(row for row in rows if isinstance(row, dict)):
+            index.setdefault(row.get("id"), idx)
+    return index
+
+
+def dict_rows(data: object) -> list[dict]:
+    if not isinstance(data, list):
+        return []
+    return [row for row in data if isinstance(row, dict)]
+
+
+def sort_value(value: object) -> tuple[int, float, str]:
+    """Sort key that puts numbers (and numeric strings) first, then text, then empty cells."""
+    if isinstance(value, (int, float)):
+        return 0, float(value), ""
+    text = "" if value is None else str(value).strip()
+    if not text:
+        return 2, 0.0, ""
+    try:
+        return 0, float(text), ""
+    except ValueError:
+        return 1, 0.0, data_ops.normalize_search(text)
+
+
+class TableView:
+    """One table's rows with a normalized search string per row.
+
+    Built through STORE.derived(), so it lives exactly as long as the document
+    version it was built from. Sort orders are computed on first use and kept.
+    """
+
+    def __init__(self, rows: list[dict], haystack: Callable[[dict], list[object]]) -> None:
+        self.rows = rows
+        self.search = [
+            data_ops.normalize_search(" ".join("" if part is None else str(part) for part in haystack(row)))
+            for row in rows
+        ]
+        self._orders: dict[str, list[int]] = {}
+
+    def order(self, sort: str) -> list[int]:
+        order = self._orders.get(sort)
+        if order is None:
+            key = sort.lstrip("-")
+            order = sorted(
+                range(len(self.rows)),
+                key=lambda i: sort_value(self.rows[i].get(key)),
+                reverse=sort.startswith("-"),
+            )
+            self._orders[sort] = order
+        return order
+
+    def select(self, q: str, sort: str, sortable: tuple[str, ...]) -> list[int]:
+        """Positions of the rows matching q, in the requested order (file order if sort is unknown)."""
+        positions: Any = self.order(sort) if sort.lstrip("-") in sortable else range(len(self.rows))
+        query = data_ops.normalize_search(q)
+        if query:
+            search = self.search
+            return [i for i in positions if query in search[i]]
+        return list(positions)
+
+
+def book_search_fields(row: dict) -> list[object]:
+    return [row.get("id"), row.get("title"), row.get("version"), row.get("status"), get_first_url(row)]
+
+
+def audio_search_fields(row: dict) -> list[object]:
+    return [row.get(k) for k in ("kotob_id", "chapters_id", "lang", "narrator", "title", "url")]
+
+
+def category_search_fields(row: dict) -> list[object]:
+    return [row.get(k) for k in ("id", "title", "sort_order", "icon")]
+
+
+def chapter_search_fields(row: dict) -> list[object]:
+    return [row.get(k) for k in ("id", "category_id", "parent_id", "title", "icon")]
+
+
+def structure_rows(section: str) -> Callable[[object], list[dict]]:
+    return lambda data: dict_rows(data.get(section, [])) if isinstance(data, dict) else []
+
+
+BOOK_SORT_KEYS = ("id", "title", "version", "status")
+AUDIO_SORT_KEYS = ("kotob_id", "chapters_id", "lang", "narrator", "title")
+CATEGORY_SORT_KEYS = ("id", "title", "sort_order")
+CHAPTER_SORT_KEYS = ("id", "category_id", "parent_id", "title")
+LIST_PER_PAGE = 100
+LIST_MAX_PER_PAGE = 1000
+
+
+def list_query(params: dict[str, list[str]]) -> tuple[str, int, int, str]:
+    """q, page, per_page and sort from a list page's query string."""
+
+    def number(name: str, default: int) -> int:
+        try:
+            return int(params.get(name, [""])[0])
+        except ValueError:
+            return default
+
+    per_page = min(max(number("per_page", LIST_PER_PAGE), 1), LIST_MAX_PER_PAGE)
+    page = max(number("page", 1), 1)
+    return params.get("q", [""])[0], page, per_page, params.get("sort", [""])[0].strip()
+
+
+class ApiError(ValueError):
+    def __init__(self, message: str, status: int = HTTPStatus.BAD_REQUEST) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+# /api/<name> -> (file, key of the list inside the file or "" for a top-level array, search fields, sort keys)
+API_TABLES: dict[str, tuple[str, str, Callable[[dict], list[object]], tuple[str, ...]]] = {
+    "books": (BOOKS_JSON_REL, "", book_search_fields, BOOK_SORT_KEYS),
+    "audio": (AUDIO_JSON_REL, "", audio_search_fields, AUDIO_SORT_KEYS),
+    "structure/categories": (STRUCTURE_JSON_REL, "categories", category_search_fields, CATEGORY_SORT_KEYS),
+    "structure/chapters": (STRUCTURE_JSON_REL, "chapters", chapter_search_fields, CHAPTER_SORT_KEYS),
+}
+API_LIST_PARAMS = {"q", "page", "per_page", "sort"}
+# Fields PATCH/POST may write per table (and PATCH /api/update), typed like the edit forms save them:
+# "int" (id-like, also "12"), "int?" (int or empty/null), "text", "url" (text, empty -> null),
+# "bool" (true/false or 1/0), "lines" (array of text, blank lines dropped).
+API_FIELDS: dict[str, dict[str, str]] = {
+    "books": {
+        "id": "int",
+        "title": "text",
+        "description": "text",
+        "version": "text",
+        "status": "text",
+        "sql_download_url": "url",
+        "download_url": "url",
+        "url": "url",
+        "is_default": "int",
+        "is_downloaded_on_device": "int",
+    },
+    "audio": {
+        "kotob_id": "int?",
+        "chapters_id": "int",
+        "lang": "text",
+        "narrator": "text",
+        "title": "text",
+        "url": "text",
+    },
+    "structure/categories": {"id": "int", "title": "text", "sort_order": "int", "icon": "text"},
+    "structure/chapters": {"id": "int", "category_id": "int", "parent_id": "int", "title": "text", "icon": "text"},
+    "update": {
+        "app": "text",
+        "platform": "text",
+        "version": "text",
+        "build": "int",
+        "released_at": "text",
+        "mandatory": "bool",
+        "download_url": "text",
+        "changes": "lines",
+    },
+}
+
+
+def page_bounds(total: int, page: int, per_page: int) -> tuple[int, int, int]:
+    """Clamp page to the available range; returns (page, pages, start offset)."""
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(page, pages)
+    return page, pages, (page - 1) * per_page
 
 
 def to_int_or_keep(raw: str, allow_none: bool = False) -> object:
@@ -83,6 +615,45 @@ def to_int_or_keep(raw: str, allow_none: bool = False) -> object:
         return value
 
 
+def api_values(name: str, values: dict, where: str) -> dict:
+    """Check an API row or "set" against API_FIELDS[name] and coerce it the way the edit forms do."""
+    fields = API_FIELDS[name]
+    clean: dict = {}
+    for key, value in values.items():
+        kind = fields.get(key)
+        if kind is None:
+            raise ApiError(f"{where}: فیلد {key!r} برای {name} مجاز نیست (مجاز: {', '.join(fields)}).")
+        if kind == "lines":
+            if not isinstance(value, list) or not all(isinstance(line, str) for line in value):
+                raise ApiError(f"{where}: {key} باید آرایه‌ای از متن باشد.")
+            clean[key] = [line.strip() for line in value if line.strip()]
+            continue
+        if isinstance(value, (dict, list)):
+            raise ApiError(f"{where}: مقدار {key} باید ساده باشد، نه آبجکت یا آرایه.")
+        if kind == "bool":
+            if not isinstance(value, int) or value not in (0, 1):
+                raise ApiError(f"{where}: {key} باید true یا false باشد.")
+            clean[key] = bool(value)
+        elif kind in ("int", "int?"):
+            if value is None or (isinstance(value, str) and not value.strip()):
+                if kind == "int":
+                    raise ApiError(f"{where}: {key} نمی‌تواند خالی باشد.")
+                clean[key] = None
+                continue
+            if not isinstance(value, bool) and isinstance(value, (int, str)):
+                value = to_int_or_keep(str(value))
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ApiError(f"{where}: {key} باید عدد صحیح باشد.")
+            clean[key] = value
+        elif value is None and kind == "url":
+            clean[key] = None
+        elif not isinstance(value, str):
+            raise ApiError(f"{where}: {key} باید متن باشد.")
+        else:
+            clean[key] = value.strip() or (None if kind == "url" else "")
+    return clean
+
+
 def to_bool(raw: str) -> bool:
     return raw.strip().lower() in {"1", "true", "yes", "on"}
 
@@ -102,103 +673,248 @@ def shorten(text: str, max_len: int = 70) -> str:
 
 
 def normalize_books_urls() -> tuple[int, str]:
-    data = read_json_file(BOOKS_JSON_REL)
-    if not isinstance(data, list):
-        raise ValueError("ساختار books_metadata.json باید آرایه باشد.")
+    with file_lock(BOOKS_JSON_REL):
+        data = read_json_file(BOOKS_JSON_REL)
+        if not isinstance(data, list):
+            raise ValueError("ساختار books_metadata.json باید آرایه باشد.")
+
+        changes = reorganize.book_url_changes(data)
+        if changes:
+            reorganize.apply_book_url_changes(data, changes)
+            write_json_file(BOOKS_JSON_REL, data)
+    return len(changes), "اصلاح لینک‌ها انجام شد."
+
+
+def import_audio_rows(incoming: list, version: str = "", dry_run: bool = False, strict: bool = False) -> dict:
+    """Merge rows into the audio file with data_ops.merge_audio_rows in one locked, atomic write."""
+    book_ids = STORE.derived(BOOKS_JSON_REL, "book_ids", lambda data: data_ops.audio_ref_ids(data, None)[0])
+    chapter_ids = STORE.derived(STRUCTURE_JSON_REL, "chapter_ids", lambda data: data_ops.audio_ref_ids(None, data)[1])
+    with file_lock(AUDIO_JSON_REL):
+        rows = read_json_file(AUDIO_JSON_REL, version)
+        if not isinstance(rows, list):
+            raise ValueError("ساختار content_audio_metadata.json باید آرایه باشد.")
+        report = data_ops.merge_audio_rows(rows, incoming, book_ids, chapter_ids)
+        write = report["inserted"] + report["updated"] > 0 and not dry_run and not (strict and report["rejected"])
+        report["written"] = write
+        report["version"] = write_json_file(AUDIO_JSON_REL, rows) if write else STORE.get_versioned(AUDIO_JSON_REL)[1]
+    return report
+
+
+def import_report_text(report: dict) -> tuple[str, str]:
+    """Notice line and per-row rejection list for an import report."""
+    notice = (
+        f"درج: {report['inserted']} | به‌روزرسانی: {report['updated']} | بدون تغییر: {report['unchanged']}"
+        f" | رد شده: {len(report['rejected'])}"
+        + ("" if report["written"] else " | چیزی ذخیره نشد.")
+    )
+    lines = [f"row {item['row']}: {item['reason']}" for item in report["rejected"]]
+    return notice, "\n".join(lines)
+
+
+def commit_and_push(message: str, log: Callable[[str], None]) -> bool:
+    if stream_cmd(["git", "add", "-A"], log) != 0:
+        return False
 
-    changes = 0
-    for row in data:
-        if not isinstance(row, dict):
-            continue
-        for key in URL_KEYS:
-            val = row.get(key)
-            if not isinstance(val, str):
-                continue
-            new_val = RAW_SQL_PATTERN.sub(r"\1kotob/\2", val)
-            if new_val != val:
-                row[key] = new_val
-                changes += 1
+    diff = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=REPO_DIR, check=False)
+    if diff.returncode == 0:
+        log("تغییری برای کامیت وجود ندارد.")
+        return True
+    if diff.returncode != 1:
+        log("بررسی تغییرات stage شده با خطا روبه‌رو شد.")
+        return False
+
+    if stream_cmd(["git", "commit", "-m", message], log) != 0:
+        return False
+    return stream_cmd(["git", "push", "origin", current_branch()], log) == 0
+
+
+def run_reorganize(log: Callable[[str], None], dry_run: bool = False) -> bool:
+    """In-process reorganize; the books URL rewrite goes through STORE and the books file lock."""
+    with file_lock(BOOKS_JSON_REL):
+        reorganize.reorganize(
+            REPO_DIR,
+            log,
+            dry_run=dry_run,
+            load_books=STORE.get if dry_run else read_json_file,
+            save_books=write_json_file,
+        )
+    if not dry_run:
+        stream_cmd(["git", "status", "--short"], log)
+    return True
 
-    if changes > 0:
-        write_json_file(BOOKS_JSON_REL, data)
-    return changes, "اصلاح لینک‌ها انجام شد."
 
+def run_pull(log: Callable[[str], None]) -> bool:
+    return stream_cmd(["git", "pull", "--rebase", "origin", current_branch()], log) == 0
 
-def commit_and_push(message: str) -> tuple[bool, str]:
-    logs: list[str] = []
 
-    code, out = run_cmd(["git", "add", "-A"])
-    logs.append("$ git add -A")
-    if out:
-        logs.append(out)
-    if code != 0:
-        return False, "\n".join(logs)
+SEARCH_PER_PAGE = 20
+SEARCH_LANG_LABELS = {
+    "text": "عربی",
+    "text_fa": "فارسی",
+    "text_turkmen": "ترکمنی",
+    "text_en": "انگلیسی",
+    "text_tr": "ترکی",
+    "text_ru": "روسی",
+}
 
-    diff = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=REPO_DIR, check=False)
-    if diff.returncode == 0:
-        logs.append("تغییری برای کامیت وجود ندارد.")
-        return True, "\n".join(logs)
-    if diff.returncode != 1:
-        logs.append("بررسی تغییرات stage شده با خطا روبه‌رو شد.")
-        return False, "\n".join(logs)
 
-    code, out = run_cmd(["git", "commit", "-m", message])
-    logs.append(f"$ git commit -m {message!r}")
-    if out:
-        logs.append(out)
-    if code != 0:
-        return False, "\n".join(logs)
+def search_index_path() -> Path:
+    return REPO_DIR / data_ops.DOCTOR_CACHE_DIR / data_ops.SEARCH_INDEX_FILE
 
-    code, branch = run_cmd(["git", "branch", "--show-current"])
-    branch = branch.strip() if code == 0 else "main"
 
-    code, out = run_cmd(["git", "push", "origin", branch])
-    logs.append(f"$ git push origin {branch}")
-    if out:
-        logs.append(out)
-    return code == 0, "\n".join(logs)
+def search_query(params: dict[str, list[str]]) -> tuple[str, str, int | None, int]:
+    """q, lang, book id and page from the /search query string."""
+    lang = params.get("lang", [""])[0]
+    try:
+        book_id: int | None = int(params.get("book", [""])[0])
+    except ValueError:
+        book_id = None
+    try:
+        page = max(int(params.get("page", [""])[0]), 1)
+    except ValueError:
+        page = 1
+    return params.get("q", [""])[0].strip(), lang if lang in SEARCH_LANG_LABELS else "", book_id, page
 
 
-def run_reorganize() -> tuple[bool, str]:
-    script = REPO_DIR / "tools" / "reorganize_assets.sh"
-    if not script.exists():
-        return False, f"اسکریپت پیدا نشد: {script}"
+def search_content(q: str, lang: str, book_id: int | None, page: int) -> tuple[int, list[dict]]:
+    """(total, hits) from the index built by data_ops build-search-index; read-only, one connection per call."""
+    path = search_index_path()
+    if not path.exists():
+        raise FileNotFoundError(f"ایندکس جستجو ساخته نشده است: {path}")
+    conn = sqlite3.connect(path.as_uri() + "?mode=ro", uri=True)
+    try:
+        return data_ops.search_index(
+            conn,
+            q,
+            [lang] if lang else data_ops.SEARCH_COLUMNS,
+            book_id,
+            limit=SEARCH_PER_PAGE,
+            offset=(page - 1) * SEARCH_PER_PAGE,
+        )
+    finally:
+        conn.close()
 
-    code, out = run_cmd(["zsh", str(script)])
-    logs = [f"$ zsh {script.relative_to(REPO_DIR)}"]
-    if out:
-        logs.append(out)
-    return code == 0, "\n".join(logs)
+
+def run_search_index(log: Callable[[str], None]) -> bool:
+    """Incremental index update from the patches in kotob/; only changed patches are replayed."""
+    sql_paths = data_ops.sql_patch_files(REPO_DIR / reorganize.BOOK_DIR)
+    report = data_ops.build_search_index(search_index_path(), sql_paths=sql_paths, log=log)
+    log(
+        f"Books indexed: {report['books_indexed']}, updated: {report['books_updated']}, "
+        f"unchanged: {report['books_unchanged']}, removed: {report['books_removed']}"
+    )
+    return True
 
 
 class PanelHandler(BaseHTTPRequestHandler):
-    def _send_html(self, body: str, status: int = HTTPStatus.OK) -> None:
-        payload = body.encode("utf-8")
+    def _accepts_gzip(self) -> bool:
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = part.partition(";")
+            if name.strip().lower() in {"gzip", "*"}:
+                q = params.strip().lower()
+                return not (q.startswith("q=") and q[2:].strip() in {"0", "0.0", "0.00", "0.000"})
+        return False
+
+    def _page_validators(self, path: str, query: str) -> tuple[str, float] | None:
+        """(ETag, Last-Modified) for a GET page built only from PAGE_SOURCES files, else None."""
+        sources = PAGE_SOURCES.get(path)
+        if not sources:
+            return None
+        try:
+            versions = [STORE.get_versioned(rel)[1] for rel in sources]
+            mtime = max(resolve_repo_path(rel).stat().st_mtime for rel in sources)
+        except Exception:  # noqa: BLE001
+            return None
+        tag = hashlib.sha256("\0".join([PANEL_BUILD, path, query, *versions]).encode("utf-8")).hexdigest()[:20]
+        return tag, mtime
+
+    def _not_modified(self, validators: tuple[str, float]) -> bool:
+        tag, mtime = validators
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = {t.strip()[2:] if t.strip().startswith("W/") else t.strip() for t in if_none_match.split(",")}
+            return "*" in tags or f'"{tag}"' in tags or f'"{tag}-gzip"' in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def _send_validators(self, validators: tuple[str, float] | None, gzipped: bool) -> None:
+        if validators is None:
+            return
+        tag, mtime = validators
+        # Strong ETags must differ per content coding.
+        self.send_header("ETag", f'"{tag}-gzip"' if gzipped else f'"{tag}"')
+        self.send_header("Last-Modified", email.utils.formatdate(mtime, usegmt=True))
+        self.send_header("Cache-Control", "no-cache")
+
+    def _send_not_modified(self, validators: tuple[str, float]) -> None:
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self._send_validators(validators, self._accepts_gzip())
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+
+    def _send_payload(
+        self,
+        payload: bytes,
+        content_type: str,
+        status: int,
+        validators: tuple[str, float] | None = None,
+    ) -> None:
+        gzipped = len(payload) >= GZIP_MIN_BYTES and self._accepts_gzip()
+        if gzipped:
+            payload = gzip.compress(payload, compresslevel=6)
         self.send_response(status)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Vary", "Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if status == HTTPStatus.OK:
+            self._send_validators(validators, gzipped)
         self.end_headers()
         self.wfile.write(payload)
 
+    def _send_html(
+        self,
+        body: str,
+        status: int = HTTPStatus.OK,
+        validators: tuple[str, float] | None = None,
+    ) -> None:
+        self._send_payload(body.encode("utf-8"), "text/html; charset=utf-8", status, validators)
+
     def _parse_post(self) -> dict[str, list[str]]:
         length = int(self.headers.get("Content-Length", "0"))
         raw = self.rfile.read(length).decode("utf-8")
         return parse_qs(raw, keep_blank_values=True)
 
-    def _load_array(self, rel_path: str, label: str) -> list[dict]:
-        data = read_json_file(rel_path)
+    def _send_json(self, payload: object, status: int = HTTPStatus.OK) -> None:
+        body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        self._send_payload(body, "application/json; charset=utf-8", status)
+
+    def _load_array(self, rel_path: str, label: str, for_update: bool = False, version: str = "") -> list[dict]:
+        data = read_json_file(rel_path, version) if for_update else STORE.get(rel_path)
         if not isinstance(data, list):
             raise ValueError(f"ساختار فایل {label} باید آرایه باشد.")
-        return [row for row in data if isinstance(row, dict)]
+        if for_update:
+            return dict_rows(data)
+        return STORE.derived(rel_path, "rows", dict_rows)
 
-    def _load_books(self) -> list[dict]:
-        return self._load_array(BOOKS_JSON_REL, "books_metadata")
+    def _load_books(self, for_update: bool = False, version: str = "") -> list[dict]:
+        return self._load_array(BOOKS_JSON_REL, "books_metadata", for_update, version)
 
-    def _load_audio(self) -> list[dict]:
-        return self._load_array(AUDIO_JSON_REL, "content_audio_metadata")
+    def _load_audio(self, for_update: bool = False, version: str = "") -> list[dict]:
+        return self._load_array(AUDIO_JSON_REL, "content_audio_metadata", for_update, version)
 
-    def _load_structure(self) -> dict:
-        data = read_json_file(STRUCTURE_JSON_REL)
+    def _load_structure(self, for_update: bool = False, version: str = "") -> dict:
+        if for_update:
+            data = read_json_file(STRUCTURE_JSON_REL, version)
+        else:
+            data = STORE.get(STRUCTURE_JSON_REL)
         if not isinstance(data, dict):
             raise ValueError("ساختار structure_metadata.json باید آبجکت باشد.")
         if not isinstance(data.get("categories", []), list):
@@ -207,6 +923,48 @@ class PanelHandler(BaseHTTPRequestHandler):
             raise ValueError("کلید chapters باید آرایه باشد.")
         return data
 
+    @staticmethod
+    def _table_view(
+        rel_path: str,
+        name: str,
+        rows_of: Callable[[object], list[dict]],
+        fields: Callable[[dict], list[object]],
+    ) -> TableView:
+        return STORE.derived(rel_path, f"view:{name}", lambda data: TableView(rows_of(data), fields))
+
+    @staticmethod
+    def _list_href(path: str, params: dict[str, object]) -> str:
+        query = urlencode({k: v for k, v in params.items() if v not in ("", None)})
+        return html.escape(f"{path}?{query}" if query else path)
+
+    def _sort_header(self, label: str, key: str, path: str, params: dict[str, object]) -> str:
+        current = str(params.get("sort", ""))
+        if current == key:
+            next_sort, mark = f"-{key}", " ▲"
+        elif current == f"-{key}":
+            next_sort, mark = "", " ▼"
+        else:
+            next_sort, mark = key, ""
+        href = self._list_href(path, {**params, "sort": next_sort, "page": ""})
+        return f"<th><a href='{href}'>{html.escape(label)}{mark}</a></th>"
+
+    def _pager(self, path: str, params: dict[str, object], page: int, pages: int) -> str:
+        if pages <= 1:
+            return ""
+
+        def link(label: str, target: int) -> str:
+            if target < 1 or target > pages or target == page:
+                return f"<span class='btn ghost' aria-disabled='true'>{label}</span>"
+            return f"<a class='btn ghost' href='{self._list_href(path, {**params, 'page': target})}'>{label}</a>"
+
+        return (
+            "<div class='toolbar'>"
+            f"{link('« اول', 1)}{link('‹ قبلی', page - 1)}"
+            f"<span class='muted'>صفحه {page} از {pages}</span>"
+            f"{link('بعدی ›', page + 1)}{link('آخر »', pages)}"
+            "</div>"
+        )
+
     def _base_layout(
         self,
         *,
@@ -352,8 +1110,12 @@ class PanelHandler(BaseHTTPRequestHandler):
     table {{ width: 100%; border-collapse: collapse; min-width: 860px; background: #fff; }}
     th, td {{ border-bottom: 1px solid var(--border); padding: 10px; font-size: 13px; text-align: right; vertical-align: top; }}
     th {{ background: #fafafa; font-weight: 900; white-space: nowrap; }}
+    th a {{ color: inherit; text-decoration: none; }}
+    .btn[aria-disabled=true] {{ opacity: 0.45; cursor: default; }}
     tr:nth-child(even) td {{ background: #fcfcfd; }}
     .empty {{ padding: 14px; color: var(--muted); font-size: 14px; }}
+    td.snippet {{ unicode-bidi: plaintext; line-height: 1.9; }}
+    mark {{ background: #fde68a; border-radius: 4px; padding: 0 2px; }}
     .pill {{
       display: inline-block;
       padding: 2px 8px;
@@ -402,6 +1164,7 @@ class PanelHandler(BaseHTTPRequestHandler):
         <a href=\"/structure?section=categories\">ساختار (دسته‌ها)</a>
         <a href=\"/structure?section=chapters\">ساختار (فصل‌ها)</a>
         <a href=\"/app-update\">آپدیت برنامه</a>
+        <a href=\"/search\">جستجوی متن</a>
       </div>
     </div>
     {notice_block}
@@ -412,9 +1175,8 @@ class PanelHandler(BaseHTTPRequestHandler):
 </html>"""
 
     def _render_dashboard(self, notice: str = "", cmd_output: str = "") -> str:
-        _, status_out = run_cmd(["git", "status", "--short", "-b"])
-        _, commits_out = run_cmd(["git", "log", "--oneline", "-n", "6"])
-        _, remote_out = run_cmd(["git", "remote", "-v"])
+        git_info = GIT_INFO.get()
+        status_out, commits_out, remote_out = git_info["status"], git_info["commits"], git_info["remotes"]
 
         books_count = "-"
         audio_count = "-"
@@ -437,7 +1199,7 @@ class PanelHandler(BaseHTTPRequestHandler):
         except Exception:
             pass
         try:
-            app_update = read_json_file(UPDATE_JSON_REL)
+            app_update = STORE.get(UPDATE_JSON_REL)
             if isinstance(app_update, dict):
                 app_version = str(app_update.get("version", "-"))
         except Exception:
@@ -453,6 +1215,23 @@ class PanelHandler(BaseHTTPRequestHandler):
             for path in DEFAULT_EDIT_FILES
         )
 
+        job_rows = "".join(
+            "<tr>"
+            f"<td><a href='/jobs/{job.id}'>#{job.id}</a></td>"
+            f"<td>{html.escape(job.title)}</td>"
+            f"<td><span class='pill'>{JOB_STATUS_LABELS.get(job.status, job.status)}</span></td>"
+            f"<td>{time.strftime('%H:%M:%S', time.localtime(job.created))}</td>"
+            "</tr>"
+            for job in JOBS.recent()[:6]
+        )
+        jobs_card = (
+            "<div class='card'><h2>کارهای اخیر Git</h2><div class='table-wrap'><table>"
+            "<thead><tr><th>#</th><th>کار</th><th>وضعیت</th><th>زمان</th></tr></thead>"
+            f"<tbody>{job_rows}</tbody></table></div></div>"
+            if job_rows
+            else ""
+        )
+
         content = f"""
 <div class=\"grid\">
   <div class=\"card\"><p class=\"kpi\">{books_count}</p><div class=\"kpi-label\">تعداد کتاب‌ها</div></div>
@@ -475,6 +1254,14 @@ class PanelHandler(BaseHTTPRequestHandler):
         <input type=\"hidden\" name=\"action\" value=\"reorganize\">
         <button class=\"btn teal\" type=\"submit\">مرتب‌سازی json/kotob/update</button>
       </form>
+      <form class=\"inline\" method=\"post\" action=\"/run\">
+        <input type=\"hidden\" name=\"action\" value=\"reorganize-dry\">
+        <button class=\"btn ghost\" type=\"submit\">پیش‌نمایش مرتب‌سازی</button>
+      </form>
+      <form class=\"inline\" method=\"post\" action=\"/run\">
+        <input type=\"hidden\" name=\"action\" value=\"search-index\">
+        <button class=\"btn ghost\" type=\"submit\">به‌روزرسانی ایندکس جستجو</button>
+      </form>
     </div>
     <form method=\"post\" action=\"/run\">
       <input type=\"hidden\" name=\"action\" value=\"push\">
@@ -498,6 +1285,8 @@ class PanelHandler(BaseHTTPRequestHandler):
   </div>
 </div>
 
+{jobs_card}
+
 <div class=\"card\">
   <h2>فایل‌های اصلی</h2>
   <div class=\"table-wrap\">
@@ -526,9 +1315,18 @@ class PanelHandler(BaseHTTPRequestHandler):
             cmd_output=cmd_output,
         )
 
-    def _render_books(self, notice: str = "", cmd_output: str = "", q: str = "") -> str:
+    def _render_books(
+        self,
+        notice: str = "",
+        cmd_output: str = "",
+        q: str = "",
+        page: int = 1,
+        per_page: int = LIST_PER_PAGE,
+        sort: str = "",
+    ) -> str:
         try:
             books = self._load_books()
+            view = self._table_view(BOOKS_JSON_REL, "books", dict_rows, book_search_fields)
         except Exception as exc:  # noqa: BLE001
             return self._base_layout(
                 title="مدیریت کتاب‌ها",
@@ -537,21 +1335,19 @@ class PanelHandler(BaseHTTPRequestHandler):
                 cmd_output=cmd_output,
             )
 
-        query = q.strip().lower()
+        matches = view.select(q, sort, BOOK_SORT_KEYS)
+        shown = len(matches)
+        page, pages, start = page_bounds(shown, page, per_page)
+        params: dict[str, object] = {"q": q, "sort": sort, "per_page": per_page if per_page != LIST_PER_PAGE else ""}
         rows: list[str] = []
-        shown = 0
 
-        for idx, row in enumerate(books):
+        for idx in matches[start : start + per_page]:
+            row = view.rows[idx]
             bid = row.get("id", "")
             title = str(row.get("title", ""))
             version = str(row.get("version", ""))
             status = str(row.get("status", ""))
             url = get_first_url(row)
-            haystack = " ".join([str(bid), title, version, status, url]).lower()
-            if query and query not in haystack:
-                continue
-
-            shown += 1
             safe_url = html.escape(url)
             url_cell = (
                 f"<a href='{safe_url}' target='_blank' rel='noreferrer'>{html.escape(shorten(url, 80))}</a>"
@@ -572,6 +1368,10 @@ class PanelHandler(BaseHTTPRequestHandler):
 
         rows_html = "\n".join(rows)
         empty = "" if rows else "<div class='empty'>موردی برای نمایش وجود ندارد.</div>"
+        sort_headers = "".join(
+            self._sort_header(label, key, "/books", params)
+            for label, key in (("id", "id"), ("عنوان", "title"), ("نسخه", "version"), ("وضعیت", "status"))
+        )
 
         content = f"""
 <div class=\"card\">
@@ -580,6 +1380,8 @@ class PanelHandler(BaseHTTPRequestHandler):
   <div class=\"toolbar\">
     <form class=\"inline\" method=\"get\" action=\"/books\">
       <input type=\"text\" name=\"q\" value=\"{html.escape(q)}\" placeholder=\"جستجو: id، عنوان، وضعیت، لینک\">
+      <input type=\"hidden\" name=\"sort\" value=\"{html.escape(sort)}\">
+      <input type=\"hidden\" name=\"per_page\" value=\"{per_page}\">
       <button class=\"btn ghost\" type=\"submit\">جستجو</button>
       <a class=\"btn ghost\" href=\"/books\">پاک کردن</a>
     </form>
@@ -592,12 +1394,13 @@ class PanelHandler(BaseHTTPRequestHandler):
   <div class=\"table-wrap\">
     <table>
       <thead>
-        <tr><th>#</th><th>id</th><th>عنوان</th><th>نسخه</th><th>وضعیت</th><th>لینک دانلود</th><th>عملیات</th></tr>
+        <tr><th>#</th>{sort_headers}<th>لینک دانلود</th><th>عملیات</th></tr>
       </thead>
       <tbody>{rows_html}</tbody>
     </table>
     {empty}
   </div>
+  {self._pager("/books", params, page, pages)}
 </div>
 """
 
@@ -610,6 +1413,8 @@ class PanelHandler(BaseHTTPRequestHandler):
 
     def _render_book_edit(self, idx: int, notice: str = "", cmd_output: str = "") -> str:
         try:
+            # Version first: if the file changes before the rows are read, the save is refused.
+            version = STORE.get_versioned(BOOKS_JSON_REL)[1]
             books = self._load_books()
             if idx < 0 or idx >= len(books):
                 return self._render_books(notice="ردیف انتخاب‌شده معتبر نیست.")
@@ -627,6 +1432,7 @@ class PanelHandler(BaseHTTPRequestHandler):
   <p class=\"muted\">ردیف: {idx + 1}</p>
   <form method=\"post\" action=\"/book-save\">
     <input type=\"hidden\" name=\"idx\" value=\"{idx}\">
+    <input type=\"hidden\" name=\"file_version\" value=\"{version}\">
     <div class=\"two-col\">
       <div class=\"field\"><label>id</label><input type=\"number\" name=\"id\" value=\"{html.escape(val('id'))}\"></div>
       <div class=\"field\"><label>version</label><input type=\"text\" name=\"version\" value=\"{html.escape(val('version'))}\"></div>
@@ -654,9 +1460,18 @@ class PanelHandler(BaseHTTPRequestHandler):
             cmd_output=cmd_output,
         )
 
-    def _render_audio(self, notice: str = "", cmd_output: str = "", q: str = "") -> str:
+    def _render_audio(
+        self,
+        notice: str = "",
+        cmd_output: str = "",
+        q: str = "",
+        page: int = 1,
+        per_page: int = LIST_PER_PAGE,
+        sort: str = "",
+    ) -> str:
         try:
             audio_rows = self._load_audio()
+            view = self._table_view(AUDIO_JSON_REL, "audio", dict_rows, audio_search_fields)
         except Exception as exc:  # noqa: BLE001
             return self._base_layout(
                 title="مدیریت صوت",
@@ -665,33 +1480,38 @@ class PanelHandler(BaseHTTPRequestHandler):
                 cmd_output=cmd_output,
             )
 
-        query = q.strip().lower()
+        try:
+            books = self._load_books()
+            book_pos = STORE.derived(BOOKS_JSON_REL, "id_index", id_index)
+        except Exception:  # noqa: BLE001
+            books, book_pos = [], {}
+
+        matches = view.select(q, sort, AUDIO_SORT_KEYS)
+        shown = len(matches)
+        page, pages, start = page_bounds(shown, page, per_page)
+        params: dict[str, object] = {"q": q, "sort": sort, "per_page": per_page if per_page != LIST_PER_PAGE else ""}
         rows: list[str] = []
-        shown = 0
 
-        for idx, row in enumerate(audio_rows):
+        for idx in matches[start : start + per_page]:
+            row = view.rows[idx]
             kotob_id = row.get("kotob_id")
             chapters_id = row.get("chapters_id")
             lang = str(row.get("lang", ""))
             narrator = str(row.get("narrator", ""))
             title = str(row.get("title", ""))
             url = str(row.get("url", ""))
-
-            haystack = " ".join([str(kotob_id), str(chapters_id), lang, narrator, title, url]).lower()
-            if query and query not in haystack:
-                continue
-
-            shown += 1
             safe_url = html.escape(url)
             url_cell = (
                 f"<a href='{safe_url}' target='_blank' rel='noreferrer'>{html.escape(shorten(url, 72))}</a>"
                 if url
                 else "<span class='muted'>ندارد</span>"
             )
+            book_idx = book_pos.get(kotob_id)
+            book_title = str(books[book_idx].get("title", "")) if book_idx is not None else ""
             rows.append(
                 "<tr>"
                 f"<td><span class='pill'>{idx + 1}</span></td>"
-                f"<td>{html.escape(str(kotob_id))}</td>"
+                f"<td title='{html.escape(book_title)}'>{html.escape(str(kotob_id))}</td>"
                 f"<td>{html.escape(str(chapters_id))}</td>"
                 f"<td>{html.escape(lang)}</td>"
                 f"<td>{html.escape(narrator)}</td>"
@@ -703,6 +1523,7 @@ class PanelHandler(BaseHTTPRequestHandler):
 
         rows_html = "\n".join(rows)
         empty = "" if rows else "<div class='empty'>موردی برای نمایش وجود ندارد.</div>"
+        sort_headers = "".join(self._sort_header(key, key, "/audio", params) for key in AUDIO_SORT_KEYS)
 
         content = f"""
 <div class=\"card\">
@@ -711,20 +1532,36 @@ class PanelHandler(BaseHTTPRequestHandler):
   <div class=\"toolbar\">
     <form class=\"inline\" method=\"get\" action=\"/audio\">
       <input type=\"text\" name=\"q\" value=\"{html.escape(q)}\" placeholder=\"جستجو: kotob_id، title، narrator، url\">
+      <input type=\"hidden\" name=\"sort\" value=\"{html.escape(sort)}\">
+      <input type=\"hidden\" name=\"per_page\" value=\"{per_page}\">
       <button class=\"btn ghost\" type=\"submit\">جستجو</button>
       <a class=\"btn ghost\" href=\"/audio\">پاک کردن</a>
     </form>
   </div>
 
+  <details class=\"field\">
+    <summary>ورود گروهی از CSV</summary>
+    <form method=\"post\" action=\"/audio-import\">
+      <p class=\"muted\">سطر اول: <code class='mono'>kotob_id,chapters_id,lang,narrator,title,url</code> — ردیف تکراری (کتاب، فصل، زبان، لینک) به‌روزرسانی می‌شود.</p>
+      <textarea name=\"csv\" dir=\"ltr\" placeholder=\"kotob_id,chapters_id,lang,narrator,title,url\"></textarea>
+      <div class=\"toolbar\">
+        <label class=\"checkbox\"><input type=\"checkbox\" name=\"dry_run\" value=\"1\">فقط بررسی</label>
+        <label class=\"checkbox\"><input type=\"checkbox\" name=\"strict\" value=\"1\">اگر ردیفی رد شد، هیچ چیز ذخیره نشود</label>
+        <button class=\"btn teal\" type=\"submit\">ورود</button>
+      </div>
+    </form>
+  </details>
+
   <div class=\"table-wrap\">
     <table>
       <thead>
-        <tr><th>#</th><th>kotob_id</th><th>chapters_id</th><th>lang</th><th>narrator</th><th>title</th><th>url</th><th>عملیات</th></tr>
+        <tr><th>#</th>{sort_headers}<th>url</th><th>عملیات</th></tr>
       </thead>
       <tbody>{rows_html}</tbody>
     </table>
     {empty}
   </div>
+  {self._pager("/audio", params, page, pages)}
 </div>
 """
 
@@ -737,6 +1574,8 @@ class PanelHandler(BaseHTTPRequestHandler):
 
     def _render_audio_edit(self, idx: int, notice: str = "", cmd_output: str = "") -> str:
         try:
+            # Version first: if the file changes before the rows are read, the save is refused.
+            version = STORE.get_versioned(AUDIO_JSON_REL)[1]
             audio_rows = self._load_audio()
             if idx < 0 or idx >= len(audio_rows):
                 return self._render_audio(notice="ردیف انتخاب‌شده معتبر نیست.")
@@ -754,6 +1593,7 @@ class PanelHandler(BaseHTTPRequestHandler):
   <p class=\"muted\">ردیف: {idx + 1}</p>
   <form method=\"post\" action=\"/audio-save\">
     <input type=\"hidden\" name=\"idx\" value=\"{idx}\">
+    <input type=\"hidden\" name=\"file_version\" value=\"{version}\">
     <div class=\"two-col\">
       <div class=\"field\"><label>kotob_id</label><input type=\"number\" name=\"kotob_id\" value=\"{html.escape(val('kotob_id'))}\"></div>
       <div class=\"field\"><label>chapters_id</label><input type=\"number\" name=\"chapters_id\" value=\"{html.escape(val('chapters_id'))}\"></div>
@@ -783,13 +1623,17 @@ class PanelHandler(BaseHTTPRequestHandler):
         notice: str = "",
         cmd_output: str = "",
         q: str = "",
+        page: int = 1,
+        per_page: int = LIST_PER_PAGE,
+        sort: str = "",
     ) -> str:
         if section not in {"categories", "chapters"}:
             section = "categories"
 
         try:
-            structure = self._load_structure()
-            rows_data = [row for row in structure.get(section, []) if isinstance(row, dict)]
+            self._load_structure()
+            fields = category_search_fields if section == "categories" else chapter_search_fields
+            view = self._table_view(STRUCTURE_JSON_REL, section, structure_rows(section), fields)
         except Exception as exc:  # noqa: BLE001
             return self._base_layout(
                 title="مدیریت ساختار",
@@ -798,20 +1642,25 @@ class PanelHandler(BaseHTTPRequestHandler):
                 cmd_output=cmd_output,
             )
 
-        query = q.strip().lower()
+        sort_keys = CATEGORY_SORT_KEYS if section == "categories" else CHAPTER_SORT_KEYS
+        matches = view.select(q, sort, sort_keys)
+        shown = len(matches)
+        page, pages, start = page_bounds(shown, page, per_page)
+        params: dict[str, object] = {
+            "section": section,
+            "q": q,
+            "sort": sort,
+            "per_page": per_page if per_page != LIST_PER_PAGE else "",
+        }
         rows: list[str] = []
-        shown = 0
 
-        for idx, row in enumerate(rows_data):
+        for idx in matches[start : start + per_page]:
+            row = view.rows[idx]
             if section == "categories":
                 rid = row.get("id", "")
                 title = str(row.get("title", ""))
                 sort_order = row.get("sort_order", "")
                 icon = str(row.get("icon", ""))
-                haystack = " ".join([str(rid), title, str(sort_order), icon]).lower()
-                if query and query not in haystack:
-                    continue
-                shown += 1
                 rows.append(
                     "<tr>"
                     f"<td><span class='pill'>{idx + 1}</span></td>"
@@ -828,10 +1677,6 @@ class PanelHandler(BaseHTTPRequestHandler):
                 parent_id = row.get("parent_id", "")
                 title = str(row.get("title", ""))
                 icon = str(row.get("icon", ""))
-                haystack = " ".join([str(rid), str(category_id), str(parent_id), title, icon]).lower()
-                if query and query not in haystack:
-                    continue
-                shown += 1
                 rows.append(
                     "<tr>"
                     f"<td><span class='pill'>{idx + 1}</span></td>"
@@ -847,15 +1692,13 @@ class PanelHandler(BaseHTTPRequestHandler):
         rows_html = "\n".join(rows)
         empty = "" if rows else "<div class='empty'>موردی برای نمایش وجود ندارد.</div>"
 
-        if section == "categories":
-            headers = "<tr><th>#</th><th>id</th><th>title</th><th>sort_order</th><th>icon</th><th>عملیات</th></tr>"
-        else:
-            headers = "<tr><th>#</th><th>id</th><th>category_id</th><th>parent_id</th><th>title</th><th>icon</th><th>عملیات</th></tr>"
+        sort_headers = "".join(self._sort_header(key, key, "/structure", params) for key in sort_keys)
+        headers = f"<tr><th>#</th>{sort_headers}<th>icon</th><th>عملیات</th></tr>"
 
         content = f"""
 <div class=\"card\">
   <h2>مدیریت ساختار ({'دسته‌بندی‌ها' if section == 'categories' else 'فصل‌ها'})</h2>
-  <p class=\"muted\">منبع: <code class='mono'>{STRUCTURE_JSON_REL}</code> | تعداد کل: {len(rows_data)} | نمایش: {shown}</p>
+  <p class=\"muted\">منبع: <code class='mono'>{STRUCTURE_JSON_REL}</code> | تعداد کل: {len(view.rows)} | نمایش: {shown}</p>
 
   <div class=\"toolbar\">
     <a class=\"btn {'primary' if section == 'categories' else 'ghost'}\" href=\"/structure?section=categories\">دسته‌بندی‌ها</a>
@@ -866,6 +1709,8 @@ class PanelHandler(BaseHTTPRequestHandler):
     <form class=\"inline\" method=\"get\" action=\"/structure\">
       <input type=\"hidden\" name=\"section\" value=\"{section}\">
       <input type=\"text\" name=\"q\" value=\"{html.escape(q)}\" placeholder=\"جستجو در ردیف‌های این بخش\">
+      <input type=\"hidden\" name=\"sort\" value=\"{html.escape(sort)}\">
+      <input type=\"hidden\" name=\"per_page\" value=\"{per_page}\">
       <button class=\"btn ghost\" type=\"submit\">جستجو</button>
       <a class=\"btn ghost\" href=\"/structure?section={section}\">پاک کردن</a>
     </form>
@@ -878,6 +1723,7 @@ class PanelHandler(BaseHTTPRequestHandler):
     </table>
     {empty}
   </div>
+  {self._pager("/structure", params, page, pages)}
 </div>
 """
 
@@ -899,6 +1745,8 @@ class PanelHandler(BaseHTTPRequestHandler):
             return self._render_structure(notice="بخش نامعتبر است.")
 
         try:
+            # Version first: if the file changes before the rows are read, the save is refused.
+            version = STORE.get_versioned(STRUCTURE_JSON_REL)[1]
             structure = self._load_structure()
             rows_data = [row for row in structure.get(section, []) if isinstance(row, dict)]
             if idx < 0 or idx >= len(rows_data):
@@ -938,6 +1786,7 @@ class PanelHandler(BaseHTTPRequestHandler):
   <form method=\"post\" action=\"/structure-save\">
     <input type=\"hidden\" name=\"section\" value=\"{section}\">
     <input type=\"hidden\" name=\"idx\" value=\"{idx}\">
+    <input type=\"hidden\" name=\"file_version\" value=\"{version}\">
     {fields}
     <div class=\"toolbar\">
       <button class=\"btn primary\" type=\"submit\">ذخیره</button>
@@ -956,7 +1805,7 @@ class PanelHandler(BaseHTTPRequestHandler):
 
     def _render_app_update(self, notice: str = "", cmd_output: str = "") -> str:
         try:
-            payload = read_json_file(UPDATE_JSON_REL)
+            payload, version = STORE.get_versioned(UPDATE_JSON_REL)
             if not isinstance(payload, dict):
                 raise ValueError("ساختار update.json باید آبجکت باشد.")
         except Exception as exc:  # noqa: BLE001
@@ -984,6 +1833,7 @@ class PanelHandler(BaseHTTPRequestHandler):
   <h2>مدیریت آپدیت برنامه</h2>
   <p class=\"muted\">منبع: <code class='mono'>{UPDATE_JSON_REL}</code></p>
   <form method=\"post\" action=\"/app-update-save\">
+    <input type=\"hidden\" name=\"file_version\" value=\"{version}\">
     <div class=\"two-col\">
       <div class=\"field\"><label>app</label><input type=\"text\" name=\"app\" value=\"{html.escape(val('app'))}\"></div>
       <div class=\"field\"><label>platform</label><input type=\"text\" name=\"platform\" value=\"{html.escape(val('platform'))}\"></div>
@@ -1020,6 +1870,86 @@ class PanelHandler(BaseHTTPRequestHandler):
             cmd_output=cmd_output,
         )
 
+    def _render_search(self, q: str = "", lang: str = "", book_id: int | None = None, page: int = 1) -> str:
+        try:
+            books = {row.get("id"): str(row.get("title", "")) for row in self._load_books()}
+        except Exception:  # noqa: BLE001
+            books = {}
+
+        notice = ""
+        total, hits = 0, []
+        index_path = search_index_path()
+        if q:
+            try:
+                total, hits = search_content(q, lang, book_id, page)
+            except Exception as exc:  # noqa: BLE001
+                notice = f"خطا: {exc}"
+        if index_path.exists():
+            built = time.strftime("%Y-%m-%d %H:%M", time.localtime(index_path.stat().st_mtime))
+            index_info = f"ایندکس: <code class='mono'>{html.escape(str(index_path))}</code> | ساخته شده: {built}"
+        else:
+            index_info = (
+                "ایندکس هنوز ساخته نشده است. از داشبورد «به‌روزرسانی ایندکس جستجو» را بزن یا اجرا کن: "
+                "<code class='mono'>python3 tools/data_ops.py build-search-index --sql-dir kotob</code>"
+            )
+
+        params: dict[str, object] = {"q": q, "lang": lang, "book": "" if book_id is None else book_id}
+        pages = max(1, -(-total // SEARCH_PER_PAGE))
+        rows: list[str] = []
+        for n, hit in enumerate(hits, (page - 1) * SEARCH_PER_PAGE + 1):
+            before, match, after = hit["snippet"]
+            title = books.get(hit["kotob_id"], "")
+            rows.append(
+                "<tr>"
+                f"<td><span class='pill'>{n}</span></td>"
+                f"<td title='{html.escape(hit['source'])}'>{html.escape(title or '-')} "
+                f"<span class='muted'>({hit['kotob_id']})</span></td>"
+                f"<td>{html.escape(str(hit['chapters_id']))}</td>"
+                f"<td>{SEARCH_LANG_LABELS.get(hit['lang'], hit['lang'])}</td>"
+                f"<td class='snippet'>{html.escape(before)}<mark>{html.escape(match)}</mark>{html.escape(after)}</td>"
+                "</tr>"
+            )
+        lang_options = "".join(
+            f"<option value='{key}'{' selected' if key == lang else ''}>{label}</option>"
+            for key, label in [("", "همه زبان‌ها"), *SEARCH_LANG_LABELS.items()]
+        )
+        book_options = "".join(
+            f"<option value='{html.escape(str(bid))}'{' selected' if bid == book_id else ''}>"
+            f"{html.escape(str(bid))} - {html.escape(title)}</option>"
+            for bid, title in books.items()
+            if isinstance(bid, int)
+        )
+        if not q:
+            summary = ""
+        elif rows:
+            summary = f"<p class='muted'>{total} نتیجه</p>"
+        else:
+            summary = "<div class='empty'>نتیجه‌ای پیدا نشد.</div>"
+        table = (
+            "<div class='table-wrap'><table><thead><tr><th>#</th><th>کتاب</th><th>فصل</th><th>زبان</th><th>متن</th>"
+            f"</tr></thead><tbody>{''.join(rows)}</tbody></table></div>"
+            if rows
+            else ""
+        )
+
+        content = f"""
+<div class=\"card\">
+  <h2>جستجوی متن کتاب‌ها</h2>
+  <p class=\"muted\">{index_info}</p>
+  <form class=\"toolbar\" method=\"get\" action=\"/search\">
+    <input type=\"text\" name=\"q\" value=\"{html.escape(q)}\" placeholder=\"کلمه‌ها (همه باید باشند)؛ با * در انتها برای پیشوند\">
+    <select name=\"lang\">{lang_options}</select>
+    <select name=\"book\"><option value=''>همه کتاب‌ها</option>{book_options}</select>
+    <button class=\"btn primary\" type=\"submit\">جستجو</button>
+  </form>
+  {summary}
+  {table}
+  {self._pager("/search", params, page, pages)}
+</div>
+"""
+
+        return self._base_layout(title="جستجوی متن", content=content, notice=notice)
+
     def _render_edit(self, rel_file: str, notice: str = "", cmd_output: str = "") -> str:
         try:
             file_path = resolve_repo_path(rel_file)
@@ -1029,7 +1959,8 @@ class PanelHandler(BaseHTTPRequestHandler):
                 return self._render_dashboard(notice=f"مسیر فایل نیست: {rel_file}")
             if file_path.stat().st_size > MAX_EDIT_SIZE:
                 return self._render_dashboard(notice=f"حجم فایل برای ویرایش مرورگر زیاد است: {rel_file}")
-            text = file_path.read_text(encoding="utf-8")
+            raw = file_path.read_bytes()
+            text = raw.decode("utf-8")
         except Exception as exc:  # noqa: BLE001
             return self._render_dashboard(notice=f"باز کردن فایل ناموفق بود: {exc}")
 
@@ -1039,6 +1970,7 @@ class PanelHandler(BaseHTTPRequestHandler):
   <p class=\"muted\"><code class='mono'>{html.escape(rel_file)}</code></p>
   <form method=\"post\" action=\"/save\">
     <input type=\"hidden\" name=\"file\" value=\"{html.escape(rel_file)}\">
+    <input type=\"hidden\" name=\"file_version\" value=\"{content_version(raw)}\">
     <div class=\"field\">
       <textarea name=\"content\" style=\"min-height:72vh; direction:ltr; text-align:left; font-family:ui-monospace, Menlo, Monaco, Consolas, monospace;\">{html.escape(text)}</textarea>
     </div>
@@ -1056,17 +1988,320 @@ class PanelHandler(BaseHTTPRequestHandler):
             cmd_output=cmd_output,
         )
 
+    def _redirect(self, location: str) -> None:
+        self.send_response(HTTPStatus.SEE_OTHER)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _render_job(self, job: Job) -> str:
+        snapshot = job.snapshot()
+        log_text = "".join(f"{line}\n" for line in snapshot["log"])
+        status = JOB_STATUS_LABELS.get(snapshot["status"], snapshot["status"])
+        content = f"""
+<div class=\"card\">
+  <h2>{html.escape(job.title)}</h2>
+  <p class=\"muted\">کار #{job.id} | وضعیت: <span class='pill' id=\"job-status\">{status}</span></p>
+  <pre class=\"cli\" id=\"job-log\">{html.escape(log_text)}</pre>
+  <div class=\"toolbar\" style=\"margin-top:10px\"><a class=\"btn ghost\" href=\"/\">بازگشت به داشبورد</a></div>
+</div>
+<script>
+(function () {{
+  var done = {json.dumps(job.done)};
+  if (done || !window.EventSource) {{ return; }}
+  var log = document.getElementById("job-log");
+  var status = document.getElementById("job-status");
+  var labels = {json.dumps(JOB_STATUS_LABELS, ensure_ascii=False)};
+  var events = new EventSource("/jobs/{job.id}/events?from={len(snapshot["log"])}");
+  events.onmessage = function (e) {{
+    log.textContent += e.data + "\\n";
+    log.scrollTop = log.scrollHeight;
+  }};
+  events.addEventListener("status", function (e) {{ status.textContent = labels[e.data] || e.data; }});
+  events.addEventListener("done", function (e) {{
+    status.textContent = labels[e.data] || e.data;
+    events.close();
+  }});
+}})();
+</script>
+"""
+        return self._base_layout(title=f"کار #{job.id}", content=content)
+
+    def _stream_job(self, job: Job, seen: int) -> None:
+        """Server-sent events: one `data:` per log line, `status` on changes, `done` at the end."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+        status = ""
+        try:
+            while True:
+                lines, done = job.wait(seen, timeout=15.0)
+                chunks = []
+                if job.status != status:
+                    status = job.status
+                    chunks.append(f"event: status\ndata: {status}\n\n")
+                for line in lines:
+                    seen += 1
+                    chunks.append(f"id: {seen}\ndata: {line}\n\n")
+                if done and len(job.lines) <= seen:
+                    chunks.append(f"event: done\ndata: {job.status}\n\n")
+                self.wfile.write(("".join(chunks) or ": keep-alive\n\n").encode("utf-8"))
+                self.wfile.flush()
+                if done and len(job.lines) <= seen:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _handle_job_get(self, path: str, query: str) -> None:
+        parts = path.strip("/").split("/")
+        job = JOBS.get(parts[1]) if len(parts) >= 2 else None
+        if job is None:
+            self._send_html(self._render_dashboard(notice="کار پیدا نشد."), status=HTTPStatus.NOT_FOUND)
+            return
+        if len(parts) == 3 and parts[2] == "events":
+            params = parse_qs(query, keep_blank_values=True)
+            try:
+                seen = int(self.headers.get("Last-Event-ID") or params.get("from", ["0"])[0])
+            except ValueError:
+                seen = 0
+            self._stream_job(job, max(seen, 0))
+            return
+        self._send_html(self._render_job(job))
+
+    def _read_json_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        try:
+            body = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise ApiError(f"بدنه درخواست JSON معتبر نیست: {exc}") from exc
+        if not isinstance(body, dict):
+            raise ApiError("بدنه درخواست باید آبجکت JSON باشد.")
+        return body
+
+    def _handle_api(self, method: str, path: str, query: str) -> None:
+        name = path[len("/api/") :].strip("/")
+        rel_path = API_TABLES[name][0] if name in API_TABLES else UPDATE_JSON_REL
+        try:
+            if name in API_TABLES:
+                if method == "GET":
+                    self._send_json(self._api_list(name, parse_qs(query, keep_blank_values=True)))
+                    return
+                body = self._read_json_body()
+                payload = self._api_patch(name, body) if method == "PATCH" else self._api_insert(name, body)
+            elif name == "audio/import":
+                if method != "POST":
+                    raise ApiError("برای import فقط POST پشتیبانی می‌شود.", HTTPStatus.METHOD_NOT_ALLOWED)
+                payload = self._api_import_audio(parse_qs(query, keep_blank_values=True))
+            elif name == "jobs" or name.startswith("jobs/"):
+                if method != "GET":
+                    raise ApiError("برای jobs فقط GET پشتیبانی می‌شود.", HTTPStatus.METHOD_NOT_ALLOWED)
+                if name == "jobs":
+                    payload = {"jobs": [{k: v for k, v in job.snapshot().items() if k != "log"} for job in JOBS.recent()]}
+                else:
+                    job = JOBS.get(name[len("jobs/") :])
+                    if job is None:
+                        raise ApiError("کار پیدا نشد.", HTTPStatus.NOT_FOUND)
+                    payload = job.snapshot()
+            elif name == "search":
+                if method != "GET":
+                    raise ApiError("برای search فقط GET پشتیبانی می‌شود.", HTTPStatus.METHOD_NOT_ALLOWED)
+                payload = self._api_search(parse_qs(query, keep_blank_values=True))
+            elif name == "update":
+                if method == "GET":
+                    data, version = STORE.get_versioned(UPDATE_JSON_REL)
+                    self._send_json({"file": UPDATE_JSON_REL, "version": version, "data": data})
+                    return
+                if method != "PATCH":
+                    raise ApiError("برای update فقط GET و PATCH پشتیبانی می‌شود.", HTTPStatus.METHOD_NOT_ALLOWED)
+                payload = self._api_patch_update(self._read_json_body())
+            else:
+                raise ApiError("مسیر API پیدا نشد.", HTTPStatus.NOT_FOUND)
+        except ApiError as exc:
+            self._send_json({"error": str(exc)}, status=exc.status)
+            return
+        except VersionConflict as exc:
+            self._send_json(
+                {"error": str(exc), "version": STORE.get_versioned(rel_path)[1]},
+                status=HTTPStatus.CONFLICT,
+            )
+            return
+        except Exception as exc:  # noqa: BLE001
+            self._send_json({"error": str(exc)}, status=HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+        self._send_json(payload)
+
+    def _api_list(self, name: str, params: dict[str, list[str]]) -> dict[str, object]:
+        rel_path, key, fields, sort_keys = API_TABLES[name]
+        version = STORE.get_versioned(rel_path)[1]
+        if key:
+            self._load_structure()
+            view = self._table_view(rel_path, key, structure_rows(key), fields)
+        else:
+            self._load_array(rel_path, name)
+            view = self._table_view(rel_path, name, dict_rows, fields)
+
+        q, page, per_page, sort = list_query(params)
+        matches = view.select(q, sort, sort_keys)
+        filters = {k: v[0] for k, v in params.items() if k not in API_LIST_PARAMS}
+        if filters:
+            rows = view.rows
+            matches = [
+                i
+                for i in matches
+                if all(("" if rows[i].get(k) is None else str(rows[i].get(k))) == v for k, v in filters.items())
+            ]
+        page, pages, start = page_bounds(len(matches), page, per_page)
+        return {
+            "file": rel_path,
+            "version": version,
+            "total": len(view.rows),
+            "matched": len(matches),
+            "page": page,
+            "per_page": per_page,
+            "pages": pages,
+            "items": [{"idx": i, "row": view.rows[i]} for i in matches[start : start + per_page]],
+        }
+
+    @staticmethod
+    def _api_rows(name: str, data: object) -> list[dict]:
+        key = API_TABLES[name][1]
+        container = data.get(key) if key and isinstance(data, dict) else data
+        if not isinstance(container, list):
+            raise ApiError(f"ساختار فایل {API_TABLES[name][0]} برای {name} آرایه نیست.")
+        return dict_rows(container)
+
+    @staticmethod
+    def _store_rows(name: str, data: object, rows: list[dict]) -> object:
+        key = API_TABLES[name][1]
+        if key:
+            data[key] = rows  # type: ignore[index]
+            return data
+        return rows
+
+    @staticmethod
+    def _api_targets(rows: list[dict], updates: object) -> list[tuple[int, dict]]:
+        """Resolve every {"idx"|"match", "set"} entry to a row position before anything is changed."""
+        if not isinstance(updates, list) or not updates:
+            raise ApiError("فیلد updates باید آرایه‌ای غیرخالی باشد.")
+        lookups: dict[tuple[str, ...], dict[tuple[str, ...], list[int]]] = {}
+        targets: list[tuple[int, dict]] = []
+        for n, update in enumerate(updates):
+            if not isinstance(update, dict) or not isinstance(update.get("set"), dict) or not update["set"]:
+                raise ApiError(f"updates[{n}]: فیلد set باید آبجکت غیرخالی باشد.")
+            if "idx" in update:
+                idx = update["idx"]
+                if not isinstance(idx, int) or isinstance(idx, bool) or not 0 <= idx < len(rows):
+                    raise ApiError(f"updates[{n}]: ردیف {idx!r} وجود ندارد.")
+            elif isinstance(update.get("match"), dict) and update["match"]:
+                keys = tuple(sorted(update["match"]))
+                lookup = lookups.get(keys)
+                if lookup is None:
+                    lookup = lookups[keys] = {}
+                    for pos, row in enumerate(rows):
+                        lookup.setdefault(tuple(json.dumps(row.get(k)) for k in keys), []).append(pos)
+                found = lookup.get(tuple(json.dumps(update["match"][k]) for k in keys), [])
+                if len(found) != 1:
+                    raise ApiError(f"updates[{n}]: match باید دقیقا یک ردیف پیدا کند ({len(found)} ردیف پیدا شد).")
+                idx = found[0]
+            else:
+                raise ApiError(f"updates[{n}]: یکی از idx یا match لازم است.")
+            targets.append((idx, update["set"]))
+        return targets
+
+    def _api_patch(self, name: str, body: dict) -> dict[str, object]:
+        rel_path = API_TABLES[name][0]
+        with file_lock(rel_path):
+            data = read_json_file(rel_path, str(body.get("file_version", "")))
+            rows = self._api_rows(name, data)
+            targets = [
+                (idx, api_values(name, changes, f"updates[{n}]"))
+                for n, (idx, changes) in enumerate(self._api_targets(rows, body.get("updates")))
+            ]
+            for idx, changes in targets:
+                rows[idx].update(changes)
+            version = write_json_file(rel_path, self._store_rows(name, data, rows))
+        return {"file": rel_path, "version": version, "updated": sorted({idx for idx, _ in targets})}
+
+    def _api_insert(self, name: str, body: dict) -> dict[str, object]:
+        rel_path = API_TABLES[name][0]
+        new_rows = body.get("rows")
+        if not isinstance(new_rows, list) or not new_rows or not all(isinstance(r, dict) for r in new_rows):
+            raise ApiError("فیلد rows باید آرایه‌ای غیرخالی از آبجکت‌ها باشد.")
+        new_rows = [api_values(name, row, f"rows[{n}]") for n, row in enumerate(new_rows)]
+        with file_lock(rel_path):
+            data = read_json_file(rel_path, str(body.get("file_version", "")))
+            rows = self._api_rows(name, data)
+            first = len(rows)
+            rows.extend(new_rows)
+            version = write_json_file(rel_path, self._store_rows(name, data, rows))
+        return {"file": rel_path, "version": version, "inserted": len(new_rows), "first_idx": first}
+
+    def _api_import_audio(self, params: dict[str, list[str]]) -> dict[str, object]:
+        """JSON {"rows": [...]} or a text/csv body; flags come from the body or the query string."""
+        if self.headers.get("Content-Type", "").split(";", 1)[0].strip() == "text/csv":
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            body: dict = {k: v[0] for k, v in params.items()}
+            rows = data_ops.read_audio_csv(self.rfile.read(length).decode("utf-8"))
+        else:
+            body = {**{k: v[0] for k, v in params.items()}, **self._read_json_body()}
+            rows = body.get("rows")
+        if not isinstance(rows, list) or not rows:
+            raise ApiError("هیچ ردیفی برای import ارسال نشده است.")
+        return import_audio_rows(
+            rows,
+            version=str(body.get("file_version", "")),
+            dry_run=to_bool(str(body.get("dry_run", ""))),
+            strict=to_bool(str(body.get("strict", ""))),
+        )
+
+    def _api_search(self, params: dict[str, list[str]]) -> dict[str, object]:
+        q, lang, book_id, page = search_query(params)
+        if not q:
+            raise ApiError("پارامتر q لازم است.")
+        try:
+            total, hits = search_content(q, lang, book_id, page)
+        except FileNotFoundError as exc:
+            raise ApiError(str(exc), HTTPStatus.SERVICE_UNAVAILABLE) from exc
+        for hit in hits:
+            before, match, after = hit.pop("snippet")
+            hit["snippet"] = {"before": before, "match": match, "after": after}
+        return {"q": q, "total": total, "page": page, "per_page": SEARCH_PER_PAGE, "hits": hits}
+
+    def _api_patch_update(self, body: dict) -> dict[str, object]:
+        changes = body.get("set")
+        if not isinstance(changes, dict) or not changes:
+            raise ApiError("فیلد set باید آبجکت غیرخالی باشد.")
+        changes = api_values("update", changes, "set")
+        with file_lock(UPDATE_JSON_REL):
+            data = read_json_file(UPDATE_JSON_REL, str(body.get("file_version", "")))
+            if not isinstance(data, dict):
+                raise ApiError("ساختار update.json باید آبجکت باشد.")
+            data.update(changes)
+            version = write_json_file(UPDATE_JSON_REL, data)
+        return {"file": UPDATE_JSON_REL, "version": version, "updated": sorted(changes)}
+
     def do_GET(self) -> None:  # noqa: N802
         parsed = urlparse(self.path)
 
+        if parsed.path.startswith("/api/"):
+            self._handle_api("GET", parsed.path, parsed.query)
+            return
+
+        validators = self._page_validators(parsed.path, parsed.query)
+        if validators is not None and self._not_modified(validators):
+            self._send_not_modified(validators)
+            return
+
         if parsed.path == "/":
             self._send_html(self._render_dashboard())
             return
 
         if parsed.path == "/books":
             params = parse_qs(parsed.query, keep_blank_values=True)
-            q = params.get("q", [""])[0]
-            self._send_html(self._render_books(q=q))
+            q, page, per_page, sort = list_query(params)
+            self._send_html(self._render_books(q=q, page=page, per_page=per_page, sort=sort), validators=validators)
             return
 
         if parsed.path == "/book-edit":
@@ -1074,15 +2309,15 @@ class PanelHandler(BaseHTTPRequestHandler):
             try:
                 idx = int(params.get("idx", [""])[0])
             except ValueError:
-                self._send_html(self._render_books(notice="ردیف نامعتبر است."))
+                self._send_html(self._render_books(notice="ردیف نامعتبر است."), validators=validators)
                 return
-            self._send_html(self._render_book_edit(idx))
+            self._send_html(self._render_book_edit(idx), validators=validators)
             return
 
         if parsed.path == "/audio":
             params = parse_qs(parsed.query, keep_blank_values=True)
-            q = params.get("q", [""])[0]
-            self._send_html(self._render_audio(q=q))
+            q, page, per_page, sort = list_query(params)
+            self._send_html(self._render_audio(q=q, page=page, per_page=per_page, sort=sort), validators=validators)
             return
 
         if parsed.path == "/audio-edit":
@@ -1090,16 +2325,19 @@ class PanelHandler(BaseHTTPRequestHandler):
             try:
                 idx = int(params.get("idx", [""])[0])
             except ValueError:
-                self._send_html(self._render_audio(notice="ردیف نامعتبر است."))
+                self._send_html(self._render_audio(notice="ردیف نامعتبر است."), validators=validators)
                 return
-            self._send_html(self._render_audio_edit(idx))
+            self._send_html(self._render_audio_edit(idx), validators=validators)
             return
 
         if parsed.path == "/structure":
             params = parse_qs(parsed.query, keep_blank_values=True)
             section = params.get("section", ["categories"])[0]
-            q = params.get("q", [""])[0]
-            self._send_html(self._render_structure(section=section, q=q))
+            q, page, per_page, sort = list_query(params)
+            self._send_html(
+                self._render_structure(section=section, q=q, page=page, per_page=per_page, sort=sort),
+                validators=validators,
+            )
             return
 
         if parsed.path == "/structure-edit":
@@ -1108,13 +2346,29 @@ class PanelHandler(BaseHTTPRequestHandler):
             try:
                 idx = int(params.get("idx", [""])[0])
             except ValueError:
-                self._send_html(self._render_structure(section=section, notice="ردیف نامعتبر است."))
+                self._send_html(
+                    self._render_structure(section=section, notice="ردیف نامعتبر است."),
+                    validators=validators,
+                )
                 return
-            self._send_html(self._render_structure_edit(section=section, idx=idx))
+            self._send_html(self._render_structure_edit(section=section, idx=idx), validators=validators)
             return
 
         if parsed.path == "/app-update":
-            self._send_html(self._render_app_update())
+            self._send_html(self._render_app_update(), validators=validators)
+            return
+
+        if parsed.path == "/search":
+            q, lang, book_id, page = search_query(parse_qs(parsed.query, keep_blank_values=True))
+            self._send_html(self._render_search(q=q, lang=lang, book_id=book_id, page=page))
+            return
+
+        if parsed.path == "/stats":
+            self._send_json({**STORE.stats(), "git_info_refreshes": GIT_INFO.refreshes})
+            return
+
+        if parsed.path.startswith("/jobs/"):
+            self._handle_job_get(parsed.path, parsed.query)
             return
 
         if parsed.path == "/edit":
@@ -1125,35 +2379,78 @@ class PanelHandler(BaseHTTPRequestHandler):
 
         self._send_html("<h1>Not Found</h1>", status=HTTPStatus.NOT_FOUND)
 
+    def do_PATCH(self) -> None:  # noqa: N802
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/api/"):
+            self._handle_api("PATCH", parsed.path, parsed.query)
+            return
+        self._send_json({"error": "Not Found"}, status=HTTPStatus.NOT_FOUND)
+
     def do_POST(self) -> None:  # noqa: N802
         parsed = urlparse(self.path)
 
+        if parsed.path.startswith("/api/"):
+            self._handle_api("POST", parsed.path, parsed.query)
+            return
+
         if parsed.path == "/run":
             form = self._parse_post()
             action = form.get("action", [""])[0]
 
             if action == "pull":
-                ok, logs = self._run_pull()
-                notice = "Pull انجام شد." if ok else "Pull با خطا متوقف شد."
-                self._send_html(self._render_dashboard(notice=notice, cmd_output=logs))
+                job = JOBS.submit("pull", "Pull (rebase)", run_pull)
+                self._redirect(f"/jobs/{job.id}")
                 return
 
             if action == "reorganize":
-                ok, logs = run_reorganize()
-                notice = "مرتب‌سازی فایل‌ها انجام شد." if ok else "مرتب‌سازی فایل‌ها خطا داشت."
-                self._send_html(self._render_dashboard(notice=notice, cmd_output=logs))
+                job = JOBS.submit("reorganize", "مرتب‌سازی json/kotob/update", run_reorganize)
+                self._redirect(f"/jobs/{job.id}")
+                return
+
+            if action == "reorganize-dry":
+                job = JOBS.submit(
+                    "reorganize-dry",
+                    "پیش‌نمایش مرتب‌سازی",
+                    lambda log: run_reorganize(log, dry_run=True),
+                )
+                self._redirect(f"/jobs/{job.id}")
+                return
+
+            if action == "search-index":
+                job = JOBS.submit("search-index", "به‌روزرسانی ایندکس جستجو", run_search_index)
+                self._redirect(f"/jobs/{job.id}")
                 return
 
             if action == "push":
                 message = form.get("message", [""])[0].strip() or "بروزرسانی از پنل آفلاین"
-                ok, logs = commit_and_push(message)
-                notice = "Commit و Push انجام شد." if ok else "Commit یا Push با خطا مواجه شد."
-                self._send_html(self._render_dashboard(notice=notice, cmd_output=logs))
+                job = JOBS.submit(
+                    "push", f"Commit & Push: {message}", lambda log: commit_and_push(message, log), params=message
+                )
+                self._redirect(f"/jobs/{job.id}")
                 return
 
             self._send_html(self._render_dashboard(notice="عملیات ناشناخته است."))
             return
 
+        if parsed.path == "/audio-import":
+            form = self._parse_post()
+            try:
+                rows = data_ops.read_audio_csv(form.get("csv", [""])[0])
+                if not rows:
+                    self._send_html(self._render_audio(notice="هیچ ردیفی در CSV پیدا نشد."))
+                    return
+                report = import_audio_rows(
+                    rows,
+                    dry_run=to_bool(form.get("dry_run", [""])[0]),
+                    strict=to_bool(form.get("strict", [""])[0]),
+                )
+            except Exception as exc:  # noqa: BLE001
+                self._send_html(self._render_audio(notice=f"ورود گروهی با خطا مواجه شد: {exc}"))
+                return
+            notice, rejected = import_report_text(report)
+            self._send_html(self._render_audio(notice=notice, cmd_output=rejected))
+            return
+
         if parsed.path == "/books-action":
             form = self._parse_post()
             action = form.get("action", [""])[0]
@@ -1176,37 +2473,42 @@ class PanelHandler(BaseHTTPRequestHandler):
                 self._send_html(self._render_books(notice="ردیف نامعتبر است."))
                 return
 
+            version = form.get("file_version", [""])[0]
             try:
-                books = self._load_books()
-                if idx < 0 or idx >= len(books):
-                    self._send_html(self._render_books(notice="ردیف پیدا نشد."))
-                    return
-
-                row = books[idx]
-                for key in (
-                    "title",
-                    "version",
-                    "status",
-                    "description",
-                    "sql_download_url",
-                    "download_url",
-                    "url",
-                ):
-                    value = form.get(key, [""])[0].strip()
-                    if key in URL_KEYS and value == "":
-                        row[key] = None
-                    else:
-                        row[key] = value
-
-                for int_key in ("id", "is_default", "is_downloaded_on_device"):
-                    raw = form.get(int_key, [""])[0]
-                    val = to_int_or_keep(raw, allow_none=False)
-                    if val != "":
-                        row[int_key] = val
-
-                write_json_file(BOOKS_JSON_REL, books)
+                with file_lock(BOOKS_JSON_REL):
+                    books = self._load_books(for_update=True, version=version)
+                    if idx < 0 or idx >= len(books):
+                        self._send_html(self._render_books(notice="ردیف پیدا نشد."))
+                        return
+
+                    row = books[idx]
+                    for key in (
+                        "title",
+                        "version",
+                        "status",
+                        "description",
+                        "sql_download_url",
+                        "download_url",
+                        "url",
+                    ):
+                        value = form.get(key, [""])[0].strip()
+                        if key in URL_KEYS and value == "":
+                            row[key] = None
+                        else:
+                            row[key] = value
+
+                    for int_key in ("id", "is_default", "is_downloaded_on_device"):
+                        raw = form.get(int_key, [""])[0]
+                        val = to_int_or_keep(raw, allow_none=False)
+                        if val != "":
+                            row[int_key] = val
+
+                    write_json_file(BOOKS_JSON_REL, books)
                 self._send_html(self._render_book_edit(idx, notice="ردیف کتاب ذخیره شد."))
                 return
+            except VersionConflict as exc:
+                self._send_html(self._render_book_edit(idx, notice=str(exc)), status=HTTPStatus.CONFLICT)
+                return
             except Exception as exc:  # noqa: BLE001
                 self._send_html(self._render_books(notice=f"ذخیره با خطا مواجه شد: {exc}"))
                 return
@@ -1219,23 +2521,28 @@ class PanelHandler(BaseHTTPRequestHandler):
                 self._send_html(self._render_audio(notice="ردیف نامعتبر است."))
                 return
 
+            version = form.get("file_version", [""])[0]
             try:
-                audio_rows = self._load_audio()
-                if idx < 0 or idx >= len(audio_rows):
-                    self._send_html(self._render_audio(notice="ردیف پیدا نشد."))
-                    return
-
-                row = audio_rows[idx]
-                row["kotob_id"] = to_int_or_keep(form.get("kotob_id", [""])[0], allow_none=True)
-                row["chapters_id"] = to_int_or_keep(form.get("chapters_id", [""])[0], allow_none=False)
-                row["lang"] = form.get("lang", [""])[0].strip()
-                row["narrator"] = form.get("narrator", [""])[0].strip()
-                row["title"] = form.get("title", [""])[0].strip()
-                row["url"] = form.get("url", [""])[0].strip()
-
-                write_json_file(AUDIO_JSON_REL, audio_rows)
+                with file_lock(AUDIO_JSON_REL):
+                    audio_rows = self._load_audio(for_update=True, version=version)
+                    if idx < 0 or idx >= len(audio_rows):
+                        self._send_html(self._render_audio(notice="ردیف پیدا نشد."))
+                        return
+
+                    row = audio_rows[idx]
+                    row["kotob_id"] = to_int_or_keep(form.get("kotob_id", [""])[0], allow_none=True)
+                    row["chapters_id"] = to_int_or_keep(form.get("chapters_id", [""])[0], allow_none=False)
+                    row["lang"] = form.get("lang", [""])[0].strip()
+                    row["narrator"] = form.get("narrator", [""])[0].strip()
+                    row["title"] = form.get("title", [""])[0].strip()
+                    row["url"] = form.get("url", [""])[0].strip()
+
+                    write_json_file(AUDIO_JSON_REL, audio_rows)
                 self._send_html(self._render_audio_edit(idx, notice="ردیف صوت ذخیره شد."))
                 return
+            except VersionConflict as exc:
+                self._send_html(self._render_audio_edit(idx, notice=str(exc)), status=HTTPStatus.CONFLICT)
+                return
             except Exception as exc:  # noqa: BLE001
                 self._send_html(self._render_audio(notice=f"ذخیره با خطا مواجه شد: {exc}"))
                 return
@@ -1253,57 +2560,70 @@ class PanelHandler(BaseHTTPRequestHandler):
                 self._send_html(self._render_structure(section=section, notice="ردیف نامعتبر است."))
                 return
 
+            version = form.get("file_version", [""])[0]
             try:
-                structure = self._load_structure()
-                rows_data = [x for x in structure.get(section, []) if isinstance(x, dict)]
-                if idx < 0 or idx >= len(rows_data):
-                    self._send_html(self._render_structure(section=section, notice="ردیف پیدا نشد."))
-                    return
-
-                row = rows_data[idx]
-                row["id"] = to_int_or_keep(form.get("id", [""])[0], allow_none=False)
-                row["title"] = form.get("title", [""])[0].strip()
-                row["icon"] = form.get("icon", [""])[0].strip()
-
-                if section == "categories":
-                    row["sort_order"] = to_int_or_keep(form.get("sort_order", [""])[0], allow_none=False)
-                else:
-                    row["category_id"] = to_int_or_keep(form.get("category_id", [""])[0], allow_none=False)
-                    row["parent_id"] = to_int_or_keep(form.get("parent_id", [""])[0], allow_none=False)
+                with file_lock(STRUCTURE_JSON_REL):
+                    structure = self._load_structure(for_update=True, version=version)
+                    rows_data = [x for x in structure.get(section, []) if isinstance(x, dict)]
+                    if idx < 0 or idx >= len(rows_data):
+                        self._send_html(self._render_structure(section=section, notice="ردیف پیدا نشد."))
+                        return
+
+                    row = rows_data[idx]
+                    row["id"] = to_int_or_keep(form.get("id", [""])[0], allow_none=False)
+                    row["title"] = form.get("title", [""])[0].strip()
+                    row["icon"] = form.get("icon", [""])[0].strip()
+
+                    if section == "categories":
+                        row["sort_order"] = to_int_or_keep(form.get("sort_order", [""])[0], allow_none=False)
+                    else:
+                        row["category_id"] = to_int_or_keep(form.get("category_id", [""])[0], allow_none=False)
+                        row["parent_id"] = to_int_or_keep(form.get("parent_id", [""])[0], allow_none=False)
 
-                # rows_data references structure[section] dict elements, so writing structure is enough.
-                write_json_file(STRUCTURE_JSON_REL, structure)
+                    # rows_data references structure[section] dict elements, so writing structure is enough.
+                    write_json_file(STRUCTURE_JSON_REL, structure)
                 self._send_html(self._render_structure_edit(section, idx, notice="ردیف ساختار ذخیره شد."))
                 return
+            except VersionConflict as exc:
+                self._send_html(
+                    self._render_structure_edit(section, idx, notice=str(exc)),
+                    status=HTTPStatus.CONFLICT,
+                )
+                return
             except Exception as exc:  # noqa: BLE001
                 self._send_html(self._render_structure(section=section, notice=f"ذخیره با خطا مواجه شد: {exc}"))
                 return
 
         if parsed.path == "/app-update-save":
             form = self._parse_post()
+            version = form.get("file_version", [""])[0]
             try:
-                payload = read_json_file(UPDATE_JSON_REL)
-                if not isinstance(payload, dict):
-                    payload = {}
+                with file_lock(UPDATE_JSON_REL):
+                    payload = read_json_file(UPDATE_JSON_REL, version)
+                    if not isinstance(payload, dict):
+                        payload = {}
 
-                payload["app"] = form.get("app", [""])[0].strip()
-                payload["platform"] = form.get("platform", [""])[0].strip()
-                payload["version"] = form.get("version", [""])[0].strip()
+                    payload["app"] = form.get("app", [""])[0].strip()
+                    payload["platform"] = form.get("platform", [""])[0].strip()
+                    payload["version"] = form.get("version", [""])[0].strip()
 
-                build_raw = form.get("build", [""])[0]
-                build_val = to_int_or_keep(build_raw, allow_none=False)
-                payload["build"] = build_val if build_val != "" else 0
+                    build_raw = form.get("build", [""])[0]
+                    build_val = to_int_or_keep(build_raw, allow_none=False)
+                    payload["build"] = build_val if build_val != "" else 0
 
-                payload["released_at"] = form.get("released_at", [""])[0].strip()
-                payload["mandatory"] = to_bool(form.get("mandatory", ["0"])[0])
-                payload["download_url"] = form.get("download_url", [""])[0].strip()
+                    payload["released_at"] = form.get("released_at", [""])[0].strip()
+                    payload["mandatory"] = to_bool(form.get("mandatory", ["0"])[0])
+                    payload["download_url"] = form.get("download_url", [""])[0].strip()
 
-                changes_text = form.get("changes", [""])[0]
-                payload["changes"] = [line.strip() for line in changes_text.splitlines() if line.strip()]
+                    changes_text = form.get("changes", [""])[0]
+                    payload["changes"] = [line.strip() for line in changes_text.splitlines() if line.strip()]
 
-                write_json_file(UPDATE_JSON_REL, payload)
+                    write_json_file(UPDATE_JSON_REL, payload)
                 self._send_html(self._render_app_update(notice="تنظیمات آپدیت ذخیره شد."))
                 return
+            except VersionConflict as exc:
+                self._send_html(self._render_app_update(notice=str(exc)), status=HTTPStatus.CONFLICT)
+                return
             except Exception as exc:  # noqa: BLE001
                 self._send_html(self._render_app_update(notice=f"ذخیره با خطا مواجه شد: {exc}"))
                 return
@@ -1312,10 +2632,23 @@ class PanelHandler(BaseHTTPRequestHandler):
             form = self._parse_post()
             rel_file = form.get("file", [""])[0]
             content = form.get("content", [""])[0]
+            version = form.get("file_version", [""])[0]
             try:
                 file_path = resolve_repo_path(rel_file)
-                file_path.parent.mkdir(parents=True, exist_ok=True)
-                file_path.write_text(content, encoding="utf-8")
+                with file_lock(rel_file):
+                    if version and file_path.exists():
+                        current_version = content_version(file_path.read_bytes())
+                        if current_version != version:
+                            self._send_html(
+                                self._render_edit(
+                                    rel_file,
+                                    notice="این فایل بعد از باز شدن فرم تغییر کرده است؛ نسخه فعلی نمایش داده شد.",
+                                ),
+                                status=HTTPStatus.CONFLICT,
+                            )
+                            return
+                    atomic_io.atomic_write_text(file_path, content)
+                GIT_INFO.invalidate()
                 self._send_html(self._render_edit(rel_file, notice="فایل ذخیره شد."))
                 return
             except Exception as exc:  # noqa: BLE001
@@ -1324,17 +2657,6 @@ class PanelHandler(BaseHTTPRequestHandler):
 
         self._send_html("<h1>Not Found</h1>", status=HTTPStatus.NOT_FOUND)
 
-    def _run_pull(self) -> tuple[bool, str]:
-        logs: list[str] = []
-        code, branch = run_cmd(["git", "branch", "--show-current"])
-        branch = branch.strip() if code == 0 else "main"
-
-        code, out = run_cmd(["git", "pull", "--rebase", "origin", branch])
-        logs.append(f"$ git pull --rebase origin {branch}")
-        if out:
-            logs.append(out)
-        return code == 0, "\n".join(logs)
-
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="کنترل پنل آفلاین مدیریت ریپو")
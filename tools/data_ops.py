@@ -2,13 +2,25 @@
 from __future__ import annotations
 
 import argparse
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import itertools
 import json
+import os
 import re
 import sqlite3
 import sys
+import threading
+import time
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+import atomic_io
 
 
 BOOKS_JSON = "json/books_metadata.json"
@@ -104,37 +116,139 @@ def _sorted_ids(values: Iterable[Any]) -> list[int]:
     return sorted(out)
 
 
-def run_doctor(repo_root: Path, db_path: Path) -> int:
-    books_path = repo_root / BOOKS_JSON
-    audio_path = repo_root / AUDIO_JSON
-    structure_path = repo_root / STRUCTURE_JSON
+DOCTOR_CONTENT_INDEX = "idx_content_kotob_chapters"
 
-    missing_files = [str(p) for p in (books_path, audio_path, structure_path) if not p.exists()]
-    if missing_files:
-        _eprint("Error: required metadata files are missing:")
-        for p in missing_files:
-            _eprint(f"- {p}")
-        return 2
 
-    books_data = _read_json(books_path)
-    audio_data = _read_json(audio_path)
-    structure_data = _read_json(structure_path)
+def _has_covering_index(conn: sqlite3.Connection, table: str, cols: list[str], schema: str = "main") -> bool:
+    for idx in conn.execute(f"PRAGMA {schema}.index_list({table})"):
+        idx_cols = [r[2] for r in conn.execute(f"PRAGMA {schema}.index_info({_sql_quote(idx[1])})")]
+        if idx_cols[: len(cols)] == cols:
+            return True
+    return False
 
-    if not isinstance(books_data, list):
-        _eprint(f"Error: {books_path} must be a JSON array")
-        return 2
-    if not isinstance(audio_data, list):
-        _eprint(f"Error: {audio_path} must be a JSON array")
-        return 2
-    if not isinstance(structure_data, dict):
-        _eprint(f"Error: {structure_path} must be a JSON object")
-        return 2
 
+def _int_id_set(conn: sqlite3.Connection, table: str) -> set[int]:
+    # CAST in SQL so the cross-checks keep SQLite's own text->integer rules.
+    return {
+        int(r[0])
+        for r in conn.execute(f"SELECT DISTINCT CAST(id AS INTEGER) FROM {table} WHERE id IS NOT NULL")
+    }
+
+
+def _doctor_db_stats(conn: sqlite3.Connection, db_stats: dict[str, Any], fast: bool) -> list[tuple[str, float]]:
+    """Fill db_stats with one aggregate pass over content; return per-check timings."""
+    timings: list[tuple[str, float]] = []
+
+    def timed(name: str, fn: Any) -> Any:
+        t0 = time.perf_counter()
+        value = fn()
+        timings.append((name, time.perf_counter() - t0))
+        return value
+
+    for table in ("kotob", "content_audio", "categories", "chapters"):
+        db_stats[f"{table}_count"] = timed(f"{table} count", lambda t=table: _fetch_count(conn, t))
+
+    kotob_ids: set[int] | None = None
+    if _table_exists(conn, "kotob"):
+        db_stats["db_book_ids"] = timed(
+            "kotob ids", lambda: _sorted_ids(r[0] for r in conn.execute("SELECT id FROM kotob"))
+        )
+        kotob_ids = timed("kotob integer ids", lambda: _int_id_set(conn, "kotob"))
+    chapter_ids: set[int] | None = None
+    if _table_exists(conn, "chapters"):
+        chapter_ids = timed("chapters integer ids", lambda: _int_id_set(conn, "chapters"))
+
+    if not _table_exists(conn, "content"):
+        return timings
+
+    if fast and not _has_covering_index(conn, "content", ["kotob_id", "chapters_id"]):
+        # Opt-in: a persistent (kotob_id, chapters_id) index turns the GROUP BY below
+        # into an index walk with no table scan or sort; export-sql's filter uses it too.
+        timed(
+            "create covering index",
+            lambda: conn.execute(f"CREATE INDEX IF NOT EXISTS {DOCTOR_CONTENT_INDEX} ON content(kotob_id, chapters_id)"),
+        )
+        conn.commit()
+
+    # One pass replaces the separate COUNT / DISTINCT / GROUP BY / duplicate / orphan scans:
+    # every per-row check depends only on (kotob_id, chapters_id), so it is evaluated per group.
+    groups = timed(
+        "content aggregate",
+        lambda: conn.execute(
+            """
+            SELECT kotob_id,
+                   COUNT(*) AS c,
+                   CAST(kotob_id AS INTEGER),
+                   CAST(chapters_id AS INTEGER),
+                   chapters_id IS NULL,
+                   kotob_id IS NULL
+                     OR TRIM(CAST(kotob_id AS TEXT)) = ''
+                     OR CAST(kotob_id AS INTEGER) IN (0, -1)
+            FROM content
+            GROUP BY kotob_id, chapters_id
+            """
+        ).fetchall(),
+    )
+
+    t0 = time.perf_counter()
+    content_count = 0
+    bookless = 0
+    dup_pairs = 0
+    orphan_books = 0
+    orphan_chapters = 0
+    rows_by_book: Counter[int] = Counter()
+    for raw_kid, count, kid_int, chid_int, chid_null, is_bookless in groups:
+        content_count += count
+        if count > 1:
+            dup_pairs += 1
+        kid = _normalize_book_id(raw_kid)
+        if kid is not None:
+            rows_by_book[kid] += count
+        if is_bookless:
+            bookless += count
+        elif kotob_ids is not None and kid_int not in kotob_ids:
+            orphan_books += count
+        if not chid_null and chapter_ids is not None and chid_int not in chapter_ids:
+            orphan_chapters += count
+    timings.append(("content checks", time.perf_counter() - t0))
+
+    db_stats["content_count"] = content_count
+    db_stats["content_book_ids"] = sorted(rows_by_book)
+    db_stats["content_rows_by_book"] = sorted(rows_by_book.items(), key=lambda x: (-x[1], x[0]))
+    db_stats["bookless_content_rows"] = bookless
+    db_stats["dup_content_pairs"] = dup_pairs
+    db_stats["orphan_content_books"] = orphan_books
+    db_stats["orphan_content_chapters"] = orphan_chapters
+    return timings
+
+
+DOCTOR_CACHE_DIR = ".kdini-cache"
+DOCTOR_CACHE_FILE = "doctor.json"
+DOCTOR_CACHE_VERSION = 2
+
+
+def _doctor_books(books_data: Any) -> dict[str, Any]:
+    if not isinstance(books_data, list):
+        raise ValueError(f"{BOOKS_JSON} must be a JSON array")
     book_ids_raw = [item.get("id") if isinstance(item, dict) else None for item in books_data]
-    book_ids = [b for b in (_as_int(v) for v in book_ids_raw) if b is not None]
-    dup_book_ids = sorted([k for k, c in Counter(book_ids).items() if c > 1])
-    invalid_book_id_rows = sum(1 for v in book_ids_raw if _as_int(v) is None)
+    book_ids = _metadata_book_ids(books_data)
+    sql_files: dict[str, str] = {}
+    for item in books_data:
+        if isinstance(item, dict) and item.get("sql_download_url") and _as_int(item.get("id")) is not None:
+            url = str(item["sql_download_url"]).split("?", 1)[0]
+            sql_files[str(_as_int(item.get("id")))] = url.rsplit("/", 1)[-1]
+    return {
+        "rows": len(books_data),
+        "book_ids": sorted(set(book_ids)),
+        "sql_files": sql_files,
+        "invalid_id_rows": sum(1 for v in book_ids_raw if _as_int(v) is None),
+        "duplicate_ids": sorted([k for k, c in Counter(book_ids).items() if c > 1]),
+    }
 
+
+def _doctor_structure(structure_data: Any) -> dict[str, Any]:
+    if not isinstance(structure_data, dict):
+        raise ValueError(f"{STRUCTURE_JSON} must be a JSON object")
     categories = structure_data.get("categories")
     chapters = structure_data.get("chapters")
     categories = categories if isinstance(categories, list) else []
@@ -144,25 +258,42 @@ def run_doctor(repo_root: Path, db_path: Path) -> int:
     ch_ids_raw = [item.get("id") if isinstance(item, dict) else None for item in chapters]
     cat_ids = [c for c in (_as_int(v) for v in cat_ids_raw) if c is not None]
     ch_ids = [c for c in (_as_int(v) for v in ch_ids_raw) if c is not None]
-    dup_cat_ids = sorted([k for k, c in Counter(cat_ids).items() if c > 1])
-    dup_ch_ids = sorted([k for k, c in Counter(ch_ids).items() if c > 1])
+    return {
+        "schema": structure_data.get("schema"),
+        "data_version": structure_data.get("data_version"),
+        "categories": len(categories),
+        "chapters": len(chapters),
+        "chapter_ids": sorted(set(ch_ids)),
+        "duplicate_category_ids": sorted([k for k, c in Counter(cat_ids).items() if c > 1]),
+        "duplicate_chapter_ids": sorted([k for k, c in Counter(ch_ids).items() if c > 1]),
+    }
+
 
+def _audio_key(row: dict[str, Any]) -> tuple[int | None, int | None, str, str]:
+    """(book, chapter, lang, url): the key doctor checks for duplicates and import-audio dedupes on."""
+    kid = _normalize_book_id(row.get("kotob_id") or row.get("book_id") or row.get("kotobId"))
+    chid = _as_int(row.get("chapters_id") or row.get("chapter_id") or row.get("chapterId"))
+    lang = str(row.get("lang") or row.get("language") or "").strip().lower()
+    url = str(row.get("url") or row.get("audio_url") or row.get("download_url") or "").strip()
+    return kid, chid, lang, url
+
+
+def _doctor_audio(audio_data: Any, book_ids: Iterable[int], chapter_ids: Iterable[int]) -> dict[str, Any]:
+    if not isinstance(audio_data, list):
+        raise ValueError(f"{AUDIO_JSON} must be a JSON array")
     audio_missing_required = 0
     audio_bad_book_ref = 0
     audio_bad_chapter_ref = 0
     audio_keys: list[tuple[int | None, int | None, str, str]] = []
 
     book_id_set = set(book_ids)
-    chapter_id_set = set(ch_ids)
+    chapter_id_set = set(chapter_ids)
 
     for row in audio_data:
         if not isinstance(row, dict):
             audio_missing_required += 1
             continue
-        kid = _normalize_book_id(row.get("kotob_id") or row.get("book_id") or row.get("kotobId"))
-        chid = _as_int(row.get("chapters_id") or row.get("chapter_id") or row.get("chapterId"))
-        lang = str(row.get("lang") or row.get("language") or "").strip().lower()
-        url = str(row.get("url") or row.get("audio_url") or row.get("download_url") or "").strip()
+        kid, chid, lang, url = _audio_key(row)
         if chid is None or url == "":
             audio_missing_required += 1
             continue
@@ -172,9 +303,115 @@ def run_doctor(repo_root: Path, db_path: Path) -> int:
             audio_bad_chapter_ref += 1
         audio_keys.append((kid, chid, lang, url))
 
-    dup_audio_entries = sum(1 for _, c in Counter(audio_keys).items() if c > 1)
+    return {
+        "rows": len(audio_data),
+        "duplicate_key_rows": sum(1 for _, c in Counter(audio_keys).items() if c > 1),
+        "missing_required_rows": audio_missing_required,
+        "unknown_book_rows": audio_bad_book_ref,
+        "unknown_chapter_rows": audio_bad_chapter_ref,
+    }
 
-    db_exists = db_path.exists()
+
+AUDIO_KEY_ALIASES = {
+    "kotob_id": ("kotob_id", "book_id", "kotobId"),
+    "chapters_id": ("chapters_id", "chapter_id", "chapterId"),
+    "lang": ("lang", "language"),
+    "url": ("url", "audio_url", "download_url"),
+}
+AUDIO_TEXT_FIELDS = ("narrator", "title")
+
+
+def audio_ref_ids(books_data: Any, structure_data: Any) -> tuple[set[int], set[int]]:
+    """Book IDs and chapter IDs that audio rows may reference."""
+    book_ids = set(_metadata_book_ids(books_data)) if isinstance(books_data, list) else set()
+    chapter_ids = set(_doctor_structure(structure_data)["chapter_ids"]) if isinstance(structure_data, dict) else set()
+    return book_ids, chapter_ids
+
+
+def read_audio_csv(text: str) -> list[dict[str, Any]]:
+    """Rows of a CSV with a header line; a UTF-8 BOM (Excel) is ignored."""
+    return [dict(row) for row in csv.DictReader(io.StringIO(text.lstrip("\ufeff")))]
+
+
+def _audio_import_row(raw: dict[str, Any]) -> tuple[dict[str, Any] | None, str]:
+    """Incoming row in the stored shape, or (None, reason) when it cannot be used."""
+    kid, chid, lang, url = _audio_key(raw)
+    if chid is None:
+        return None, "missing or invalid chapters_id"
+    if url == "":
+        return None, "missing url"
+    raw_kid = next((raw[k] for k in AUDIO_KEY_ALIASES["kotob_id"] if raw.get(k) not in (None, "")), None)
+    if raw_kid is not None and _as_int(raw_kid) is None:
+        return None, f"invalid kotob_id {raw_kid!r}"
+    row: dict[str, Any] = {
+        "kotob_id": _as_int(raw_kid),
+        "chapters_id": chid,
+        "lang": lang,
+        "narrator": str(raw.get("narrator") or "").strip(),
+        "title": str(raw.get("title") or "").strip(),
+        "url": url,
+    }
+    aliases = {a for names in AUDIO_KEY_ALIASES.values() for a in names}
+    for key, value in raw.items():
+        if key and key not in row and key not in aliases and value not in (None, ""):
+            row[key] = value
+    return row, ""
+
+
+def merge_audio_rows(
+    rows: list[Any],
+    incoming: list[Any],
+    book_ids: set[int],
+    chapter_ids: set[int],
+) -> dict[str, Any]:
+    """Merge incoming audio rows into rows in place, deduplicating on _audio_key().
+
+    A row whose key already exists updates narrator/title (and any extra columns)
+    of the existing row; blank cells never overwrite. Rows with unknown book or
+    chapter IDs, missing fields or a key repeated within the input are rejected.
+    """
+    existing: dict[tuple[int | None, int | None, str, str], int] = {}
+    for pos, row in enumerate(rows):
+        if isinstance(row, dict):
+            existing.setdefault(_audio_key(row), pos)
+
+    seen: dict[tuple[int | None, int | None, str, str], int] = {}
+    inserted = updated = unchanged = 0
+    rejected: list[dict[str, Any]] = []
+    for n, raw in enumerate(incoming, start=1):
+        row, reason = _audio_import_row(raw) if isinstance(raw, dict) else (None, "not an object")
+        if row is not None:
+            key = _audio_key(row)
+            kid, chid = key[0], key[1]
+            if kid is not None and kid not in book_ids:
+                reason = f"unknown kotob_id {kid}"
+            elif chid not in chapter_ids:
+                reason = f"unknown chapters_id {chid}"
+            elif key in seen:
+                reason = f"duplicate of input row {seen[key]}"
+        if row is None or reason:
+            rejected.append({"row": n, "reason": reason})
+            continue
+        seen[key] = n
+
+        pos = existing.get(key)
+        if pos is None:
+            existing[key] = len(rows)
+            rows.append(row)
+            inserted += 1
+            continue
+        target = rows[pos]
+        changes = {k: v for k, v in row.items() if k not in AUDIO_KEY_ALIASES and v != "" and target.get(k) != v}
+        if changes:
+            target.update(changes)
+            updated += 1
+        else:
+            unchanged += 1
+
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged, "rejected": rejected}
+
+
+def _doctor_sqlite(db_path: Path, fast: bool) -> tuple[dict[str, Any], list[tuple[str, float]]]:
     db_stats: dict[str, Any] = {
         "kotob_count": 0,
         "content_count": 0,
@@ -189,124 +426,276 @@ def run_doctor(repo_root: Path, db_path: Path) -> int:
         "orphan_content_books": 0,
         "orphan_content_chapters": 0,
     }
-
-    if db_exists:
+    if fast:
         conn = sqlite3.connect(str(db_path))
-        conn.row_factory = sqlite3.Row
-
-        db_stats["kotob_count"] = _fetch_count(conn, "kotob")
-        db_stats["content_count"] = _fetch_count(conn, "content")
-        db_stats["content_audio_count"] = _fetch_count(conn, "content_audio")
-        db_stats["categories_count"] = _fetch_count(conn, "categories")
-        db_stats["chapters_count"] = _fetch_count(conn, "chapters")
-
-        db_book_ids: list[int] = []
-        if _table_exists(conn, "kotob"):
-            db_book_ids = _sorted_ids(r[0] for r in conn.execute("SELECT id FROM kotob"))
-        db_stats["db_book_ids"] = db_book_ids
-
-        content_book_ids: list[int] = []
-        rows_by_book: list[tuple[int, int]] = []
-        if _table_exists(conn, "content"):
-            raw_ids = [r[0] for r in conn.execute("SELECT DISTINCT kotob_id FROM content")]
-            content_book_ids = sorted(
-                b for b in (_normalize_book_id(v) for v in raw_ids) if b is not None
-            )
-            db_stats["content_book_ids"] = content_book_ids
+    else:
+        conn = _connect_ro(db_path)
+    try:
+        timings = _doctor_db_stats(conn, db_stats, fast)
+    finally:
+        conn.close()
+    return db_stats, timings
 
-            for row in conn.execute("SELECT kotob_id, COUNT(*) AS c FROM content GROUP BY kotob_id"):
-                kid = _normalize_book_id(row[0])
-                if kid is not None:
-                    rows_by_book.append((kid, int(row[1])))
-            rows_by_book.sort(key=lambda x: (-x[1], x[0]))
-            db_stats["content_rows_by_book"] = rows_by_book
 
-            db_stats["bookless_content_rows"] = int(
-                conn.execute(
-                    """
-                    SELECT COUNT(*)
-                    FROM content
-                    WHERE kotob_id IS NULL
-                       OR TRIM(CAST(kotob_id AS TEXT)) = ''
-                       OR CAST(kotob_id AS INTEGER) IN (0, -1)
-                    """
-                ).fetchone()[0]
-            )
+def _middle_row_sql(table: str, cols: str, not_null: str) -> str:
+    return (
+        f"SELECT {cols} FROM {table} WHERE rowid >= (SELECT (MIN(rowid) + MAX(rowid)) / 2 FROM {table}) "
+        f"AND {not_null} IS NOT NULL LIMIT 1"
+    )
 
-            db_stats["dup_content_pairs"] = int(
-                conn.execute(
-                    """
-                    SELECT COUNT(*)
-                    FROM (
-                      SELECT chapters_id, kotob_id, COUNT(*) AS c
-                      FROM content
-                      GROUP BY chapters_id, kotob_id
-                      HAVING c > 1
-                    ) t
-                    """
-                ).fetchone()[0]
+
+# The app's hot reads, checked by doctor --explain and optimize-db. "sample"
+# picks realistic parameters from the DB (one row from the middle of the
+# table); "index" is what optimize-db creates when the plan scans the table.
+HOT_QUERIES: tuple[dict[str, Any], ...] = (
+    {
+        "name": "content by chapter",
+        "sql": "SELECT * FROM content WHERE chapters_id = ?",
+        "sample": _middle_row_sql("content", "chapters_id", "chapters_id"),
+        "index": {"name": "idx_content_chapters", "table": "content", "columns": ["chapters_id"]},
+    },
+    {
+        "name": "content by book",
+        "sql": "SELECT * FROM content WHERE kotob_id = ? ORDER BY chapters_id",
+        "sample": _middle_row_sql("content", "kotob_id", "kotob_id"),
+        "index": {"name": DOCTOR_CONTENT_INDEX, "table": "content", "columns": ["kotob_id", "chapters_id"]},
+    },
+    {
+        "name": "content by book and chapter",
+        "sql": "SELECT * FROM content WHERE kotob_id = ? AND chapters_id = ?",
+        "sample": _middle_row_sql("content", "kotob_id, chapters_id", "kotob_id"),
+        "index": {"name": DOCTOR_CONTENT_INDEX, "table": "content", "columns": ["kotob_id", "chapters_id"]},
+    },
+    {
+        "name": "audio by chapter",
+        "sql": "SELECT * FROM content_audio WHERE chapters_id = ?",
+        "sample": _middle_row_sql("content_audio", "chapters_id", "chapters_id"),
+        "index": {"name": "idx_content_audio_chapters", "table": "content_audio", "columns": ["chapters_id"]},
+    },
+)
+# "SCAN content" (older SQLite: "SCAN TABLE content"); with an index it reads "... USING INDEX".
+_PLAN_SCAN_RE = re.compile(r"SCAN (?:TABLE )?(\w+)(?: AS \w+)?")
+_SQL_FROM_RE = re.compile(r"\b(?:FROM|JOIN)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+
+def load_hot_queries(path: Path) -> list[dict[str, Any]]:
+    """Hot queries from a JSON array shaped like HOT_QUERIES; "params" may replace "sample"."""
+    data = _read_json(path)
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"{path}: expected a non-empty JSON array of queries")
+    queries: list[dict[str, Any]] = []
+    for n, item in enumerate(data, 1):
+        if not isinstance(item, dict) or not isinstance(item.get("sql"), str):
+            raise ValueError(f"{path}: query {n} needs a \"sql\" string")
+        if "params" in item and not isinstance(item["params"], list):
+            raise ValueError(f"{path}: query {n}: \"params\" must be an array")
+        index = item.get("index")
+        if index is not None and not (
+            isinstance(index, dict)
+            and isinstance(index.get("table"), str)
+            and isinstance(index.get("columns"), list)
+            and index["columns"]
+        ):
+            raise ValueError(f"{path}: query {n}: \"index\" needs \"table\" and a non-empty \"columns\" array")
+        queries.append({"name": str(item.get("name") or f"query {n}"), **item})
+    return queries
+
+
+def _hot_index_ddl(index: dict[str, Any]) -> str:
+    name = index.get("name") or f"idx_{index['table']}_{'_'.join(index['columns'])}"
+    return f'CREATE INDEX IF NOT EXISTS "{name}" ON "{index["table"]}" ({", ".join(index["columns"])})'
+
+
+def _hot_query_params(conn: sqlite3.Connection, query: dict[str, Any]) -> list[Any]:
+    if "params" in query:
+        return list(query["params"])
+    n_params = query["sql"].count("?")
+    row = conn.execute(query["sample"]).fetchone() if query.get("sample") else None
+    return list(row) if row is not None else [None] * n_params
+
+
+def _explain_hot_queries(conn: sqlite3.Connection, queries: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """EXPLAIN QUERY PLAN of each query, with the tables it scans in full."""
+    results: list[dict[str, Any]] = []
+    for query in queries:
+        result: dict[str, Any] = {"name": query["name"], "sql": query["sql"]}
+        results.append(result)
+        missing = [t for t in _SQL_FROM_RE.findall(query["sql"]) if not _table_exists(conn, t)]
+        if missing:
+            result["skipped"] = f"table {missing[0]} not found"
+            continue
+        try:
+            params = _hot_query_params(conn, query)
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query['sql']}", params)]
+        except sqlite3.Error as exc:
+            result["skipped"] = str(exc)
+            continue
+        result["params"] = params
+        result["plan"] = plan
+        result["full_scans"] = [m.group(1) for m in map(_PLAN_SCAN_RE.fullmatch, plan) if m]
+        result["temp_btree"] = any(step.startswith("USE TEMP B-TREE") for step in plan)
+        index = query.get("index")
+        if index:
+            result["index"] = {
+                "ddl": _hot_index_ddl(index),
+                "exists": _has_covering_index(conn, index["table"], list(index["columns"])),
+            }
+    return results
+
+
+def _hot_query_needs_index(result: dict[str, Any]) -> bool:
+    return (
+        "index" in result
+        and not result["index"]["exists"]
+        and bool(result["full_scans"] or result["temp_btree"])
+    )
+
+
+def _time_hot_query(conn: sqlite3.Connection, sql: str, params: list[Any], repeat: int) -> tuple[float, int]:
+    """(best of repeat runs in ms, rows returned), after one warm-up run."""
+    rows = len(conn.execute(sql, params).fetchall())
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, rows
+
+
+def _file_fingerprint(path: Path, previous: dict[str, Any] | None) -> dict[str, Any]:
+    """mtime/size/sha256 of path; the hash is only recomputed when mtime or size moved."""
+    st = path.stat()
+    if previous and previous.get("mtime_ns") == st.st_mtime_ns and previous.get("size") == st.st_size:
+        return previous
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": _sha256_file(path)}
+
+
+def _db_fingerprint(db_path: Path) -> dict[str, Any]:
+    """Cheap change marker for a SQLite file without opening it as a database.
+
+    The header's file change counter (offset 24) is bumped on every commit in
+    rollback-journal mode; in WAL mode commits land in the -wal file first, so
+    its size/mtime is part of the key too.
+    """
+    st = db_path.stat()
+    with db_path.open("rb") as f:
+        header = f.read(100)
+    fp: dict[str, Any] = {
+        "path": str(db_path),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "change_counter": int.from_bytes(header[24:28], "big") if len(header) >= 28 else None,
+    }
+    wal = db_path.with_name(db_path.name + "-wal")
+    if wal.exists():
+        wst = wal.stat()
+        fp["wal"] = [wst.st_mtime_ns, wst.st_size]
+    return fp
+
+
+def _load_doctor_cache(cache_path: Path) -> dict[str, Any]:
+    try:
+        data = _read_json(cache_path)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != DOCTOR_CACHE_VERSION:
+        return {}
+    return data
+
+
+def _save_doctor_cache(cache_path: Path, data: dict[str, Any]) -> None:
+    atomic_io.atomic_write_text(cache_path, json.dumps(data, ensure_ascii=False) + "\n")
+
+
+def _print_doctor_sql_patches(sql_patches: dict[str, Any]) -> None:
+    files = sql_patches["files"]
+    print("[SQL Patches]")
+    print(f"- dir: {sql_patches['dir']} ({len(files)} files)")
+    broken = [f for f in files if f["error"]]
+    print(f"- patches that fail to apply: {len(broken)}")
+    for f in broken:
+        print(f"  {f['error']}")
+    for f in files:
+        if f["error"]:
+            continue
+        books = ", ".join(f"{bid}:{cnt}" for bid, cnt in f["rows_by_book"].items()) or "-"
+        line = f"- {f['file']}: {f['rows']} rows, books {books}"
+        if f["bookless_rows"]:
+            line += f", {f['bookless_rows']} without kotob_id"
+        if f["orphan_chapter_ids"]:
+            line += f", {len(f['orphan_chapter_ids'])} chapters_id not in structure"
+        live = f["live"]
+        if live is not None:
+            line += (
+                f", vs DB: {live['unchanged']} same / {live['update']} changed"
+                f" / {live['insert']} new / {live['delete']} missing"
             )
+        if not f["in_metadata"]:
+            line += " (not referenced by books_metadata)"
+        print(line)
+        if f["orphan_chapter_ids"]:
+            ranges = _format_id_ranges(f["orphan_chapter_ids"]).split(", ")
+            more = f" (+{len(ranges) - 12} more ranges)" if len(ranges) > 12 else ""
+            print(f"  orphan chapters_id: {', '.join(ranges[:12])}{more}")
+    missing = sql_patches["metadata_urls_without_file"]
+    print(f"- metadata sql_download_url files missing from dir: {len(missing)}")
+    for bid, name in missing.items():
+        print(f"  book {bid}: {name}")
+    extra = sql_patches["patch_books_not_in_metadata"]
+    print(f"- patch books not in metadata: {len(extra)}{(' -> ' + ', '.join(map(str, extra))) if extra else ''}")
+    print()
 
-            if _table_exists(conn, "kotob"):
-                db_stats["orphan_content_books"] = int(
-                    conn.execute(
-                        """
-                        SELECT COUNT(*)
-                        FROM content c
-                        WHERE c.kotob_id IS NOT NULL
-                          AND TRIM(CAST(c.kotob_id AS TEXT)) <> ''
-                          AND CAST(c.kotob_id AS INTEGER) NOT IN (0, -1)
-                          AND NOT EXISTS (
-                            SELECT 1 FROM kotob k WHERE CAST(k.id AS INTEGER) = CAST(c.kotob_id AS INTEGER)
-                          )
-                        """
-                    ).fetchone()[0]
-                )
 
-            if _table_exists(conn, "chapters"):
-                db_stats["orphan_content_chapters"] = int(
-                    conn.execute(
-                        """
-                        SELECT COUNT(*)
-                        FROM content c
-                        WHERE c.chapters_id IS NOT NULL
-                          AND NOT EXISTS (
-                            SELECT 1 FROM chapters ch WHERE CAST(ch.id AS INTEGER) = CAST(c.chapters_id AS INTEGER)
-                          )
-                        """
-                    ).fetchone()[0]
-                )
+def _print_doctor_query_plans(query_plans: list[dict[str, Any]]) -> None:
+    print("[Query Plans]")
+    for result in query_plans:
+        if "skipped" in result:
+            print(f"- {result['name']}: skipped ({result['skipped']})")
+            continue
+        flags = [f"full scan of {t}" for t in result["full_scans"]]
+        if result["temp_btree"]:
+            flags.append("temp b-tree sort")
+        print(f"- {result['name']}: {'; '.join(result['plan'])}{'  <- ' + ', '.join(flags) if flags else ''}")
+        if _hot_query_needs_index(result):
+            print(f"  fix: {result['index']['ddl']} (or run optimize-db)")
+    print()
 
-        conn.close()
+
+def _print_doctor_text(report: dict[str, Any], show_timings: bool) -> None:
+    books = report["books"]
+    structure = report["structure"]
+    audio = report["audio"]
+    db_stats = report["sqlite"]
+    dup_book_ids = books["duplicate_ids"]
 
     print("== KDINI Data Doctor ==")
-    print(f"Repo: {repo_root}")
-    print(f"DB:   {db_path} {'(found)' if db_exists else '(missing)'}")
+    print(f"Repo: {report['repo']}")
+    print(f"DB:   {report['db']} {'(found)' if db_stats is not None else '(missing)'}")
     print()
 
     print("[Books Metadata]")
-    print(f"- rows: {len(books_data)}")
-    print(f"- unique IDs: {len(set(book_ids))}")
-    print(f"- rows with invalid ID: {invalid_book_id_rows}")
+    print(f"- rows: {books['rows']}")
+    print(f"- unique IDs: {len(books['book_ids'])}")
+    print(f"- rows with invalid ID: {books['invalid_id_rows']}")
     print(f"- duplicate IDs: {len(dup_book_ids)}{(' -> ' + ', '.join(map(str, dup_book_ids))) if dup_book_ids else ''}")
     print()
 
     print("[Structure Metadata]")
-    print(f"- schema: {structure_data.get('schema')}")
-    print(f"- data_version: {structure_data.get('data_version')}")
-    print(f"- categories: {len(categories)} (dup IDs: {len(dup_cat_ids)})")
-    print(f"- chapters: {len(chapters)} (dup IDs: {len(dup_ch_ids)})")
+    print(f"- schema: {structure['schema']}")
+    print(f"- data_version: {structure['data_version']}")
+    print(f"- categories: {structure['categories']} (dup IDs: {len(structure['duplicate_category_ids'])})")
+    print(f"- chapters: {structure['chapters']} (dup IDs: {len(structure['duplicate_chapter_ids'])})")
     print()
 
     print("[Audio Metadata]")
-    print(f"- rows: {len(audio_data)}")
-    print(f"- duplicate key rows (book+chapter+lang+url): {dup_audio_entries}")
-    print(f"- rows missing required fields (chapter/url): {audio_missing_required}")
-    print(f"- rows referencing unknown book IDs: {audio_bad_book_ref}")
-    print(f"- rows referencing unknown chapter IDs: {audio_bad_chapter_ref}")
+    print(f"- rows: {audio['rows']}")
+    print(f"- duplicate key rows (book+chapter+lang+url): {audio['duplicate_key_rows']}")
+    print(f"- rows missing required fields (chapter/url): {audio['missing_required_rows']}")
+    print(f"- rows referencing unknown book IDs: {audio['unknown_book_rows']}")
+    print(f"- rows referencing unknown chapter IDs: {audio['unknown_chapter_rows']}")
     print()
 
-    if db_exists:
+    if db_stats is not None:
         print("[SQLite]")
         print(f"- kotob rows: {db_stats['kotob_count']}")
         print(f"- content rows: {db_stats['content_count']}")
@@ -323,23 +712,32 @@ def run_doctor(repo_root: Path, db_path: Path) -> int:
             print(f"- top content books (book_id:rows): {top}")
         print()
 
-        db_book_set = set(db_stats["db_book_ids"])
-        content_book_set = set(db_stats["content_book_ids"])
+        if show_timings:
+            print("[Timings]")
+            for name, ms in report["timings"].items():
+                print(f"- {name}: {ms:.1f} ms")
+            if report["cached"]:
+                print(f"- cached sections: {', '.join(report['cached'])}")
+            print()
+
+    if report["query_plans"] is not None:
+        _print_doctor_query_plans(report["query_plans"])
 
-        missing_in_db = sorted(book_id_set - db_book_set)
-        local_only_books = sorted(db_book_set - book_id_set)
-        content_without_metadata = sorted(content_book_set - book_id_set)
+    if report["sql_patches"] is not None:
+        _print_doctor_sql_patches(report["sql_patches"])
 
+    if db_stats is not None:
+        cross = report["cross_check"]
         print("[Cross-check]")
-        print(f"- metadata books missing in DB.kotob: {len(missing_in_db)}")
-        if missing_in_db:
-            print(f"  IDs: {', '.join(map(str, missing_in_db[:30]))}")
-        print(f"- local DB books not in metadata: {len(local_only_books)}")
-        if local_only_books:
-            print(f"  IDs: {', '.join(map(str, local_only_books[:30]))}")
-        print(f"- content books not in metadata: {len(content_without_metadata)}")
-        if content_without_metadata:
-            print(f"  IDs: {', '.join(map(str, content_without_metadata[:30]))}")
+        for label, key in (
+            ("metadata books missing in DB.kotob", "missing_in_db"),
+            ("local DB books not in metadata", "local_only_books"),
+            ("content books not in metadata", "content_without_metadata"),
+        ):
+            ids = cross[key]
+            print(f"- {label}: {len(ids)}")
+            if ids:
+                print(f"  IDs: {', '.join(map(str, ids[:30]))}")
         print()
 
     print("[Actionable]")
@@ -348,10 +746,568 @@ def run_doctor(repo_root: Path, db_path: Path) -> int:
     print("3) Keep one source of truth for structure IDs (chapters/categories) and update via JSON upsert.")
     print("4) For SQL book updates, use DELETE by kotob_id + INSERT to avoid duplicates.")
 
+
+def run_doctor(
+    repo_root: Path,
+    db_path: Path,
+    fast: bool = False,
+    show_timings: bool = False,
+    output_format: str = "text",
+    use_cache: bool = True,
+    sql_dir: Path | None = None,
+    jobs: int = 1,
+    explain: bool = False,
+    hot_queries: Iterable[dict[str, Any]] = HOT_QUERIES,
+) -> int:
+    books_path = repo_root / BOOKS_JSON
+    audio_path = repo_root / AUDIO_JSON
+    structure_path = repo_root / STRUCTURE_JSON
+
+    missing_files = [str(p) for p in (books_path, audio_path, structure_path) if not p.exists()]
+    if missing_files:
+        _eprint("Error: required metadata files are missing:")
+        for p in missing_files:
+            _eprint(f"- {p}")
+        return 2
+    if sql_dir is not None and not sql_dir.is_dir():
+        _eprint(f"Error: SQL directory not found: {sql_dir}")
+        return 2
+
+    cache_path = repo_root / DOCTOR_CACHE_DIR / DOCTOR_CACHE_FILE
+    cache = _load_doctor_cache(cache_path) if use_cache else {}
+    old_files = cache.get("files", {})
+    old_sections = cache.get("sections", {})
+
+    files = {
+        name: _file_fingerprint(path, old_files.get(name))
+        for name, path in (("books", books_path), ("structure", structure_path), ("audio", audio_path))
+    }
+    db_exists = db_path.exists()
+    # Each section is keyed by the fingerprints of exactly the inputs it reads.
+    keys: dict[str, Any] = {
+        "books": files["books"]["sha256"],
+        "structure": files["structure"]["sha256"],
+        "audio": [files[name]["sha256"] for name in ("audio", "books", "structure")],
+        "sqlite": _db_fingerprint(db_path) if db_exists else None,
+    }
+
+    sections: dict[str, Any] = {}
+    cached: list[str] = []
+    timings: dict[str, float] = {}
+
+    def section(name: str, compute: Any) -> Any:
+        old = old_sections.get(name)
+        if old is not None and old.get("key") == keys[name]:
+            cached.append(name)
+            sections[name] = old
+            return old["result"]
+        t0 = time.perf_counter()
+        result = compute()
+        timings[name] = (time.perf_counter() - t0) * 1000
+        sections[name] = {"key": keys[name], "result": result}
+        return result
+
+    try:
+        books = section("books", lambda: _doctor_books(_read_json(books_path)))
+        structure = section("structure", lambda: _doctor_structure(_read_json(structure_path)))
+        audio = section(
+            "audio",
+            lambda: _doctor_audio(_read_json(audio_path), books["book_ids"], structure["chapter_ids"]),
+        )
+    except ValueError as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+
+    db_stats: dict[str, Any] | None = None
+    if db_exists:
+        sqlite_timings: list[tuple[str, float]] = []
+
+        def compute_sqlite() -> dict[str, Any]:
+            stats, checks = _doctor_sqlite(db_path, fast)
+            sqlite_timings.extend(checks)
+            return stats
+
+        if fast:
+            # --fast may create an index, which changes the DB fingerprint; always run it.
+            old_sections.pop("sqlite", None)
+        db_stats = section("sqlite", compute_sqlite)
+        for name, seconds in sqlite_timings:
+            timings[f"sqlite: {name}"] = seconds * 1000
+        if fast:
+            keys["sqlite"] = _db_fingerprint(db_path)
+            sections["sqlite"]["key"] = keys["sqlite"]
+
+    query_plans: list[dict[str, Any]] | None = None
+    if explain and db_exists:
+        t0 = time.perf_counter()
+        conn = _connect_ro(db_path)
+        try:
+            query_plans = _explain_hot_queries(conn, hot_queries)
+        finally:
+            conn.close()
+        timings["query plans"] = (time.perf_counter() - t0) * 1000
+
+    sql_patches: dict[str, Any] | None = None
+    if sql_dir is not None:
+        t0 = time.perf_counter()
+        paths = sql_patch_files(sql_dir)
+        old_patches = old_sections.get("sql_files", {})
+        patch_sections: dict[str, Any] = {}
+        todo: list[Path] = []
+        for path in paths:
+            name = f"sql:{path.name}"
+            files[name] = _file_fingerprint(path, old_files.get(name))
+            # A patch's result depends on the file and on the live DB it is compared with.
+            key = [files[name]["sha256"], keys["sqlite"]]
+            old = old_patches.get(path.name)
+            if old is not None and old.get("key") == key:
+                patch_sections[path.name] = old
+            else:
+                patch_sections[path.name] = {"key": key, "result": None}
+                todo.append(path)
+        for path, result in zip(todo, _check_sql_patches(todo, db_path if db_exists else None, jobs)):
+            patch_sections[path.name]["result"] = result
+        sections["sql_files"] = patch_sections
+        if len(todo) < len(paths):
+            cached.append(f"sql ({len(paths) - len(todo)}/{len(paths)} files)")
+        timings["sql patches"] = (time.perf_counter() - t0) * 1000
+
+        chapter_id_set = set(structure["chapter_ids"])
+        referenced = set(books["sql_files"].values())
+        patch_reports: list[dict[str, Any]] = []
+        for path in paths:
+            result = dict(patch_sections[path.name]["result"])
+            result["file"] = path.name
+            result["in_metadata"] = path.name in referenced
+            result["orphan_chapter_ids"] = [c for c in result.pop("chapter_ids") if c not in chapter_id_set]
+            patch_reports.append(result)
+        present = {p.name for p in paths}
+        patch_book_ids = {int(b) for r in patch_reports for b in r["rows_by_book"]}
+        sql_patches = {
+            "dir": str(sql_dir),
+            "files": patch_reports,
+            "metadata_urls_without_file": {
+                bid: name for bid, name in sorted(books["sql_files"].items(), key=lambda x: int(x[0]))
+                if name not in present
+            },
+            "patch_books_not_in_metadata": sorted(patch_book_ids - set(books["book_ids"])),
+        }
+
+    if use_cache:
+        try:
+            _save_doctor_cache(
+                cache_path,
+                {"version": DOCTOR_CACHE_VERSION, "files": files, "sections": sections},
+            )
+        except OSError as exc:
+            _eprint(f"Warning: could not write doctor cache {cache_path}: {exc}")
+
+    book_id_set = set(books["book_ids"])
+    cross_check: dict[str, list[int]] = {}
+    if db_stats is not None:
+        db_book_set = set(db_stats["db_book_ids"])
+        cross_check = {
+            "missing_in_db": sorted(book_id_set - db_book_set),
+            "local_only_books": _local_only_book_ids(book_id_set, db_book_set),
+            "content_without_metadata": sorted(set(db_stats["content_book_ids"]) - book_id_set),
+        }
+
+    report = {
+        "repo": str(repo_root),
+        "db": str(db_path),
+        "books": books,
+        "structure": structure,
+        "audio": audio,
+        "sqlite": db_stats,
+        "cross_check": cross_check,
+        "query_plans": query_plans,
+        "sql_patches": sql_patches,
+        "cached": cached,
+        "timings": timings,
+    }
+    if output_format == "json":
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_doctor_text(report, show_timings or fast)
+    return 0
+
+
+def run_optimize_db(
+    db_path: Path,
+    hot_queries: Iterable[dict[str, Any]] = HOT_QUERIES,
+    repeat: int = 5,
+    dry_run: bool = False,
+    as_json: bool = False,
+) -> int:
+    if not db_path.exists():
+        _eprint(f"Error: DB not found: {db_path}")
+        return 2
+    queries = list(hot_queries)
+    conn = sqlite3.connect(str(db_path))
+    try:
+        before = _explain_hot_queries(conn, queries)
+        for result in before:
+            if "skipped" not in result:
+                result["ms"], result["rows"] = _time_hot_query(conn, result["sql"], result["params"], repeat)
+        ddls = list(
+            dict.fromkeys(r["index"]["ddl"] for r in before if "skipped" not in r and _hot_query_needs_index(r))
+        )
+        created: list[dict[str, Any]] = []
+        analyze_seconds = 0.0
+        if not dry_run:
+            for ddl in ddls:
+                t0 = time.perf_counter()
+                conn.execute(ddl)
+                conn.commit()
+                created.append({"ddl": ddl, "seconds": round(time.perf_counter() - t0, 3)})
+            t0 = time.perf_counter()
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+            conn.commit()
+            analyze_seconds = time.perf_counter() - t0
+        after = _explain_hot_queries(conn, queries) if not dry_run else []
+        for result in after:
+            if "skipped" not in result:
+                result["ms"], result["rows"] = _time_hot_query(conn, result["sql"], result["params"], repeat)
+    except sqlite3.Error as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    finally:
+        conn.close()
+
+    report = {
+        "db": str(db_path),
+        "dry_run": dry_run,
+        "indexes_created": created,
+        "indexes_needed": ddls,
+        "analyze_seconds": round(analyze_seconds, 3),
+        "queries": [
+            {"name": b["name"], "before": b, "after": a}
+            for b, a in itertools.zip_longest(before, after, fillvalue=None)
+        ],
+    }
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print("== Optimize DB ==")
+    print(f"DB: {db_path}{' (dry run)' if dry_run else ''}")
+    if dry_run:
+        for ddl in ddls:
+            print(f"- would run: {ddl}")
+    for item in created:
+        print(f"- {item['ddl']} ({item['seconds']:.2f}s)")
+    if not dry_run:
+        print(f"- ANALYZE + PRAGMA optimize ({analyze_seconds:.2f}s)")
+    if not ddls:
+        print("- no missing indexes")
+    print()
+    print(f"{'query':<28} {'rows':>7} {'before ms':>10} {'after ms':>9}  plan")
+    for item in report["queries"]:
+        b, a = item["before"], item["after"]
+        if "skipped" in b:
+            print(f"{b['name']:<28} skipped ({b['skipped']})")
+            continue
+        after_ms = f"{a['ms']:>9.2f}" if a else f"{'-':>9}"
+        plan = "; ".join((a or b)["plan"])
+        print(f"{b['name']:<28} {b['rows']:>7} {b['ms']:>10.2f} {after_ms}  {plan}")
     return 0
 
 
-def run_export_sql(db_path: Path, book_id: int, out_path: Path, meta_out: Path | None) -> int:
+def _has_rowid(conn: sqlite3.Connection, table: str) -> bool:
+    try:
+        conn.execute(f"SELECT rowid FROM {table} LIMIT 0")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def _book_id_filter(
+    conn: sqlite3.Connection, book_id: int, table: str = "content", schema: str = "main"
+) -> tuple[str, list[Any]] | None:
+    # WHERE clause and parameters for the raw kotob_id spellings that
+    # _normalize_book_id maps to book_id; None if book_id is not a valid id.
+    # Numbers (3, 3.0) all compare equal to the integer. With an index on
+    # kotob_id, text spellings such as '3' or ' 3' are collected from the text
+    # range of the index without touching rows. Without one that lookup would
+    # be a second full scan, so the normalization runs inside the caller's scan.
+    if _normalize_book_id(book_id) != book_id:
+        return None
+    if not _has_covering_index(conn, table, ["kotob_id"], schema):
+        conn.create_function("kdini_book_id", 1, _normalize_book_id, deterministic=True)
+        return "(kotob_id = ? OR (typeof(kotob_id) = 'text' AND kdini_book_id(kotob_id) = ?))", [book_id, book_id]
+    values: list[Any] = [book_id]
+    for (raw,) in conn.execute(f"SELECT DISTINCT kotob_id FROM {schema}.{table} WHERE kotob_id >= ''"):
+        if isinstance(raw, str) and _normalize_book_id(raw) == book_id:
+            values.append(raw)
+    return f"kotob_id IN ({', '.join('?' for _ in values)})", values
+
+
+def _export_chapter_int(value: Any) -> int:
+    # clamped so a huge numeric string still fits SQLite's 64-bit integers
+    return max(-(1 << 63), min(_as_int(value) or 0, (1 << 63) - 1))
+
+
+def _export_chapter_text(value: Any) -> str:
+    return str(value or "")
+
+
+def _export_select_sql(conn: sqlite3.Connection, cols_sql: str, where: str) -> str:
+    # Rows come out in the order export-sql has always written them:
+    # (_as_int(chapters_id) or 0, str(chapters_id or "")), then table order.
+    # CAST differs from that for REAL and '3.5'-style ids and for 0 vs NULL,
+    # so anything but an INTEGER or NULL goes through the same Python helpers.
+    conn.create_function("kdini_chapter_int", 1, _export_chapter_int, deterministic=True)
+    conn.create_function("kdini_chapter_text", 1, _export_chapter_text, deterministic=True)
+    order = (
+        "CASE WHEN typeof(chapters_id) = 'integer' THEN chapters_id WHEN chapters_id IS NULL THEN 0 "
+        "ELSE kdini_chapter_int(chapters_id) END, "
+        "CASE WHEN chapters_id IS NULL OR (typeof(chapters_id) = 'integer' AND chapters_id = 0) THEN '' "
+        "WHEN typeof(chapters_id) = 'integer' THEN CAST(chapters_id AS TEXT) "
+        "ELSE kdini_chapter_text(chapters_id) END"
+    )
+    if _has_rowid(conn, "content"):
+        order += ", rowid"
+    return f"SELECT {cols_sql} FROM content WHERE {where} ORDER BY {order}"
+
+
+SQL_INSERT_MAX_ROWS = 500
+SQL_MAX_STATEMENT_BYTES = 1_000_000
+
+
+SQL_PATCH_SUFFIXES = (".sql", ".sql.gz", ".sql.zst")
+COMPRESS_SUFFIXES = {"gz": ".gz", "zst": ".zst"}
+
+
+def _load_zstandard() -> Any:
+    try:
+        import zstandard  # type: ignore[import-not-found]
+    except ImportError as exc:
+        raise RuntimeError("zstd support needs the 'zstandard' package (pip install zstandard)") from exc
+    return zstandard
+
+
+def _is_sql_patch(path: Path) -> bool:
+    return path.name.lower().endswith(SQL_PATCH_SUFFIXES)
+
+
+def sql_patch_files(sql_dir: Path) -> list[Path]:
+    return sorted(p for p in sql_dir.iterdir() if p.is_file() and _is_sql_patch(p))
+
+
+def _open_sql_text(path: Path) -> TextIO:
+    # Streaming decompression: callers read in chunks, the file is never inflated in memory.
+    name = path.name.lower()
+    if name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    if name.endswith(".zst"):
+        reader = _load_zstandard().ZstdDecompressor().stream_reader(path.open("rb"), closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", errors="replace", newline="")
+    return path.open("r", encoding="utf-8", errors="replace", newline="")
+
+
+def _open_sql_out(path: Path, compress: str | None) -> TextIO:
+    zstd = _load_zstandard() if compress == "zst" else None
+    raw = path.open("wb")
+    if compress == "gz":
+        # mtime=0 keeps the output byte-identical across runs (clean git diffs)
+        binary: Any = gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0)
+    elif zstd is not None:
+        binary = zstd.ZstdCompressor(level=19).stream_writer(raw, closefd=True)
+    else:
+        binary = raw
+    out = io.TextIOWrapper(binary, encoding="utf-8", newline="\n")
+    if compress == "gz":
+        # GzipFile does not close a caller-supplied fileobj
+        close = out.close
+
+        def close_all() -> None:
+            try:
+                close()
+            finally:
+                raw.close()
+
+        out.close = close_all  # type: ignore[method-assign]
+    return out
+
+
+def _compressed_path(path: Path, compress: str | None) -> Path:
+    suffix = COMPRESS_SUFFIXES.get(compress or "", "")
+    if suffix and not path.name.endswith(suffix):
+        return path.with_name(path.name + suffix)
+    return path
+
+
+def _connect_ro(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path.as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _content_columns(conn: sqlite3.Connection) -> list[str]:
+    return [row[1] for row in conn.execute("PRAGMA table_info(content)").fetchall()]
+
+
+def _metadata_book_ids(books_data: list[Any]) -> list[int]:
+    book_ids_raw = [item.get("id") if isinstance(item, dict) else None for item in books_data]
+    return [b for b in (_as_int(v) for v in book_ids_raw) if b is not None]
+
+
+def _local_only_book_ids(metadata_book_ids: Iterable[int], db_book_ids: Iterable[int]) -> list[int]:
+    return sorted(set(db_book_ids) - set(metadata_book_ids))
+
+
+def _compact_layout_error(cols: list[str]) -> str | None:
+    # A column-less INSERT is read (by inspect-sql, apply-sql, build-db and the
+    # app) in the books.db layout; any other order would shift values.
+    layout = list(_build_db_layout("content"))
+    if [c.lower() for c in cols] == layout:
+        return None
+    return (
+        f"--compact needs content columns in the books.db order ({', '.join(layout)}); "
+        f"this DB has ({', '.join(cols)}). Export without --compact."
+    )
+
+
+def _write_export_sql(
+    conn: sqlite3.Connection,
+    cols: list[str],
+    book_id: int,
+    out_path: Path,
+    insert_batch: int = 1,
+    compact: bool = False,
+    compress: str | None = None,
+) -> int:
+    if compact and (layout_error := _compact_layout_error(cols)):
+        raise ValueError(layout_error)
+    book_filter = _book_id_filter(conn, book_id)
+    if book_filter is None:
+        return 0
+    where, params = book_filter
+
+    exported = 0
+    cols_sql = ", ".join(cols)
+    kid_idx = cols.index("kotob_id") if "kotob_id" in cols else -1
+    book_sql = _sql_quote(book_id)
+    insert_batch = max(1, min(insert_batch, SQL_INSERT_MAX_ROWS))
+    prefix = "INSERT INTO content VALUES " if compact else f"INSERT INTO content ({cols_sql}) VALUES "
+    budget = SQL_MAX_STATEMENT_BYTES - len(prefix.encode("utf-8")) - 2
+
+    cursor = conn.execute(_export_select_sql(conn, cols_sql, where), params)
+    with atomic_io.atomic_path(out_path) as tmp_path:
+        with _open_sql_out(tmp_path, compress) as out:
+            out.write("BEGIN TRANSACTION;\n")
+            out.write(f"DELETE FROM content WHERE kotob_id = {book_id};\n")
+            batch: list[str] = []
+            batch_bytes = 0
+            for row in cursor:
+                vals = [book_sql if i == kid_idx else _sql_quote(v) for i, v in enumerate(row)]
+                tuple_sql = f"({', '.join(vals)})"
+                tuple_bytes = len(tuple_sql.encode("utf-8")) + 2 if insert_batch > 1 else 0
+                if batch and (len(batch) >= insert_batch or batch_bytes + tuple_bytes > budget):
+                    out.write(prefix + ",\n".join(batch) + ";\n")
+                    batch = []
+                    batch_bytes = 0
+                batch.append(tuple_sql)
+                batch_bytes += tuple_bytes
+                exported += 1
+            if batch:
+                out.write(prefix + ",\n".join(batch) + ";\n")
+            out.write("COMMIT;\n")
+
+        if exported == 0:
+            tmp_path.unlink()
+    return exported
+
+
+def _time_patch_import(db_path: Path, sql_path: Path) -> float:
+    src = _connect_ro(db_path)
+    try:
+        schema = [r[0] for r in src.execute("SELECT sql FROM sqlite_master WHERE name = 'content' AND sql IS NOT NULL")]
+    finally:
+        src.close()
+    scratch = sqlite3.connect(":memory:")
+    try:
+        for ddl in schema:
+            scratch.execute(ddl)
+        with _open_sql_text(sql_path) as stream:
+            script = stream.read()
+        started = time.perf_counter()
+        scratch.executescript(script)
+        return time.perf_counter() - started
+    finally:
+        scratch.close()
+
+
+def _report_export_format(
+    db_path: Path,
+    conn: sqlite3.Connection,
+    cols: list[str],
+    book_id: int,
+    out_path: Path,
+    compress: str | None = None,
+) -> None:
+    # The reference file gets the same compression, so the figures show what batching saves.
+    legacy_path = out_path.with_name(f".legacy.{out_path.name}")
+    try:
+        _write_export_sql(conn, cols, book_id, legacy_path, compress=compress)
+        new_size = out_path.stat().st_size
+        legacy_size = legacy_path.stat().st_size
+        new_time = _time_patch_import(db_path, out_path)
+        legacy_time = _time_patch_import(db_path, legacy_path)
+    finally:
+        legacy_path.unlink(missing_ok=True)
+    saved = 100.0 * (legacy_size - new_size) / legacy_size if legacy_size else 0.0
+    both = f", both {compress}" if compress else ""
+    print(f"Size: {new_size} bytes vs {legacy_size} bytes one-row-per-INSERT{both} ({saved:.1f}% smaller)")
+    print(f"Import into scratch DB: {new_time * 1000:.1f} ms vs {legacy_time * 1000:.1f} ms one-row-per-INSERT")
+
+
+def _book_meta_snippet(conn: sqlite3.Connection, book_id: int) -> dict[str, Any]:
+    if _table_exists(conn, "kotob"):
+        row = conn.execute("SELECT * FROM kotob WHERE id = ? LIMIT 1", (book_id,)).fetchone()
+        if row is not None:
+            d = dict(row)
+            return {
+                "id": _as_int(d.get("id")) or book_id,
+                "title": d.get("title"),
+                "description": d.get("description"),
+                "version": d.get("latest_version") or d.get("current_version"),
+                "latest_version": d.get("latest_version"),
+                "sql_download_url": d.get("sql_download_url"),
+                "is_default": _as_int(d.get("is_default")) or 0,
+                "is_downloaded_on_device": _as_int(d.get("is_downloaded")) or 0,
+                "status": d.get("status"),
+            }
+    return {
+        "id": book_id,
+        "title": "",
+        "description": "",
+        "version": "",
+        "latest_version": "",
+        "sql_download_url": "",
+        "is_default": 0,
+        "is_downloaded_on_device": 0,
+        "status": "active",
+    }
+
+
+def _write_book_meta(conn: sqlite3.Connection, book_id: int, meta_out: Path) -> None:
+    meta_out.parent.mkdir(parents=True, exist_ok=True)
+    snippet = _book_meta_snippet(conn, book_id)
+    meta_out.write_text(json.dumps(snippet, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def run_export_sql(
+    db_path: Path,
+    book_id: int,
+    out_path: Path,
+    meta_out: Path | None,
+    insert_batch: int = 1,
+    compact: bool = False,
+    measure_import: bool = False,
+    compress: str | None = None,
+) -> int:
     if not db_path.exists():
         _eprint(f"Error: DB file not found: {db_path}")
         return 2
@@ -364,127 +1320,2336 @@ def run_export_sql(db_path: Path, book_id: int, out_path: Path, meta_out: Path |
         conn.close()
         return 2
 
-    cols = [row[1] for row in conn.execute("PRAGMA table_info(content)").fetchall()]
+    cols = _content_columns(conn)
     if not cols:
         _eprint("Error: could not read content table columns")
         conn.close()
         return 2
+    if compact and (layout_error := _compact_layout_error(cols)):
+        _eprint(f"Error: {layout_error}")
+        conn.close()
+        return 2
 
-    all_rows = [dict(r) for r in conn.execute("SELECT * FROM content").fetchall()]
-    selected = [r for r in all_rows if _normalize_book_id(r.get("kotob_id")) == book_id]
-
-    if not selected:
+    out_path = _compressed_path(out_path, compress)
+    exported = _write_export_sql(
+        conn, cols, book_id, out_path, insert_batch=insert_batch, compact=compact, compress=compress
+    )
+    if exported == 0:
         _eprint(f"Error: no rows found in content for book_id={book_id}")
         conn.close()
         return 3
 
-    selected.sort(key=lambda r: (_as_int(r.get("chapters_id")) or 0, str(r.get("chapters_id") or "")))
+    print(f"Exported {exported} content rows for book_id={book_id}")
+    print(f"SQL file: {out_path}")
+    if measure_import:
+        _report_export_format(db_path, conn, cols, book_id, out_path, compress=compress)
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if meta_out is not None:
+        _write_book_meta(conn, book_id, meta_out)
+        print(f"Book metadata snippet: {meta_out}")
 
-    lines: list[str] = []
-    lines.append("BEGIN TRANSACTION;")
-    lines.append(f"DELETE FROM content WHERE kotob_id = {book_id};")
+    conn.close()
+    return 0
 
-    cols_sql = ", ".join(cols)
-    for row in selected:
-        vals = []
-        for c in cols:
-            if c == "kotob_id":
-                vals.append(_sql_quote(book_id))
-            else:
-                vals.append(_sql_quote(row.get(c)))
-        lines.append(f"INSERT INTO content ({cols_sql}) VALUES ({', '.join(vals)});")
 
-    lines.append("COMMIT;")
-    out_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+def run_export_sql_many(
+    repo_root: Path,
+    db_path: Path,
+    book_ids: list[int],
+    all_local_only: bool,
+    out_dir: Path,
+    jobs: int,
+    insert_batch: int = 1,
+    compact: bool = False,
+    compress: str | None = None,
+) -> int:
+    if not db_path.exists():
+        _eprint(f"Error: DB file not found: {db_path}")
+        return 2
 
-    print(f"Exported {len(selected)} content rows for book_id={book_id}")
-    print(f"SQL file: {out_path}")
+    conn = _connect_ro(db_path)
+    try:
+        if not _table_exists(conn, "content"):
+            _eprint("Error: table 'content' not found in DB")
+            return 2
+        if compact and (layout_error := _compact_layout_error(_content_columns(conn))):
+            _eprint(f"Error: {layout_error}")
+            return 2
+        if all_local_only:
+            books_path = repo_root / BOOKS_JSON
+            if not books_path.exists():
+                _eprint(f"Error: required metadata file is missing: {books_path}")
+                return 2
+            books_data = _read_json(books_path)
+            if not isinstance(books_data, list):
+                _eprint(f"Error: {books_path} must be a JSON array")
+                return 2
+            db_book_ids: list[int] = []
+            if _table_exists(conn, "kotob"):
+                db_book_ids = _sorted_ids(r[0] for r in conn.execute("SELECT id FROM kotob"))
+            book_ids = book_ids + _local_only_book_ids(_metadata_book_ids(books_data), db_book_ids)
+    finally:
+        conn.close()
+
+    targets = sorted(set(book_ids))
+    if not targets:
+        print("No books to export.")
+        return 0
+
+    local = threading.local()
+    opened: list[sqlite3.Connection] = []
+    opened_lock = threading.Lock()
+
+    def export_one(book_id: int) -> tuple[int, int]:
+        worker = getattr(local, "conn", None)
+        if worker is None:
+            worker = _connect_ro(db_path)
+            local.conn = worker
+            local.cols = _content_columns(worker)
+            with opened_lock:
+                opened.append(worker)
+        out_path = _compressed_path(out_dir / f"book_{book_id}.sql", compress)
+        exported = _write_export_sql(
+            worker, local.cols, book_id, out_path, insert_batch=insert_batch, compact=compact, compress=compress
+        )
+        if exported > 0:
+            _write_book_meta(worker, book_id, out_dir / f"book_{book_id}.book.json")
+        return book_id, exported
+
+    started = time.perf_counter()
+    missing: list[int] = []
+    total_rows = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(targets)))) as pool:
+            for book_id, exported in pool.map(export_one, targets):
+                if exported == 0:
+                    missing.append(book_id)
+                    print(f"- book_id={book_id}: no content rows, skipped")
+                    continue
+                total_rows += exported
+                out_name = _compressed_path(out_dir / f"book_{book_id}.sql", compress)
+                print(f"- book_id={book_id}: {exported} rows -> {out_name}")
+    finally:
+        for worker in opened:
+            worker.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Exported {len(targets) - len(missing)}/{len(targets)} books, {total_rows} content rows "
+        f"in {elapsed:.2f}s (jobs={jobs})"
+    )
+    return 3 if missing else 0
+
+
+PACK_PAGE_SIZES = (1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _table_ddl(conn: sqlite3.Connection, schema: str, table: str) -> tuple[str | None, list[str]]:
+    rows = conn.execute(
+        f"SELECT type, sql FROM {schema}.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    create = next((r[1] for r in rows if r[0] == "table"), None)
+    indexes = [r[1] for r in rows if r[0] == "index"]
+    return create, indexes
+
+
+def _copy_book_rows(
+    conn: sqlite3.Connection,
+    table: str,
+    cols: list[str],
+    book_id: int,
+    order: str,
+) -> int:
+    book_filter = _book_id_filter(conn, book_id, table, "src")
+    if book_filter is None:
+        return 0
+    where, where_params = book_filter
+    select_cols = ", ".join("?" if c == "kotob_id" else c for c in cols)
+    params: list[Any] = ([book_id] if "kotob_id" in cols else []) + where_params
+    cur = conn.execute(
+        f"INSERT INTO main.{table} ({', '.join(cols)}) "
+        f"SELECT {select_cols} FROM src.{table} WHERE {where} ORDER BY {order}",
+        params,
+    )
+    return cur.rowcount
+
+
+def run_export_db(db_path: Path, book_id: int, out_path: Path, page_size: int, meta_out: Path | None) -> int:
+    if not db_path.exists():
+        _eprint(f"Error: DB file not found: {db_path}")
+        return 2
+
+    src = _connect_ro(db_path)
+    try:
+        if not _table_exists(src, "content"):
+            _eprint("Error: table 'content' not found in DB")
+            return 2
+        has_audio = _table_exists(src, "content_audio")
+        content_cols = _content_columns(src)
+        audio_cols = [r[1] for r in src.execute("PRAGMA table_info(content_audio)")] if has_audio else []
+    finally:
+        src.close()
+
+    # Build in memory with the requested page size, then VACUUM INTO writes a
+    # compact, defragmented file in one pass.
+    conn = sqlite3.connect("file:kdini_pack?mode=memory", uri=True)
+    try:
+        conn.execute(f"PRAGMA page_size = {int(page_size)}")
+        conn.execute("ATTACH DATABASE ? AS src", (db_path.as_uri() + "?mode=ro",))
+
+        order = "COALESCE(CAST(chapters_id AS INTEGER), 0), CAST(chapters_id AS TEXT)"
+        counts: dict[str, int] = {"content": 0, "content_audio": 0}
+        for table, cols in (("content", content_cols), ("content_audio", audio_cols)):
+            if not cols:
+                continue
+            create, indexes = _table_ddl(conn, "src", table)
+            if create is None:
+                continue
+            conn.execute(create)
+            table_order = order + (", rowid" if _has_rowid(conn, f"src.{table}") else "")
+            counts[table] = _copy_book_rows(conn, table, cols, book_id, table_order)
+            for ddl in indexes:
+                conn.execute(ddl)
+
+        if counts["content"] == 0:
+            _eprint(f"Error: no rows found in content for book_id={book_id}")
+            return 3
+
+        conn.execute("CREATE TABLE pack_info (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        conn.executemany(
+            "INSERT INTO pack_info (key, value) VALUES (?, ?)",
+            [
+                ("format", "kdini-book-pack/1"),
+                ("kotob_id", str(book_id)),
+                ("content_rows", str(counts["content"])),
+                ("content_audio_rows", str(counts["content_audio"])),
+            ],
+        )
+        conn.execute(f"PRAGMA user_version = {int(book_id)}")
+        conn.commit()
+        conn.execute("ANALYZE main")
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+
+        with atomic_io.atomic_path(out_path) as tmp_path:
+            conn.execute("VACUUM INTO ?", (str(tmp_path),))
+    finally:
+        conn.close()
+
+    info = {
+        "id": book_id,
+        "db_file": out_path.name,
+        "db_sha256": _sha256_file(out_path),
+        "db_size": out_path.stat().st_size,
+        "db_page_size": page_size,
+        "content_rows": counts["content"],
+        "content_audio_rows": counts["content_audio"],
+    }
+    print(f"Exported {counts['content']} content rows and {counts['content_audio']} content_audio rows for book_id={book_id}")
+    print(f"DB pack: {out_path} ({info['db_size']} bytes, page_size={page_size})")
+    print(f"sha256: {info['db_sha256']}")
+    print("books_metadata.json fields:")
+    print(json.dumps(info, ensure_ascii=False, indent=2))
 
     if meta_out is not None:
         meta_out.parent.mkdir(parents=True, exist_ok=True)
-        snippet = None
-        if _table_exists(conn, "kotob"):
-            row = conn.execute("SELECT * FROM kotob WHERE id = ? LIMIT 1", (book_id,)).fetchone()
-            if row is not None:
-                d = dict(row)
-                snippet = {
-                    "id": _as_int(d.get("id")) or book_id,
-                    "title": d.get("title"),
-                    "description": d.get("description"),
-                    "version": d.get("latest_version") or d.get("current_version"),
-                    "latest_version": d.get("latest_version"),
-                    "sql_download_url": d.get("sql_download_url"),
-                    "is_default": _as_int(d.get("is_default")) or 0,
-                    "is_downloaded_on_device": _as_int(d.get("is_downloaded")) or 0,
-                    "status": d.get("status"),
+        meta_out.write_text(json.dumps(info, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Pack metadata: {meta_out}")
+    return 0
+
+
+SQL_READ_CHUNK = 1 << 16
+SQL_LITERAL_KEEP = 64
+SQL_HEAD_TOKENS = 12
+
+_SQL_SPACE_RE = re.compile(r"\s+")
+_SQL_WORD_RE = re.compile(r"[^\W\d]\w*")
+_SQL_NUMBER_RE = re.compile(r"\d+(?:\.\d*)?(?:[eE][+-]?\d+)?")
+
+
+class _SqlTokenizer:
+    # Reads the stream in fixed-size chunks. String literal bodies are skipped
+    # with str.find and only their first SQL_LITERAL_KEEP characters are kept,
+    # so memory stays bounded no matter how large one INSERT gets.
+
+    def __init__(self, stream: TextIO, chunk_size: int = SQL_READ_CHUNK) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _more(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self, offset: int) -> str:
+        while self._pos + offset >= len(self._buf):
+            if not self._more():
+                return ""
+        return self._buf[self._pos + offset]
+
+    def _match(self, pattern: re.Pattern[str]) -> str:
+        while True:
+            m = pattern.match(self._buf, self._pos)
+            if m is None:
+                return ""
+            # a number's exponent ("e+3") can need two characters past a partial match
+            if m.end() + 2 < len(self._buf) or not self._more():
+                self._pos = m.end()
+                return m.group()
+
+    def _skip_past(self, terminator: str) -> None:
+        while True:
+            idx = self._buf.find(terminator, self._pos)
+            if idx >= 0:
+                self._pos = idx + len(terminator)
+                return
+            self._pos = max(self._pos, len(self._buf) - len(terminator) + 1)
+            if not self._more():
+                self._pos = len(self._buf)
+                return
+
+    def _read_quoted(self, quote: str) -> str:
+        kept: list[str] = []
+        room = SQL_LITERAL_KEEP
+        while True:
+            idx = self._buf.find(quote, self._pos)
+            end = len(self._buf) if idx < 0 else idx
+            if room > 0:
+                piece = self._buf[self._pos : min(end, self._pos + room)]
+                kept.append(piece)
+                room -= len(piece)
+            self._pos = end
+            if idx < 0:
+                if not self._more():
+                    return "".join(kept)
+                continue
+            self._pos += 1
+            if self._peek(0) != quote:
+                return "".join(kept)
+            # doubled quote is an escaped quote character inside the literal
+            if room > 0:
+                kept.append(quote)
+                room -= 1
+            self._pos += 1
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        while True:
+            if self._pos >= len(self._buf) and not self._more():
+                return
+            ch = self._buf[self._pos]
+            if ch.isspace():
+                self._match(_SQL_SPACE_RE)
+            elif ch == "'":
+                self._pos += 1
+                yield "string", self._read_quoted("'")
+            elif ch == '"' or ch == "`":
+                self._pos += 1
+                yield "ident", self._read_quoted(ch)
+            elif ch == "-" and self._peek(1) == "-":
+                self._skip_past("\n")
+            elif ch == "/" and self._peek(1) == "*":
+                self._pos += 2
+                self._skip_past("*/")
+            elif ch.isdigit() and (number := self._match(_SQL_NUMBER_RE)):
+                # isdigit() also accepts characters such as "²" that \d does not
+                yield "number", number
+            elif ch.isalpha() or ch == "_":
+                yield "word", self._match(_SQL_WORD_RE)
+            else:
+                self._pos += 1
+                yield ("end" if ch == ";" else "op"), ch
+
+
+SQL_ROW_KEYS = ("kotob_id", "chapters_id")
+
+
+class _SqlStatement:
+    # Incremental parser for one statement. Keeps the leading tokens (DELETE
+    # statements whole) and, for INSERT ... VALUES, only the kotob_id and
+    # chapters_id of every row, so multi-row inserts stay cheap.
+
+    def __init__(self) -> None:
+        self.head: list[tuple[str, str]] = []
+        self.verb = ""
+        self.columns: list[str] = []
+        # set for a column-less INSERT; columns is then the books.db layout
+        self.implicit_columns = False
+        self.rows: list[tuple[int | None, int | None]] = []
+        self._keep_all = False
+        self._state = "head"
+        self._key_slots: dict[int, int] = {}
+        self._depth = 0
+        self._value_idx = 0
+        self._sign = 1
+        self._row: list[int | None] = []
+
+    def feed(self, kind: str, value: str) -> None:
+        if kind == "word":
+            value = value.upper()
+        if not self.verb:
+            self.verb = value if kind == "word" else "?"
+            self._keep_all = self.verb == "DELETE"
+        if self._keep_all or len(self.head) < SQL_HEAD_TOKENS:
+            self.head.append((kind, value))
+        if self.verb not in ("INSERT", "REPLACE") or self._state == "rest":
+            return
+
+        if self._state == "head":
+            if kind == "word" and value == "VALUES":
+                self._state = "values"
+                if not self.columns:
+                    # export-sql --compact leaves the column list out
+                    self.columns = list(_build_db_layout(_sql_table_after(self.head, "INTO")[0]))
+                    self.implicit_columns = True
+                self._key_slots = {
+                    i: SQL_ROW_KEYS.index(c) for i, c in enumerate(self.columns) if c in SQL_ROW_KEYS
                 }
-        if snippet is None:
-            snippet = {
-                "id": book_id,
-                "title": "",
-                "description": "",
-                "version": "",
-                "latest_version": "",
-                "sql_download_url": "",
-                "is_default": 0,
-                "is_downloaded_on_device": 0,
-                "status": "active",
-            }
+            elif kind == "word" and value in ("SELECT", "DEFAULT", "WITH"):
+                self._state = "rest"
+            elif kind == "op" and value == "(" and not self.columns:
+                self._state = "columns"
+        elif self._state == "columns":
+            if kind in ("word", "ident"):
+                self.columns.append(value.lower())
+            elif kind == "op" and value == ")":
+                self._state = "head"
+        elif self._state == "values":
+            self._feed_value(kind, value)
+
+    def _feed_value(self, kind: str, value: str) -> None:
+        if kind == "op":
+            if value == "(":
+                self._depth += 1
+                if self._depth == 1:
+                    self._row = [None, None]
+                    self._value_idx = 0
+                    self._sign = 1
+            elif value == ")":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.rows.append((self._row[0], self._row[1]))
+            elif value == "," and self._depth == 1:
+                self._value_idx += 1
+                self._sign = 1
+            elif value == "-" and self._depth == 1:
+                self._sign = -self._sign
+            return
+        if self._depth == 0:
+            # ON CONFLICT / RETURNING tails carry no more rows
+            if kind == "word":
+                self._state = "rest"
+            return
+        slot = self._key_slots.get(self._value_idx)
+        if slot is not None and self._depth == 1 and kind in ("number", "string"):
+            iv = _as_int(value)
+            self._row[slot] = None if iv is None else self._sign * iv
+
+
+def _iter_sql_statements(stream: TextIO) -> Iterator[_SqlStatement]:
+    stmt: _SqlStatement | None = None
+    for kind, value in _SqlTokenizer(stream):
+        if kind == "end":
+            if stmt is not None:
+                yield stmt
+            stmt = None
+            continue
+        if stmt is None:
+            stmt = _SqlStatement()
+        stmt.feed(kind, value)
+    if stmt is not None:
+        yield stmt
+
+
+def _sql_name(token: tuple[str, str] | None) -> str:
+    if token is None or token[0] not in ("word", "ident"):
+        return ""
+    return token[1].lower()
+
+
+def _sql_table_after(head: list[tuple[str, str]], keyword: str) -> tuple[str, int]:
+    for i, (kind, value) in enumerate(head):
+        if kind == "word" and value == keyword:
+            j = i + 1
+            # schema-qualified names such as main.content
+            if j + 2 < len(head) and head[j + 1] == ("op", "."):
+                j += 2
+            return _sql_name(head[j] if j < len(head) else None), j + 1
+    return "", len(head)
+
+
+def _sql_int_at(tokens: list[tuple[str, str]], idx: int) -> tuple[int | None, int]:
+    sign = 1
+    if idx < len(tokens) and tokens[idx] == ("op", "-"):
+        sign = -1
+        idx += 1
+    if idx >= len(tokens):
+        return None, idx
+    kind, value = tokens[idx]
+    if kind not in ("number", "string"):
+        return None, idx
+    iv = _as_int(value)
+    return (sign * iv if iv is not None else None), idx + 1
+
+
+def _sql_delete_where(head: list[tuple[str, str]], start: int) -> tuple[str, list[int]]:
+    rest = head[start:]
+    if len(rest) < 4 or rest[0] != ("word", "WHERE"):
+        return "", []
+    column = _sql_name(rest[1])
+    if rest[2] == ("op", "="):
+        value, _ = _sql_int_at(rest, 3)
+        return column, ([] if value is None else [value])
+    if rest[2] != ("word", "IN") or rest[3] != ("op", "("):
+        return "", []
+    ids: list[int] = []
+    idx = 4
+    while idx < len(rest) and rest[idx] != ("op", ")"):
+        value, nxt = _sql_int_at(rest, idx)
+        if value is None:
+            return "", []
+        ids.append(value)
+        idx = nxt
+        if idx < len(rest) and rest[idx] == ("op", ","):
+            idx += 1
+    return column, ids
+
+
+def _scan_sql_patch(sql_path: Path) -> dict[str, Any]:
+    counts = Counter()
+    insert_rows: Counter[str] = Counter()
+    unchecked_rows: Counter[str] = Counter()
+    delete_statements: Counter[str] = Counter()
+    wiped_tables: set[str] = set()
+    deleted: dict[str, dict[str, set[int]]] = {}
+    inserted_keys: dict[str, Counter[tuple[int | None, int | None]]] = {}
+    columns: dict[str, list[str]] = {}
+
+    with _open_sql_text(sql_path) as stream:
+        for stmt in _iter_sql_statements(stream):
+            counts["statements"] += 1
+            verb = stmt.verb
+            if verb == "BEGIN":
+                counts["begin"] += 1
+            elif verb in ("COMMIT", "END"):
+                counts["commit"] += 1
+            elif verb == "ROLLBACK":
+                counts["rollback"] += 1
+            elif verb == "DELETE":
+                table, nxt = _sql_table_after(stmt.head, "FROM")
+                if not table:
+                    continue
+                delete_statements[table] += 1
+                columns.setdefault(table, [])
+                if nxt >= len(stmt.head):
+                    wiped_tables.add(table)
+                    continue
+                column, ids = _sql_delete_where(stmt.head, nxt)
+                if column in SQL_ROW_KEYS:
+                    deleted.setdefault(table, {}).setdefault(column, set()).update(ids)
+            elif verb in ("INSERT", "REPLACE"):
+                table, _ = _sql_table_after(stmt.head, "INTO")
+                if not table:
+                    continue
+                if table == "content":
+                    counts["insert_content"] += 1
+                cols = columns.setdefault(table, [])
+                cols.extend(c for c in stmt.columns if c not in cols)
+                keys = inserted_keys.setdefault(table, Counter())
+                n_rows = len(stmt.rows) or 1
+                insert_rows[table] += n_rows
+                if stmt.rows and stmt.columns:
+                    keys.update(stmt.rows)
+                else:
+                    # no column list (or INSERT ... SELECT): row keys are unknown
+                    unchecked_rows[table] += n_rows
+
+    coverage: dict[str, dict[str, int]] = {}
+    for table, keys in inserted_keys.items():
+        unchecked = unchecked_rows[table]
+        targets = deleted.get(table, {})
+        del_books = targets.get("kotob_id", set())
+        del_chapters = targets.get("chapters_id", set())
+        covered = 0
+        for (kid, chid), n in keys.items():
+            if table in wiped_tables or kid in del_books or chid in del_chapters:
+                covered += n
+        if table in wiped_tables:
+            covered += unchecked
+            unchecked = 0
+        total = sum(keys.values()) + unchecked_rows[table]
+        coverage[table] = {
+            "rows": total,
+            "covered": covered,
+            "uncovered": total - covered - unchecked,
+            "unchecked": unchecked,
+            "duplicate_keys": sum(1 for (kid, chid), n in keys.items() if n > 1 and chid is not None),
+        }
 
-        meta_out.write_text(json.dumps(snippet, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-        print(f"Book metadata snippet: {meta_out}")
+    content_deleted = deleted.get("content", {})
+    content_keys = inserted_keys.get("content", Counter())
+
+    # {"code", "message"}: callers filter on the code, the message is for people
+    warnings: list[dict[str, str]] = []
+    for table in sorted(coverage):
+        cov = coverage[table]
+        if cov["uncovered"] > 0:
+            warnings.append(
+                {
+                    "code": "uncovered_rows",
+                    "message": f"{cov['uncovered']} of {cov['rows']} INSERT rows into {table} are not covered "
+                    "by a DELETE (risk of duplicates).",
+                }
+            )
+        if cov["unchecked"] > 0:
+            warnings.append(
+                {
+                    "code": "unchecked_rows",
+                    "message": f"{cov['unchecked']} INSERT rows into {table} have no column list; "
+                    "DELETE coverage not checked.",
+                }
+            )
+        if cov["duplicate_keys"] > 0:
+            warnings.append(
+                {
+                    "code": "duplicate_keys",
+                    "message": f"{cov['duplicate_keys']} (kotob_id, chapters_id) keys are inserted into {table} "
+                    "more than once.",
+                }
+            )
+    if counts["begin"] == 0 or counts["commit"] == 0:
+        warnings.append({"code": "incomplete_transaction", "message": "transaction markers are incomplete."})
+
+    return {
+        "file": str(sql_path),
+        "statements": counts["statements"],
+        "begin": counts["begin"],
+        "commit": counts["commit"],
+        "rollback": counts["rollback"],
+        "delete_content": delete_statements["content"],
+        "insert_content": counts["insert_content"],
+        "delete_book_ids": sorted(content_deleted.get("kotob_id", set())),
+        "delete_chapter_ids": sorted(content_deleted.get("chapters_id", set())),
+        "insert_book_ids": sorted({kid for kid, _ in content_keys if kid is not None}),
+        "insert_chapter_ids": sorted({chid for _, chid in content_keys if chid is not None}),
+        "insert_rows": dict(sorted(insert_rows.items())),
+        "delete_statements": dict(sorted(delete_statements.items())),
+        "deleted_ids": {
+            table: {column: sorted(ids) for column, ids in sorted(cols.items())}
+            for table, cols in sorted(deleted.items())
+        },
+        "wiped_tables": sorted(wiped_tables),
+        "columns": columns,
+        "coverage": coverage,
+        "warnings": warnings,
+    }
+
+
+def _find_sql_conflicts(reports: list[dict[str, Any]]) -> list[str]:
+    owners: dict[tuple[str, str, int], list[str]] = {}
+    for report in reports:
+        name = Path(report["file"]).name
+        for table, cols in report["deleted_ids"].items():
+            for column, ids in cols.items():
+                for value in ids:
+                    owners.setdefault((table, column, value), []).append(name)
+
+    conflicts: list[str] = []
+    pair_overlap: dict[tuple[str, str, str, str], list[int]] = {}
+    for (table, column, value), names in sorted(owners.items()):
+        if len(names) < 2:
+            continue
+        if column == "kotob_id":
+            conflicts.append(f"{table}.kotob_id {value} is deleted by {len(names)} files: {', '.join(names)}")
+            continue
+        for i, a in enumerate(names):
+            for b in names[i + 1 :]:
+                pair_overlap.setdefault((table, column, a, b), []).append(value)
+    for (table, column, a, b), ids in sorted(pair_overlap.items()):
+        conflicts.append(f"{a} and {b} both delete {table}.{column} {_format_id_ranges(ids)} ({len(ids)} IDs)")
+    return conflicts
+
+
+def _format_id_ranges(ids: list[int]) -> str:
+    parts: list[str] = []
+    start = prev = None
+    for value in ids:
+        if start is None:
+            start = prev = value
+            continue
+        if value == prev + 1:
+            prev = value
+            continue
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+        start = prev = value
+    if start is not None:
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+    return ", ".join(parts) if parts else "none"
 
-    conn.close()
-    return 0
 
+def _scan_sql_patches(paths: list[Path], jobs: int) -> list[dict[str, Any]]:
+    if jobs <= 1 or len(paths) <= 1:
+        return [_scan_sql_patch(p) for p in paths]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        return list(pool.map(_scan_sql_patch, paths))
 
-def run_inspect_sql(sql_path: Path) -> int:
+
+def run_inspect_sql(sql_path: Path, as_json: bool = False) -> int:
     if not sql_path.exists():
         _eprint(f"Error: SQL file not found: {sql_path}")
         return 2
 
-    text = sql_path.read_text(encoding="utf-8", errors="replace")
-
-    begin_count = len(re.findall(r"\bBEGIN\s+TRANSACTION\b", text, flags=re.IGNORECASE))
-    commit_count = len(re.findall(r"\bCOMMIT\b", text, flags=re.IGNORECASE))
-    rollback_count = len(re.findall(r"\bROLLBACK\b", text, flags=re.IGNORECASE))
-    delete_content_count = len(
-        re.findall(r"\bDELETE\s+FROM\s+content\b", text, flags=re.IGNORECASE)
-    )
-    insert_content_count = len(
-        re.findall(r"\bINSERT\s+INTO\s+content\b", text, flags=re.IGNORECASE)
-    )
+    try:
+        report = _scan_sql_patch(sql_path)
+    except RuntimeError as exc:
+        _eprint(f"Error: {exc}")
+        return 2
 
-    delete_book_ids = sorted(
-        {
-            int(m.group(1))
-            for m in re.finditer(
-                r"\bDELETE\s+FROM\s+content\s+WHERE\s+kotob_id\s*=\s*(-?\d+)",
-                text,
-                flags=re.IGNORECASE,
-            )
-        }
-    )
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
 
+    delete_book_ids = report["delete_book_ids"]
+    delete_chapter_ids = report["delete_chapter_ids"]
     print("== SQL Inspect ==")
     print(f"File: {sql_path}")
-    print(f"- BEGIN TRANSACTION: {begin_count}")
-    print(f"- COMMIT: {commit_count}")
-    print(f"- ROLLBACK: {rollback_count}")
-    print(f"- DELETE FROM content: {delete_content_count}")
-    print(f"- INSERT INTO content: {insert_content_count}")
+    print(f"- statements: {report['statements']}")
+    print(f"- BEGIN TRANSACTION: {report['begin']}")
+    print(f"- COMMIT: {report['commit']}")
+    print(f"- ROLLBACK: {report['rollback']}")
+    print(f"- DELETE FROM content: {report['delete_content']}")
+    print(f"- INSERT INTO content: {report['insert_content']}")
     print(
         "- DELETE targets (kotob_id): "
         + (", ".join(map(str, delete_book_ids)) if delete_book_ids else "none")
     )
+    if delete_chapter_ids:
+        print(f"- DELETE targets (chapters_id): {_format_id_ranges(delete_chapter_ids)}")
+    for table, ids in report["deleted_ids"].items():
+        if table == "content":
+            continue
+        for column, values in ids.items():
+            print(f"- DELETE FROM {table} targets ({column}): {_format_id_ranges(values)}")
+    for table in report["wiped_tables"]:
+        print(f"- DELETE FROM {table}: whole table")
+    if report["insert_rows"]:
+        print("- INSERT rows by table: " + ", ".join(f"{t}={n}" for t, n in report["insert_rows"].items()))
+    if report["insert_book_ids"]:
+        print(f"- inserted content kotob_id values: {', '.join(map(str, report['insert_book_ids']))}")
+    for table, cov in report["coverage"].items():
+        pct = 100.0 * cov["covered"] / cov["rows"] if cov["rows"] else 100.0
+        print(f"- {table} rows covered by DELETE: {cov['covered']}/{cov['rows']} ({pct:.0f}%)")
+
+    for warning in report["warnings"]:
+        print(f"Warning: {warning['message']}")
+
+    return 0
+
+
+def run_inspect_sql_dir(sql_dir: Path, jobs: int, as_json: bool = False) -> int:
+    if not sql_dir.is_dir():
+        _eprint(f"Error: SQL directory not found: {sql_dir}")
+        return 2
+
+    paths = sql_patch_files(sql_dir)
+    if not paths:
+        _eprint(f"Error: no SQL patches ({', '.join(SQL_PATCH_SUFFIXES)}) in {sql_dir}")
+        return 2
+
+    try:
+        reports = _scan_sql_patches(paths, jobs)
+    except RuntimeError as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    totals = Counter()
+    for report in reports:
+        for key in ("statements", "begin", "commit", "rollback", "delete_content", "insert_content"):
+            totals[key] += report[key]
+        totals["content_rows"] += report["insert_rows"].get("content", 0)
+        totals["warnings"] += len(report["warnings"])
+    conflicts = _find_sql_conflicts(reports)
+
+    if as_json:
+        payload = {
+            "dir": str(sql_dir),
+            "files": reports,
+            "totals": dict(totals),
+            "conflicts": conflicts,
+        }
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+        return 0
+
+    name_width = max(len(p.name) for p in paths)
+    print("== SQL Inspect (batch) ==")
+    print(f"Dir: {sql_dir} ({len(paths)} files, jobs={jobs})")
+    print()
+    print(
+        f"{'file':<{name_width}}  {'stmts':>6}  {'begin':>5}  {'commit':>6}  {'delete':>6}  {'rows':>6}  "
+        f"{'cover':>5}  targets"
+    )
+    for report in reports:
+        targets = ", ".join(map(str, report["delete_book_ids"])) or "-"
+        if report["delete_chapter_ids"]:
+            targets += f" (+{len(report['delete_chapter_ids'])} chapters)"
+        cov = report["coverage"].get("content", {"rows": 0, "covered": 0})
+        cover = f"{100 * cov['covered'] // cov['rows']}%" if cov["rows"] else "-"
+        flag = " !" if report["warnings"] else ""
+        print(
+            f"{Path(report['file']).name:<{name_width}}  {report['statements']:>6}  {report['begin']:>5}  "
+            f"{report['commit']:>6}  {report['delete_content']:>6}  {cov['rows']:>6}  {cover:>5}  {targets}{flag}"
+        )
+    print(
+        f"{'TOTAL':<{name_width}}  {totals['statements']:>6}  {totals['begin']:>5}  "
+        f"{totals['commit']:>6}  {totals['delete_content']:>6}  {totals['content_rows']:>6}"
+    )
+    print()
+
+    print("[Warnings]")
+    if totals["warnings"] == 0:
+        print("- none")
+    for report in reports:
+        for warning in report["warnings"]:
+            print(f"- {Path(report['file']).name}: {warning['message']}")
+    print()
+
+    print("[Cross-file conflicts]")
+    if not conflicts:
+        print("- none")
+    for conflict in conflicts:
+        print(f"- {conflict}")
+
+    return 0
+
+
+def _iter_sql_text_statements(stream: TextIO) -> Iterator[str]:
+    # Yields one complete statement at a time. sqlite3.complete_statement only
+    # runs at ';' positions, so long multi-line literals are not rescanned per line.
+    pending: list[str] = []
+    for line in stream:
+        start = 0
+        while True:
+            idx = line.find(";", start)
+            if idx < 0:
+                pending.append(line[start:])
+                break
+            pending.append(line[start : idx + 1])
+            text = "".join(pending)
+            if sqlite3.complete_statement(text):
+                yield text
+                pending = []
+            else:
+                pending = [text]
+            start = idx + 1
+    tail = "".join(pending)
+    if tail.strip():
+        yield tail
+
+
+def _insert_layout(conn: sqlite3.Connection | None, table: str) -> list[str]:
+    # The columns a column-less INSERT (export-sql --compact) fills, in order:
+    # the target schema's when it is already there, else the books.db layout.
+    if conn is not None and _table_exists(conn, table):
+        return [row[1].lower() for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    return list(_build_db_layout(table))
+
+
+def _patch_tables(sql_path: Path, conn: sqlite3.Connection | None = None) -> dict[str, list[str]]:
+    tables: dict[str, list[str]] = {}
+    with _open_sql_text(sql_path) as stream:
+        for stmt in _iter_sql_statements(stream):
+            if stmt.verb in ("INSERT", "REPLACE"):
+                table, _ = _sql_table_after(stmt.head, "INTO")
+                stmt_cols = stmt.columns
+                if table and stmt.implicit_columns:
+                    stmt_cols = _insert_layout(conn, table)
+                    if not stmt_cols:
+                        raise ValueError(f"{sql_path.name}: INSERT INTO {table} has no column list")
+                cols = tables.setdefault(table, [])
+                cols.extend(c for c in stmt_cols if c not in cols)
+            elif stmt.verb in ("DELETE", "UPDATE"):
+                table, _ = _sql_table_after(stmt.head, "FROM" if stmt.verb == "DELETE" else "UPDATE")
+                tables.setdefault(table, [])
+    tables.pop("", None)
+    return tables
+
+
+def _create_scratch_table(conn: sqlite3.Connection, table: str, cols: list[str]) -> None:
+    # keeps the patch's column order so column-less INSERTs land in the right columns
+    defs = [f"{c} INTEGER" if c in SQL_ROW_KEYS else f'"{c}"' for c in cols]
+    defs += [f"{c} INTEGER" for c in SQL_ROW_KEYS if c not in cols]
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(defs)})')
+
+
+def _apply_patch_to_scratch(conn: sqlite3.Connection, sql_path: Path) -> dict[str, list[str]]:
+    # Replays the patch into an empty schema: the resulting rows are exactly
+    # what the patch produces, whatever its DELETE/INSERT style.
+    tables = _patch_tables(sql_path, conn)
+    for table, cols in tables.items():
+        _create_scratch_table(conn, table, cols)
+    with _open_sql_text(sql_path) as stream:
+        for n, text in enumerate(_iter_sql_text_statements(stream), 1):
+            try:
+                conn.execute(text)
+            except sqlite3.Error as exc:
+                raise ValueError(f"{sql_path.name}: statement {n}: {exc}") from exc
+    return tables
+
+
+def _load_db_book_to_scratch(conn: sqlite3.Connection, db_path: Path, book_id: int) -> list[str]:
+    src = _connect_ro(db_path)
+    try:
+        if not _table_exists(src, "content"):
+            raise ValueError("table 'content' not found in DB")
+        info = src.execute("PRAGMA table_info(content)").fetchall()
+        # an INTEGER PRIMARY KEY is a rowid alias; patches never carry it
+        src_cols = [r[1] for r in info if not (r[5] and str(r[2]).upper() == "INTEGER")]
+        cols = [c.lower() for c in src_cols]
+        _create_scratch_table(conn, "content", cols)
+        book_filter = _book_id_filter(src, book_id)
+        if book_filter is None:
+            return cols
+        where, params = book_filter
+        kid_idx = cols.index("kotob_id") if "kotob_id" in cols else -1
+        insert_sql = f"INSERT INTO content ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+        cursor = src.execute(f"SELECT {', '.join(src_cols)} FROM content WHERE {where}", params)
+        conn.executemany(
+            insert_sql,
+            (tuple(book_id if i == kid_idx else v for i, v in enumerate(row)) for row in cursor),
+        )
+        return cols
+    finally:
+        src.close()
+
+
+def _row_index(
+    conn: sqlite3.Connection, exprs: list[str], table: str = "content"
+) -> dict[tuple[Any, Any], list[tuple[int, bytes]]]:
+    index: dict[tuple[Any, Any], list[tuple[int, bytes]]] = {}
+    sql = f'SELECT rowid, kotob_id, chapters_id{"".join(", " + e for e in exprs)} FROM "{table}" ORDER BY rowid'
+    for row in conn.execute(sql):
+        digest = hashlib.blake2b(repr(row[3:]).encode("utf-8"), digest_size=16).digest()
+        index.setdefault((row[1], row[2]), []).append((row[0], digest))
+    return index
+
+
+def _sql_key_where(key: tuple[Any, Any]) -> str:
+    parts = []
+    for name, value in zip(SQL_ROW_KEYS, key):
+        parts.append(f"{name} IS NULL" if value is None else f"{name} = {_sql_quote(value)}")
+    return " AND ".join(parts)
+
+
+def _sort_key(key: tuple[Any, Any]) -> tuple[Any, ...]:
+    return tuple((v is None, str(type(v)), v if v is not None else 0) for v in key)
+
+
+def _diff_value_exprs(old_cols: list[str], new_cols: list[str]) -> tuple[list[str], list[str], list[str]]:
+    # Compare on the union of non-key columns; a column the new side lacks
+    # would be NULL after a full DELETE + INSERT, so it is compared as NULL.
+    value_cols = [c for c in new_cols if c not in SQL_ROW_KEYS]
+    value_cols += [c for c in old_cols if c not in SQL_ROW_KEYS and c not in value_cols]
+    old_exprs = [f'"{c}"' if c in old_cols else "NULL" for c in value_cols]
+    new_exprs = [f'"{c}"' if c in new_cols else "NULL" for c in value_cols]
+    return value_cols, old_exprs, new_exprs
+
+
+def _diff_row_indexes(
+    old_index: dict[tuple[Any, Any], list[tuple[int, bytes]]],
+    new_index: dict[tuple[Any, Any], list[tuple[int, bytes]]],
+) -> tuple[list[tuple[Any, Any]], list[tuple[tuple[Any, Any], int, int]], list[int], int]:
+    """Return (delete keys, (key, old rowid, new rowid) updates, new rowids to insert, unchanged rows)."""
+    deletes: list[tuple[Any, Any]] = []
+    updates: list[tuple[tuple[Any, Any], int, int]] = []
+    inserts: list[int] = []
+    unchanged = 0
+    for key in sorted(old_index.keys() | new_index.keys(), key=_sort_key):
+        old_rows = old_index.get(key, [])
+        new_rows = new_index.get(key, [])
+        if not new_rows:
+            deletes.append(key)
+        elif not old_rows:
+            inserts.extend(rowid for rowid, _ in new_rows)
+        elif len(old_rows) == 1 and len(new_rows) == 1:
+            if old_rows[0][1] == new_rows[0][1]:
+                unchanged += 1
+            else:
+                updates.append((key, old_rows[0][0], new_rows[0][0]))
+        elif sorted(d for _, d in old_rows) == sorted(d for _, d in new_rows):
+            unchanged += len(new_rows)
+        else:
+            # duplicate keys cannot be addressed row by row
+            deletes.append(key)
+            inserts.extend(rowid for rowid, _ in new_rows)
+    return deletes, updates, inserts, unchanged
+
+
+def run_diff_sql(old_sql: Path | None, db_path: Path | None, book_id: int | None, new_sql: Path, out_path: Path) -> int:
+    for path in (old_sql, db_path, new_sql):
+        if path is not None and not path.exists():
+            _eprint(f"Error: file not found: {path}")
+            return 2
+
+    old_conn = sqlite3.connect(":memory:", isolation_level=None)
+    new_conn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        try:
+            if old_sql is not None:
+                old_cols = _apply_patch_to_scratch(old_conn, old_sql).get("content", [])
+            else:
+                assert db_path is not None and book_id is not None
+                old_cols = _load_db_book_to_scratch(old_conn, db_path, book_id)
+            new_cols = _apply_patch_to_scratch(new_conn, new_sql).get("content", [])
+        except (ValueError, sqlite3.Error) as exc:
+            _eprint(f"Error: {exc}")
+            return 2
+        _create_scratch_table(old_conn, "content", old_cols)
+        _create_scratch_table(new_conn, "content", new_cols)
+
+        value_cols, old_exprs, new_exprs = _diff_value_exprs(old_cols, new_cols)
+        old_index = _row_index(old_conn, old_exprs)
+        new_index = _row_index(new_conn, new_exprs)
+
+        insert_cols = new_cols or list(SQL_ROW_KEYS) + value_cols
+        insert_prefix = f"INSERT INTO content ({', '.join(insert_cols)}) VALUES "
+        insert_select = f"SELECT {', '.join(chr(34) + c + chr(34) for c in insert_cols)} FROM content WHERE rowid = ?"
+        old_select = f"SELECT {', '.join(old_exprs) or 'NULL'} FROM content WHERE rowid = ?"
+        new_select = f"SELECT {', '.join(new_exprs) or 'NULL'} FROM content WHERE rowid = ?"
+
+        deletes, updates, inserts, unchanged = _diff_row_indexes(old_index, new_index)
+
+        with atomic_io.atomic_path(out_path) as tmp_path:
+            with tmp_path.open("w", encoding="utf-8") as out:
+                out.write("BEGIN TRANSACTION;\n")
+                for key in deletes:
+                    out.write(f"DELETE FROM content WHERE {_sql_key_where(key)};\n")
+                for key, old_rowid, new_rowid in updates:
+                    old_vals = old_conn.execute(old_select, (old_rowid,)).fetchone()
+                    new_vals = new_conn.execute(new_select, (new_rowid,)).fetchone()
+                    sets = [
+                        f"{col} = {_sql_quote(nv)}"
+                        for col, ov, nv in zip(value_cols, old_vals, new_vals)
+                        if ov != nv or type(ov) is not type(nv)
+                    ]
+                    out.write(f"UPDATE content SET {', '.join(sets)} WHERE {_sql_key_where(key)};\n")
+                for rowid in inserts:
+                    vals = new_conn.execute(insert_select, (rowid,)).fetchone()
+                    out.write(f"{insert_prefix}({', '.join(_sql_quote(v) for v in vals)});\n")
+                out.write("COMMIT;\n")
+    finally:
+        old_conn.close()
+        new_conn.close()
+
+    old_label = str(old_sql) if old_sql is not None else f"{db_path} (book_id={book_id})"
+    new_size = new_sql.stat().st_size
+    out_size = out_path.stat().st_size
+    print("== SQL Diff ==")
+    print(f"Old: {old_label}")
+    print(f"New: {new_sql}")
+    print(f"- unchanged rows: {unchanged}")
+    print(f"- UPDATE: {len(updates)}")
+    print(f"- INSERT: {len(inserts)}")
+    print(f"- DELETE (by kotob_id+chapters_id): {len(deletes)}")
+    print(f"Patch: {out_path} ({out_size} bytes vs {new_size} bytes for the full new patch)")
+    return 0
+
+
+def _write_json_atomic(path: Path, data: Any) -> None:
+    # Same layout as the control panel writes, so imports do not reformat the whole file.
+    atomic_io.atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+
+
+def run_import_audio(
+    repo_root: Path,
+    src_path: Path,
+    src_format: str,
+    dry_run: bool,
+    strict: bool,
+    as_json: bool = False,
+) -> int:
+    audio_path = repo_root / AUDIO_JSON
+    if not src_path.exists():
+        _eprint(f"Error: input file not found: {src_path}")
+        return 2
+    try:
+        text = src_path.read_text(encoding="utf-8")
+        incoming = read_audio_csv(text) if src_format == "csv" else json.loads(text)
+        rows = _read_json(audio_path)
+        book_ids, chapter_ids = audio_ref_ids(_read_json(repo_root / BOOKS_JSON), _read_json(repo_root / STRUCTURE_JSON))
+    except (OSError, UnicodeDecodeError, ValueError, csv.Error) as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    if not isinstance(incoming, list):
+        _eprint(f"Error: {src_path} must contain a JSON array of rows")
+        return 2
+    if not isinstance(rows, list):
+        _eprint(f"Error: {AUDIO_JSON} must be a JSON array")
+        return 2
+    if not incoming:
+        _eprint(f"Error: no rows in {src_path}")
+        return 3
+
+    report = merge_audio_rows(rows, incoming, book_ids, chapter_ids)
+    changed = report["inserted"] + report["updated"]
+    write = changed > 0 and not dry_run and not (strict and report["rejected"])
+    if write:
+        _write_json_atomic(audio_path, rows)
+    report["written"] = write
+
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print("== Import Audio ==")
+        print(f"Input: {src_path} ({len(incoming)} rows)")
+        print(f"- inserted: {report['inserted']}")
+        print(f"- updated: {report['updated']}")
+        print(f"- unchanged: {report['unchanged']}")
+        print(f"- rejected: {len(report['rejected'])}")
+        for item in report["rejected"][:20]:
+            print(f"  row {item['row']}: {item['reason']}")
+        if len(report["rejected"]) > 20:
+            print(f"  ... {len(report['rejected']) - 20} more")
+        if write:
+            print(f"Wrote {audio_path} ({len(rows)} rows)")
+        elif dry_run:
+            print("Dry run: nothing written")
+        elif strict and report["rejected"]:
+            print("Strict mode: rejected rows present, nothing written")
+    return 2 if strict and report["rejected"] else 0
+
+
+# Arabic code points folded to their Persian forms, Arabic/Persian digits to ASCII.
+# Harakat, Quranic annotation marks, tatweel and the zero-width joiners/marks are
+# dropped, so "كتاب‌ها" and "کتابها" match each other.
+_SEARCH_FOLD = str.maketrans(
+    {
+        "\u064a": "\u06cc",  # ي -> ی
+        "\u0649": "\u06cc",  # ى -> ی
+        "\u0643": "\u06a9",  # ك -> ک
+        "\u0623": "\u0627",  # أ -> ا
+        "\u0625": "\u0627",  # إ -> ا
+        "\u0671": "\u0627",  # ٱ -> ا
+        "\u0629": "\u0647",  # ة -> ه
+        **{chr(0x0660 + d): str(d) for d in range(10)},
+        **{chr(0x06F0 + d): str(d) for d in range(10)},
+        **{chr(cp): None for cp in range(0x064B, 0x0660)},
+        **{chr(cp): None for cp in range(0x06D6, 0x06EE) if cp not in (0x06E5, 0x06E6)},
+        "\u0670": None,  # superscript alef
+        "\u0640": None,  # tatweel
+        "\u200c": None,  # ZWNJ
+        "\u200d": None,  # ZWJ
+        "\u200e": None,  # LRM
+        "\u200f": None,  # RLM
+    }
+)
+
+
+_SEARCH_DROPPED = "".join(chr(cp) for cp, out in _SEARCH_FOLD.items() if out is None)
+_SEARCH_VARIANTS: dict[str, str] = {}
+for _cp, _out in _SEARCH_FOLD.items():
+    if _out is not None:
+        _SEARCH_VARIANTS[_out] = _SEARCH_VARIANTS.get(_out, _out) + chr(_cp)
+
+
+def normalize_search(text: str) -> str:
+    return " ".join(text.translate(_SEARCH_FOLD).lower().split())
+
+
+# content column -> FTS5 table; text_nohareke is text without harakat, which the fold already drops.
+SEARCH_COLUMNS = ("text", "text_fa", "text_turkmen", "text_en", "text_tr", "text_ru")
+SEARCH_INDEX_FILE = "search.db"
+SEARCH_INDEX_VERSION = 1
+# Stored in the index: FTS rows are deleted by re-normalizing the stored text,
+# so a different fold or tokenizer means the index has to be rebuilt.
+SEARCH_INDEX_STAMP = hashlib.sha256(
+    repr((SEARCH_INDEX_VERSION, sorted(_SEARCH_FOLD.items()))).encode("utf-8")
+).hexdigest()[:16]
+_SEARCH_TERM_RE = re.compile(r"[^\W_]+\*?")
+
+
+def _search_table(column: str) -> str:
+    return f"fts_{column}"
+
+
+def _create_search_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, fingerprint TEXT);
+        CREATE TABLE IF NOT EXISTS units (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            kotob_id INTEGER NOT NULL,
+            signature TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            UNIQUE (source, kotob_id)
+        );
+        CREATE TABLE IF NOT EXISTS docs (
+            id INTEGER PRIMARY KEY,
+            unit_id INTEGER NOT NULL,
+            kotob_id INTEGER NOT NULL,
+            chapters_id INTEGER,
+            content_id INTEGER,
+            lang TEXT NOT NULL,
+            text TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_docs_unit ON docs (unit_id);
+        CREATE INDEX IF NOT EXISTS idx_docs_kotob ON docs (kotob_id);
+        """
+    )
+    for column in SEARCH_COLUMNS:
+        # contentless: the index keeps only postings, docs keeps the original text once
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {_search_table(column)} "
+            "USING fts5(body, content='', tokenize='unicode61 remove_diacritics 2')"
+        )
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('stamp', ?)",
+        (SEARCH_INDEX_STAMP,),
+    )
+
+
+def _search_index_stamp(out_path: Path) -> str:
+    """Stamp of an existing index; refuses files that are not a search index, since rebuilds delete them."""
+    conn = sqlite3.connect(out_path.as_uri() + "?mode=ro", uri=True)
+    try:
+        row = None
+        if _table_exists(conn, "meta"):
+            row = conn.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+    except sqlite3.DatabaseError:
+        row = None
+    finally:
+        conn.close()
+    if row is None:
+        raise ValueError(f"{out_path} exists and is not a search index; choose another --out")
+    return str(row[0])
+
+
+def _open_search_index(out_path: Path, full: bool) -> tuple[sqlite3.Connection, bool]:
+    """(connection, rebuilt): rebuilt is True when the index starts empty."""
+    stamp = _search_index_stamp(out_path) if out_path.exists() else None
+    rebuilt = full or stamp != SEARCH_INDEX_STAMP
+    if rebuilt:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            out_path.with_name(out_path.name + suffix).unlink(missing_ok=True)
+    conn = sqlite3.connect(str(out_path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if rebuilt:
+        _create_search_schema(conn)
+        conn.commit()
+    return conn, rebuilt
+
+
+def _drop_search_unit(conn: sqlite3.Connection, unit_id: int) -> None:
+    for column in SEARCH_COLUMNS:
+        table = _search_table(column)
+        cursor = conn.execute("SELECT id, text FROM docs WHERE unit_id = ? AND lang = ?", (unit_id, column))
+        conn.executemany(
+            f"INSERT INTO {table} ({table}, rowid, body) VALUES ('delete', ?, ?)",
+            ((doc_id, normalize_search(text)) for doc_id, text in cursor.fetchall()),
+        )
+    conn.execute("DELETE FROM docs WHERE unit_id = ?", (unit_id,))
+    conn.execute("DELETE FROM units WHERE id = ?", (unit_id,))
+
+
+def _index_search_unit(
+    conn: sqlite3.Connection, source: str, book_id: int, columns: list[str], rows: list[tuple[Any, ...]]
+) -> str:
+    """Index one book from one source; rows are (content_id, chapters_id, *columns).
+
+    Returns "unchanged", "indexed" or "updated". A book whose rows hash the same
+    as last time is left alone.
+    """
+    digest = hashlib.sha256(repr(columns).encode("utf-8"))
+    for row in rows:
+        digest.update(repr(row).encode("utf-8"))
+    signature = digest.hexdigest()
+    old = conn.execute(
+        "SELECT id, signature FROM units WHERE source = ? AND kotob_id = ?", (source, book_id)
+    ).fetchone()
+    if old and old[1] == signature:
+        return "unchanged"
+    with conn:
+        if old:
+            _drop_search_unit(conn, old[0])
+        unit_id = conn.execute(
+            "INSERT INTO units (source, kotob_id, signature, rows) VALUES (?, ?, ?, ?)",
+            (source, book_id, signature, len(rows)),
+        ).lastrowid
+        for pos, column in enumerate(columns, 2):
+            table = _search_table(column)
+            for row in rows:
+                text = row[pos]
+                if not isinstance(text, str) or not text.strip():
+                    continue
+                doc_id = conn.execute(
+                    "INSERT INTO docs (unit_id, kotob_id, chapters_id, content_id, lang, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (unit_id, book_id, _as_int(row[1]), _as_int(row[0]), column, text),
+                ).lastrowid
+                conn.execute(f"INSERT INTO {table} (rowid, body) VALUES (?, ?)", (doc_id, normalize_search(text)))
+    return "updated" if old else "indexed"
+
+
+def _search_units_from_db(db_path: Path) -> Iterator[tuple[int, list[str], list[tuple[Any, ...]]]]:
+    """(book_id, columns, rows) per book of books.db, one book in memory at a time."""
+    conn = _connect_ro(db_path)
+    try:
+        if not _table_exists(conn, "content"):
+            raise ValueError("table 'content' not found in DB")
+        present = _content_columns(conn)
+        columns = [c for c in SEARCH_COLUMNS if c in present]
+        has_rowid = _has_rowid(conn, "content")
+        id_col = "id" if "id" in present else ("rowid" if has_rowid else "NULL")
+        # One ordered scan instead of a lookup per book: CAST groups '3' with 3,
+        # and rows _normalize_book_id rejects are dropped before grouping.
+        order = "CAST(kotob_id AS INTEGER), COALESCE(CAST(chapters_id AS INTEGER), 0), CAST(chapters_id AS TEXT)"
+        if has_rowid:
+            order += ", rowid"
+        cursor = conn.execute(
+            f"SELECT kotob_id, {', '.join([id_col, 'chapters_id', *columns])} FROM content ORDER BY {order}"
+        )
+        keyed = ((_normalize_book_id(row[0]), tuple(row)[1:]) for row in cursor)
+        for book_id, group in itertools.groupby((item for item in keyed if item[0] is not None), key=lambda x: x[0]):
+            yield book_id, columns, [row for _, row in group]
+    finally:
+        conn.close()
+
+
+def _search_units_from_patch(sql_path: Path) -> Iterator[tuple[int, list[str], list[tuple[Any, ...]]]]:
+    """(book_id, columns, rows) for every book the patch leaves in content, replayed in memory."""
+    scratch = sqlite3.connect(":memory:")
+    try:
+        tables = _apply_patch_to_scratch(scratch, sql_path)
+        if "content" not in tables:
+            return
+        columns = [c for c in SEARCH_COLUMNS if c in tables["content"]]
+        grouped: dict[int, list[tuple[Any, ...]]] = {}
+        cols_sql = ", ".join(["NULL", "chapters_id", *columns])
+        order = "COALESCE(CAST(chapters_id AS INTEGER), 0), CAST(chapters_id AS TEXT), rowid"
+        for kotob_id, *row in scratch.execute(f"SELECT kotob_id, {cols_sql} FROM content ORDER BY {order}"):
+            book_id = _normalize_book_id(kotob_id)
+            if book_id is not None:
+                grouped.setdefault(book_id, []).append(tuple(row))
+        for book_id in sorted(grouped):
+            yield book_id, columns, grouped[book_id]
+    finally:
+        scratch.close()
+
+
+def build_search_index(
+    out_path: Path,
+    db_path: Path | None = None,
+    sql_paths: list[Path] | None = None,
+    full: bool = False,
+    log: Callable[[str], None] | None = None,
+) -> dict[str, Any]:
+    """Bring the index at out_path in line with books.db or a set of SQL patches.
+
+    An input whose fingerprint matches the last run is skipped without being
+    read (patches are not replayed); otherwise each of its books is hashed and
+    only books whose rows changed are re-indexed. Books and inputs that are no
+    longer present are dropped, so the index always mirrors the given input.
+    """
+    say = log or (lambda line: None)
+    conn, rebuilt = _open_search_index(out_path, full)
+    counts = Counter()
+    try:
+        seen_sources: set[str] = set()
+        if db_path is not None:
+            inputs: list[tuple[str, Path, Callable[[Path], Iterator[Any]]]] = [
+                (str(db_path), db_path, _search_units_from_db)
+            ]
+        else:
+            inputs = [(p.name, p, _search_units_from_patch) for p in sql_paths or []]
+        for source, path, units_of in inputs:
+            seen_sources.add(source)
+            row = conn.execute("SELECT fingerprint FROM sources WHERE source = ?", (source,)).fetchone()
+            previous = json.loads(row[0]) if row else None
+            fingerprint = _db_fingerprint(path) if db_path is not None else _file_fingerprint(path, previous)
+            if previous == fingerprint:
+                counts["sources_skipped"] += 1
+                counts["books_unchanged"] += conn.execute(
+                    "SELECT COUNT(*) FROM units WHERE source = ?", (source,)
+                ).fetchone()[0]
+                continue
+            t0 = time.perf_counter()
+            seen_books: set[int] = set()
+            for book_id, columns, rows in units_of(path):
+                seen_books.add(book_id)
+                state = _index_search_unit(conn, source, book_id, columns, rows)
+                counts[f"books_{state}"] += 1
+                if state != "unchanged":
+                    say(f"{source}: book {book_id} {state} ({len(rows)} rows)")
+            with conn:
+                for unit_id, book_id in conn.execute(
+                    "SELECT id, kotob_id FROM units WHERE source = ?", (source,)
+                ).fetchall():
+                    if book_id not in seen_books:
+                        _drop_search_unit(conn, unit_id)
+                        counts["books_removed"] += 1
+                        say(f"{source}: book {book_id} removed")
+                conn.execute(
+                    "INSERT OR REPLACE INTO sources (source, fingerprint) VALUES (?, ?)",
+                    (source, json.dumps(fingerprint, sort_keys=True)),
+                )
+            counts["sources_read"] += 1
+            say(f"{source}: done in {time.perf_counter() - t0:.2f}s")
+        with conn:
+            for (source,) in conn.execute("SELECT source FROM sources").fetchall():
+                if source in seen_sources:
+                    continue
+                for (unit_id,) in conn.execute("SELECT id FROM units WHERE source = ?", (source,)).fetchall():
+                    _drop_search_unit(conn, unit_id)
+                    counts["books_removed"] += 1
+                conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+                say(f"{source}: gone, dropped from the index")
+        if rebuilt:
+            # merge the segments of a fresh index into one; later runs rely on FTS5 automerge
+            for column in SEARCH_COLUMNS:
+                table = _search_table(column)
+                conn.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+            conn.commit()
+        docs = dict(conn.execute("SELECT lang, COUNT(*) FROM docs GROUP BY lang").fetchall())
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    report: dict[str, Any] = {"index": str(out_path), "rebuilt": rebuilt}
+    for key in ("sources_read", "sources_skipped"):
+        report[key] = counts[key]
+    for key in ("books_indexed", "books_updated", "books_unchanged", "books_removed"):
+        report[key] = counts[key]
+    report["docs"] = {column: docs.get(column, 0) for column in SEARCH_COLUMNS}
+    report["size"] = out_path.stat().st_size
+    return report
+
+
+def search_terms(query: str) -> list[str]:
+    """Normalized query terms; a trailing * marks a prefix term."""
+    return _SEARCH_TERM_RE.findall(normalize_search(query))
+
+
+def _fts_match(terms: list[str]) -> str:
+    return " ".join(f'"{t[:-1]}"*' if t.endswith("*") else f'"{t}"' for t in terms)
+
+
+def search_index(
+    conn: sqlite3.Connection,
+    query: str,
+    columns: Iterable[str] = SEARCH_COLUMNS,
+    book_id: int | None = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> tuple[int, list[dict[str, Any]]]:
+    """(total, hits) for query across the given language columns, best bm25 rank first.
+
+    Ranks from different language tables are merged as is; each table is asked
+    only for its first offset + limit hits.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return 0, []
+    args: list[Any] = [_fts_match(terms)]
+    book_filter = ""
+    if book_id is not None:
+        book_filter = " AND docs.kotob_id = ?"
+        args.append(book_id)
+    total = 0
+    ranked: list[tuple[float, int]] = []
+    for column in columns:
+        table = _search_table(column)
+        base = f"FROM {table} JOIN docs ON docs.id = {table}.rowid WHERE {table} MATCH ?{book_filter}"
+        total += conn.execute(f"SELECT COUNT(*) {base}", args).fetchone()[0]
+        ranked.extend(
+            conn.execute(f"SELECT {table}.rank, docs.id {base} ORDER BY {table}.rank LIMIT ?", [*args, offset + limit])
+        )
+    ranked.sort()
+    ids = [doc_id for _, doc_id in ranked[offset : offset + limit]]
+    if not ids:
+        return total, []
+    placeholders = ", ".join("?" for _ in ids)
+    docs = {
+        row[0]: row
+        for row in conn.execute(
+            "SELECT d.id, d.kotob_id, d.chapters_id, d.content_id, d.lang, d.text, u.source "
+            f"FROM docs AS d JOIN units AS u ON u.id = d.unit_id WHERE d.id IN ({placeholders})",
+            ids,
+        )
+    }
+    hits = []
+    for doc_id in ids:
+        _, kotob_id, chapters_id, content_id, lang, text, source = docs[doc_id]
+        hits.append(
+            {
+                "kotob_id": kotob_id,
+                "chapters_id": chapters_id,
+                "content_id": content_id,
+                "lang": lang,
+                "source": source,
+                "snippet": search_snippet(text, terms),
+            }
+        )
+    return total, hits
+
+
+def _snippet_pattern(term: str) -> re.Pattern[str]:
+    # Matches the raw text the term was folded from: each character may be any
+    # of its unfolded variants, with dropped marks (harakat, ZWNJ, ...) between them.
+    skip = f"[{re.escape(_SEARCH_DROPPED)}]*"
+    return re.compile(
+        skip.join(f"[{re.escape(_SEARCH_VARIANTS.get(ch, ch))}]" for ch in term.rstrip("*")),
+        re.IGNORECASE,
+    )
+
+
+def search_snippet(text: str, terms: list[str], width: int = 160) -> tuple[str, str, str]:
+    """(before, match, after) around the first term found in text, matched with the same fold as the index."""
+    best = None
+    for term in terms:
+        found = _snippet_pattern(term).search(text)
+        if found and (best is None or found.start() < best.start()):
+            best = found
+    if best is None:
+        return "", "", " ".join(text[:width].split())
+    start, end = best.span()
+    left = max(0, start - width // 2)
+    right = min(len(text), end + width // 2)
+    before = ("…" if left else "") + text[left:start]
+    after = text[end:right] + ("…" if right < len(text) else "")
+    return " ".join(before.split()), text[start:end], " ".join(after.split())
+
+
+def run_build_search_index(
+    out_path: Path,
+    db_path: Path | None,
+    sql_dir: Path | None,
+    full: bool,
+    as_json: bool = False,
+) -> int:
+    if db_path is not None and not db_path.exists():
+        _eprint(f"Error: DB not found: {db_path}")
+        return 2
+    sql_paths: list[Path] | None = None
+    if sql_dir is not None:
+        if not sql_dir.is_dir():
+            _eprint(f"Error: directory not found: {sql_dir}")
+            return 2
+        sql_paths = sql_patch_files(sql_dir)
+        if not sql_paths:
+            _eprint(f"Error: no .sql/.sql.gz/.sql.zst files in {sql_dir}")
+            return 3
+    t0 = time.perf_counter()
+    try:
+        report = build_search_index(
+            out_path, db_path=db_path, sql_paths=sql_paths, full=full, log=None if as_json else print
+        )
+    except (OSError, ValueError, RuntimeError, sqlite3.Error) as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    report["seconds"] = round(time.perf_counter() - t0, 3)
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print("== Search Index ==")
+    print(f"Index: {out_path}{' (rebuilt)' if report['rebuilt'] else ''}")
+    print(f"- inputs read: {report['sources_read']}, unchanged and skipped: {report['sources_skipped']}")
+    print(
+        f"- books indexed: {report['books_indexed']}, updated: {report['books_updated']}, "
+        f"unchanged: {report['books_unchanged']}, removed: {report['books_removed']}"
+    )
+    print("- rows per language: " + ", ".join(f"{c}={n}" for c, n in report["docs"].items()))
+    print(f"- size: {report['size']} bytes, {report['seconds']:.2f}s")
+    return 0
+
+
+# Load-time settings; the previous values are put back when apply-sql finishes.
+SQL_APPLY_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-262144"),
+    ("temp_store", "MEMORY"),
+)
+SQL_APPLY_INDEX_MODES = ("auto", "drop", "keep")
+_SQL_VERB_RE = re.compile(r"(?:\s+|--[^\n]*\n|/\*.*?\*/)*(\w+)", re.DOTALL)
+_SQL_TXN_VERBS = ("BEGIN", "COMMIT", "END")
+
+
+def _precheck_sql_patch(sql_path: Path) -> dict[str, Any]:
+    """_scan_sql_patch that reports read errors instead of raising; runs in a worker process."""
+    try:
+        report = _scan_sql_patch(sql_path)
+    except (OSError, ValueError, RuntimeError) as exc:
+        return {"file": str(sql_path), "error": " ".join(str(exc).split()), "warnings": []}
+    report["error"] = None
+    return report
+
+
+def _precheck_sql_patches(paths: list[Path], jobs: int) -> list[dict[str, Any]]:
+    if jobs <= 1 or len(paths) <= 1:
+        return [_precheck_sql_patch(p) for p in paths]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        return list(pool.map(_precheck_sql_patch, paths))
+
+
+def _apply_problems(
+    report: dict[str, Any], live_columns: dict[str, list[str]], allow_uncovered: bool = False
+) -> list[str]:
+    """Reasons not to apply a patch: it would fail half-way or leave duplicate rows.
+
+    allow_uncovered skips the DELETE coverage check, for targets that start empty.
+    """
+    if report["error"]:
+        return [report["error"]]
+    problems: list[str] = []
+    if report["rollback"]:
+        problems.append(f"contains {report['rollback']} ROLLBACK statement(s)")
+    for table, cols in report["columns"].items():
+        if table not in live_columns:
+            problems.append(f"table {table} does not exist in the DB")
+            continue
+        unknown = [c for c in cols if c.lower() not in live_columns[table]]
+        if unknown:
+            problems.append(f"{table} has no column(s) {', '.join(unknown)}")
+    for table, cov in report["coverage"].items():
+        if cov["uncovered"] and not allow_uncovered:
+            problems.append(
+                f"{cov['uncovered']} of {cov['rows']} INSERT rows into {table} are not covered by a DELETE "
+                "(would duplicate rows)"
+            )
+    return problems
+
+
+def _secondary_indexes(conn: sqlite3.Connection, tables: Iterable[str]) -> list[tuple[str, str]]:
+    """(name, CREATE INDEX sql) of the non-unique indexes created on tables; unique ones stay, they are constraints."""
+    found: list[tuple[str, str]] = []
+    for table in tables:
+        for _, name, unique, origin, *_ in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            if unique or origin != "c":
+                continue
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+            if row and row[0]:
+                found.append((name, row[0]))
+    return found
+
+
+def _apply_sql_patch(
+    conn: sqlite3.Connection, sql_path: Path, on_skip: Callable[[int, str], None] | None = None
+) -> tuple[int, int]:
+    """Run one patch inside the caller's transaction; returns (statements, rows inserted).
+
+    The patch's own BEGIN/COMMIT/END are skipped (on_skip gets their statement
+    number and verb); a ROLLBACK raises, a patch that undoes itself is never committed.
+    """
+    statements = 0
+    inserted = 0
+    with _open_sql_text(sql_path) as stream:
+        for n, text in enumerate(_iter_sql_text_statements(stream), 1):
+            m = _SQL_VERB_RE.match(text)
+            verb = m.group(1).upper() if m else ""
+            if verb == "ROLLBACK":
+                raise ValueError(f"{sql_path.name}: statement {n}: ROLLBACK; refusing to commit this patch")
+            if verb in _SQL_TXN_VERBS:
+                # the caller owns the transaction, one per patch
+                if on_skip is not None:
+                    on_skip(n, verb)
+                continue
+            statements += 1
+            before = conn.total_changes
+            try:
+                conn.execute(text)
+            except sqlite3.Error as exc:
+                raise ValueError(f"{sql_path.name}: statement {n}: {exc}") from exc
+            if verb in ("INSERT", "REPLACE"):
+                # DELETEs are not counted, so rows/s is load throughput
+                inserted += conn.total_changes - before
+    return statements, inserted
+
+
+def _rate(rows: int, seconds: float) -> float:
+    return rows / seconds if seconds > 0 else 0.0
+
+
+def run_apply_sql(
+    db_path: Path,
+    sql_paths: list[Path],
+    jobs: int,
+    indexes: str = "auto",
+    force: bool = False,
+    dry_run: bool = False,
+    as_json: bool = False,
+) -> int:
+    if not db_path.exists():
+        _eprint(f"Error: DB not found: {db_path}")
+        return 2
+    missing = [p for p in sql_paths if not p.is_file()]
+    if missing:
+        _eprint(f"Error: SQL file not found: {missing[0]}")
+        return 2
+    if not sql_paths:
+        _eprint("Error: no SQL patches given")
+        return 3
+    say = (lambda line: None) if as_json else print
+
+    t0 = time.perf_counter()
+    reports = _precheck_sql_patches(sql_paths, jobs)
+    # every statement text is unique, caching them only costs time
+    conn = sqlite3.connect(str(db_path), isolation_level=None, cached_statements=0)
+    try:
+        tables = sorted({t for r in reports if not r["error"] for t in r["columns"]})
+        live_columns = {
+            t: [row[1].lower() for row in conn.execute(f'PRAGMA table_info("{t}")')]
+            for t in tables
+            if _table_exists(conn, t)
+        }
+        checks = [
+            {
+                "file": r["file"],
+                "problems": _apply_problems(r, live_columns),
+                # uncovered rows are already a problem above
+                "warnings": [w for w in r["warnings"] if w["code"] != "uncovered_rows"],
+            }
+            for r in reports
+        ]
+        conflicts = _find_sql_conflicts([r for r in reports if not r["error"]])
+        check_seconds = time.perf_counter() - t0
+        blocked = any(c["problems"] for c in checks) or bool(conflicts)
+        result: dict[str, Any] = {
+            "db": str(db_path),
+            "check_seconds": round(check_seconds, 3),
+            "checks": checks,
+            "conflicts": conflicts,
+            "applied": [],
+            "failed": None,
+            "indexes": {"dropped": [], "rebuild_seconds": 0.0},
+        }
+
+        say("== Apply SQL ==")
+        say(f"DB: {db_path}")
+        say(f"Checked {len(sql_paths)} patch(es) in {check_seconds:.2f}s")
+        for check in checks:
+            name = Path(check["file"]).name
+            for problem in check["problems"]:
+                say(f"- {name}: {problem}")
+            for warning in check["warnings"]:
+                say(f"- {name}: warning: {warning['message']}")
+        for conflict in conflicts:
+            say(f"- conflict: {conflict}")
+        # a patch that rolls itself back was not meant to be committed; --force does not override that
+        rollbacks = [Path(r["file"]).name for r in reports if not r["error"] and r["rollback"]]
+        if rollbacks or (blocked and not force):
+            if as_json:
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+            elif rollbacks:
+                _eprint(f"Error: ROLLBACK in {', '.join(rollbacks)}, nothing applied (even with --force)")
+            else:
+                _eprint("Error: checks failed, nothing applied (use --force to apply anyway)")
+            return 2
+        if dry_run:
+            say("Dry run: nothing applied")
+            if as_json:
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+            return 0
+
+        insert_rows: Counter[str] = Counter()
+        for r in reports:
+            insert_rows.update(r.get("insert_rows", {}))
+        drop_tables = [
+            t
+            for t in live_columns
+            if indexes == "drop" or (indexes == "auto" and insert_rows[t] > _fetch_count(conn, t))
+        ]
+        dropped = _secondary_indexes(conn, drop_tables)
+
+        saved = [(name, conn.execute(f"PRAGMA {name}").fetchone()[0]) for name, _ in SQL_APPLY_PRAGMAS]
+        for name, value in SQL_APPLY_PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+        total_rows = 0
+        load_t0 = time.perf_counter()
+        try:
+            if dropped:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for name, _ in dropped:
+                        conn.execute(f'DROP INDEX "{name}"')
+                say(f"Dropped {len(dropped)} index(es) for the load: {', '.join(n for n, _ in dropped)}")
+            for n, sql_path in enumerate(sql_paths, 1):
+                p0 = time.perf_counter()
+                skipped: list[str] = []
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    statements, rows = _apply_sql_patch(
+                        conn, sql_path, on_skip=lambda i, verb: skipped.append(f"statement {i}: {verb}")
+                    )
+                    conn.execute("COMMIT")
+                except (OSError, ValueError, RuntimeError, sqlite3.Error) as exc:
+                    # a failed COMMIT may already have ended the transaction
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    result["failed"] = {"file": str(sql_path), "error": " ".join(str(exc).split())}
+                    _eprint(f"Error: {exc} (rolled back; {n - 1} earlier patch(es) stay applied)")
+                    break
+                seconds = time.perf_counter() - p0
+                total_rows += rows
+                result["applied"].append(
+                    {
+                        "file": str(sql_path),
+                        "statements": statements,
+                        "rows": rows,
+                        "seconds": round(seconds, 3),
+                        "skipped": skipped,
+                    }
+                )
+                say(
+                    f"[{n}/{len(sql_paths)}] {sql_path.name}: {statements} statements, {rows} rows "
+                    f"in {seconds:.2f}s ({_rate(rows, seconds):.0f} rows/s)"
+                )
+                for line in skipped:
+                    say(f"  skipped {line} (apply-sql runs each patch in its own transaction)")
+        finally:
+            if conn.in_transaction:
+                # something escaped mid-patch; the index rebuild needs its own transaction
+                conn.execute("ROLLBACK")
+            if dropped:
+                i0 = time.perf_counter()
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for _, ddl in dropped:
+                        conn.execute(ddl)
+                result["indexes"] = {
+                    "dropped": [n for n, _ in dropped],
+                    "rebuild_seconds": round(time.perf_counter() - i0, 3),
+                }
+                say(f"Rebuilt {len(dropped)} index(es) in {result['indexes']['rebuild_seconds']:.2f}s")
+            for name, value in reversed(saved):
+                conn.execute(f"PRAGMA {name}={value}")
+    finally:
+        conn.close()
+
+    load_seconds = time.perf_counter() - load_t0
+    result["rows"] = total_rows
+    result["load_seconds"] = round(load_seconds, 3)
+    result["rows_per_s"] = round(_rate(total_rows, load_seconds))
+    if as_json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(
+            f"Applied {len(result['applied'])}/{len(sql_paths)} patch(es): {total_rows} rows in {load_seconds:.2f}s "
+            f"({result['rows_per_s']} rows/s)"
+        )
+    return 2 if result["failed"] else 0
+
+
+def _check_sql_patch(sql_path: Path, db_path: Path | None) -> dict[str, Any]:
+    """Replay one patch into a scratch copy of the live schema and describe the result.
+
+    Runs in a worker process for doctor --sql-dir; only plain data is returned.
+    """
+    result: dict[str, Any] = {
+        "file": str(sql_path),
+        "error": None,
+        "rows": 0,
+        "rows_by_book": {},
+        "bookless_rows": 0,
+        "chapter_ids": [],
+        "live": None,
+    }
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        try:
+            tables = _patch_tables(sql_path)
+            if db_path is not None:
+                # Real DDL (types, NOT NULL, UNIQUE indexes) so a patch that only
+                # works against a loose scratch table is still reported as broken.
+                src = _connect_ro(db_path)
+                try:
+                    for table in tables:
+                        create, indexes = _table_ddl(src, "main", table)
+                        for ddl in ([create] if create else []) + indexes:
+                            conn.execute(ddl)
+                finally:
+                    src.close()
+            tables = _apply_patch_to_scratch(conn, sql_path)
+        except (ValueError, RuntimeError, sqlite3.Error) as exc:
+            result["error"] = " ".join(str(exc).split())
+            return result
+        if "content" not in tables:
+            return result
+
+        rows_by_book: Counter[int] = Counter()
+        for raw_kid, count in conn.execute("SELECT kotob_id, COUNT(*) FROM content GROUP BY kotob_id"):
+            kid = _normalize_book_id(raw_kid)
+            if kid is None:
+                result["bookless_rows"] += count
+            else:
+                rows_by_book[kid] += count
+            result["rows"] += count
+        result["rows_by_book"] = {str(k): v for k, v in sorted(rows_by_book.items())}
+        result["chapter_ids"] = sorted(
+            int(r[0])
+            for r in conn.execute(
+                "SELECT DISTINCT CAST(chapters_id AS INTEGER) FROM content WHERE chapters_id IS NOT NULL"
+            )
+        )
+        if db_path is None or not rows_by_book:
+            return result
+
+        new_cols = tables["content"]
+        _create_scratch_table(conn, "doctor_content", new_cols)
+        cols_sql = ", ".join(f'"{c}"' for c in new_cols)
+        conn.execute(
+            f"INSERT INTO doctor_content ({cols_sql}) SELECT {cols_sql} FROM content "
+            "WHERE kotob_id IS NOT NULL AND CAST(kotob_id AS INTEGER) NOT IN (0, -1)"
+        )
+        live_conn = sqlite3.connect(":memory:", isolation_level=None)
+        try:
+            old_cols: list[str] = []
+            for book_id in rows_by_book:
+                old_cols = _load_db_book_to_scratch(live_conn, db_path, book_id)
+            _, old_exprs, new_exprs = _diff_value_exprs(old_cols, new_cols)
+            deletes, updates, inserts, unchanged = _diff_row_indexes(
+                _row_index(live_conn, old_exprs),
+                _row_index(conn, new_exprs, "doctor_content"),
+            )
+        finally:
+            live_conn.close()
+        result["live"] = {
+            "unchanged": unchanged,
+            "update": len(updates),
+            "insert": len(inserts),
+            "delete": len(deletes),
+        }
+        return result
+    finally:
+        conn.close()
+
+
+def _check_sql_patches(paths: list[Path], db_path: Path | None, jobs: int) -> list[dict[str, Any]]:
+    if jobs <= 1 or len(paths) <= 1:
+        return [_check_sql_patch(p, db_path) for p in paths]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        return list(pool.map(_check_sql_patch, paths, [db_path] * len(paths)))
+
+
+# The books.db schema build-db produces. Bump BUILD_DB_VERSION whenever it (or
+# the way patches are replayed) changes so cached per-book DBs are rebuilt.
+BUILD_DB_VERSION = 2
+BUILD_DB_TABLES = {
+    "kotob": (
+        "CREATE TABLE kotob (id INTEGER PRIMARY KEY, title TEXT, description TEXT, current_version TEXT, "
+        "latest_version TEXT, sql_download_url TEXT, is_default INTEGER NOT NULL DEFAULT 0, "
+        "is_downloaded INTEGER NOT NULL DEFAULT 0, status TEXT)"
+    ),
+    "categories": "CREATE TABLE categories (id INTEGER PRIMARY KEY, title TEXT, sort_order INTEGER, icon TEXT)",
+    "chapters": (
+        "CREATE TABLE chapters (id INTEGER PRIMARY KEY, category_id INTEGER, parent_id INTEGER, title TEXT, icon TEXT)"
+    ),
+    "content": (
+        "CREATE TABLE content (id INTEGER PRIMARY KEY AUTOINCREMENT, chapters_id INTEGER, kotob_id INTEGER, "
+        "text TEXT, text_nohareke TEXT, text_fa TEXT, text_turkmen TEXT, text_en TEXT, text_tr TEXT, text_ru TEXT)"
+    ),
+    "content_audio": (
+        "CREATE TABLE content_audio (id INTEGER PRIMARY KEY AUTOINCREMENT, chapters_id INTEGER, kotob_id INTEGER, "
+        "lang TEXT, narrator TEXT, title TEXT, url TEXT)"
+    ),
+}
+# Whatever the hot queries need, so a fresh build passes doctor --explain.
+BUILD_DB_INDEXES = (
+    *dict.fromkeys(_hot_index_ddl(q["index"]) for q in HOT_QUERIES if q.get("index")),
+    "CREATE INDEX idx_chapters_category ON chapters (category_id, parent_id)",
+)
+# Filled from the JSON metadata only; patches may write the other tables.
+BUILD_DB_META_TABLES = ("kotob", "categories", "chapters")
+BUILD_DB_CACHE_DIR = "build-db"
+BUILD_DB_MANIFEST = "manifest.json"
+
+
+def _build_db_columns() -> dict[str, list[str]]:
+    conn = sqlite3.connect(":memory:")
+    try:
+        for ddl in BUILD_DB_TABLES.values():
+            conn.execute(ddl)
+        return {t: [row[1] for row in conn.execute(f"PRAGMA table_info({t})")] for t in BUILD_DB_TABLES}
+    finally:
+        conn.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _build_db_layout(table: str) -> tuple[str, ...]:
+    return tuple(_build_db_columns().get(table, []))
+
+
+def _build_db_metadata_rows(books_data: Any, structure_data: Any, audio_data: Any) -> dict[str, list[tuple[Any, ...]]]:
+    """Rows for kotob, categories, chapters and content_audio, in file order."""
+    books = _doctor_books(books_data)
+    structure = _doctor_structure(structure_data)
+    if books["duplicate_ids"]:
+        raise ValueError(f"{BOOKS_JSON}: duplicate ids {_format_id_ranges(books['duplicate_ids'])}")
+    for key, label in (("duplicate_category_ids", "category"), ("duplicate_chapter_ids", "chapter")):
+        if structure[key]:
+            raise ValueError(f"{STRUCTURE_JSON}: duplicate {label} ids {_format_id_ranges(structure[key])}")
+    if not isinstance(audio_data, list):
+        raise ValueError(f"{AUDIO_JSON} must be a JSON array")
+
+    def dicts(items: Any) -> list[dict[str, Any]]:
+        return [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+
+    rows: dict[str, list[tuple[Any, ...]]] = {"kotob": [], "categories": [], "chapters": [], "content_audio": []}
+    for item in dicts(books_data):
+        book_id = _as_int(item.get("id"))
+        if book_id is None:
+            continue
+        rows["kotob"].append(
+            (
+                book_id,
+                item.get("title"),
+                item.get("description"),
+                item.get("version"),
+                item.get("version"),
+                item.get("sql_download_url"),
+                _as_int(item.get("is_default")) or 0,
+                _as_int(item.get("is_downloaded_on_device")) or 0,
+                item.get("status"),
+            )
+        )
+    for item in dicts(structure_data.get("categories")):
+        if _as_int(item.get("id")) is not None:
+            rows["categories"].append(
+                (_as_int(item["id"]), item.get("title"), _as_int(item.get("sort_order")), item.get("icon"))
+            )
+    for item in dicts(structure_data.get("chapters")):
+        if _as_int(item.get("id")) is not None:
+            rows["chapters"].append(
+                (
+                    _as_int(item["id"]),
+                    _as_int(item.get("category_id")),
+                    _as_int(item.get("parent_id")),
+                    item.get("title"),
+                    item.get("icon"),
+                )
+            )
+    for item in dicts(audio_data):
+        rows["content_audio"].append(
+            (
+                _as_int(item.get("chapters_id")),
+                _normalize_book_id(item.get("kotob_id")),
+                item.get("lang"),
+                item.get("narrator"),
+                item.get("title"),
+                item.get("url"),
+            )
+        )
+    return rows
+
+
+def _build_db_problems(report: dict[str, Any], columns: dict[str, list[str]]) -> list[str]:
+    # Patches replay into empty tables, so a missing DELETE cannot duplicate rows here.
+    problems = _apply_problems(report, columns, allow_uncovered=True)
+    for table in report.get("columns", {}):
+        if table in BUILD_DB_META_TABLES:
+            problems.append(f"writes {table}, which build-db fills from the JSON metadata")
+    return problems
+
+
+def _build_db_groups(reports: list[dict[str, Any]]) -> list[list[int]]:
+    """Patch indexes that must be replayed together, in order; the groups are independent.
+
+    Two patches depend on each other when one deletes rows the other may
+    insert: the same book, a deleted chapter, or a table one of them wipes.
+    """
+    wiped = {t for r in reports for t in r["wiped_tables"]}
+    deleted_chapters = {c for r in reports for cols in r["deleted_ids"].values() for c in cols.get("chapters_id", [])}
+    parent = list(range(len(reports)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owners: dict[tuple[str, Any], int] = {}
+    for i, report in enumerate(reports):
+        resources: set[tuple[str, Any]] = {("book", k) for k in report["insert_book_ids"]}
+        for cols in report["deleted_ids"].values():
+            resources.update(("book", k) for k in cols.get("kotob_id", []))
+            resources.update(("chapter", c) for c in cols.get("chapters_id", []))
+        resources.update(("chapter", c) for c in report["insert_chapter_ids"] if c in deleted_chapters)
+        resources.update(("table", t) for t in report["columns"] if t in wiped)
+        for resource in resources:
+            a, b = find(i), find(owners.setdefault(resource, i))
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+    groups: dict[int, list[int]] = {}
+    for i in range(len(reports)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values())
+
+
+def _build_db_group(sql_paths: list[Path], out_path: Path) -> dict[str, int]:
+    """Replay patches, in order, into a fresh DB with the build schema; runs in a worker process."""
+    with atomic_io.atomic_path(out_path) as tmp_path:
+        conn = sqlite3.connect(str(tmp_path), isolation_level=None, cached_statements=0)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            for ddl in BUILD_DB_TABLES.values():
+                conn.execute(ddl)
+            conn.execute("BEGIN")
+            for sql_path in sql_paths:
+                _apply_sql_patch(conn, sql_path)
+            conn.execute("COMMIT")
+            counts = {t: _fetch_count(conn, t) for t in BUILD_DB_TABLES if t not in BUILD_DB_META_TABLES}
+        finally:
+            conn.close()
+    return counts
+
+
+def _load_build_db_manifest(path: Path) -> dict[str, Any]:
+    try:
+        data = _read_json(path)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != BUILD_DB_VERSION:
+        return {}
+    return data
+
+
+def _hash_key(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def run_build_db(
+    repo_root: Path,
+    out_path: Path,
+    page_size: int,
+    jobs: int,
+    use_cache: bool = True,
+    strict: bool = False,
+    as_json: bool = False,
+) -> int:
+    json_paths = {
+        "books": repo_root / BOOKS_JSON,
+        "structure": repo_root / STRUCTURE_JSON,
+        "audio": repo_root / AUDIO_JSON,
+    }
+    missing_files = [str(p) for p in json_paths.values() if not p.exists()]
+    if missing_files:
+        _eprint("Error: required metadata files are missing:")
+        for p in missing_files:
+            _eprint(f"- {p}")
+        return 2
+    say = (lambda line: None) if as_json else print
+    say("== Build DB ==")
+    t0 = time.perf_counter()
+
+    cache_dir = repo_root / DOCTOR_CACHE_DIR / BUILD_DB_CACHE_DIR
+    manifest_path = cache_dir / BUILD_DB_MANIFEST
+    manifest = _load_build_db_manifest(manifest_path) if use_cache else {}
+    old_files = manifest.get("files", {})
+    old_scans = manifest.get("scans", {})
+    files: dict[str, Any] = {}
+
+    def fingerprint(path: Path) -> dict[str, Any]:
+        rel = path.relative_to(repo_root).as_posix()
+        files[rel] = _file_fingerprint(path, old_files.get(rel))
+        return files[rel]
+
+    try:
+        json_keys = {name: fingerprint(path)["sha256"] for name, path in json_paths.items()}
+        books_data = _read_json(json_paths["books"])
+        meta_rows = _build_db_metadata_rows(
+            books_data, _read_json(json_paths["structure"]), _read_json(json_paths["audio"])
+        )
+    except (OSError, ValueError) as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+
+    # One patch per book, taken from the file name at the end of sql_download_url.
+    book_patches: list[tuple[int, Path]] = []
+    missing: list[dict[str, Any]] = []
+    for book_id, name in sorted(_doctor_books(books_data)["sql_files"].items(), key=lambda kv: int(kv[0])):
+        path = repo_root / "kotob" / name
+        if path.is_file():
+            book_patches.append((int(book_id), path))
+        else:
+            missing.append({"book_id": int(book_id), "file": f"kotob/{name}"})
+    for item in missing:
+        say(f"- book {item['book_id']}: {item['file']} not found, built without content")
+    if missing and strict:
+        _eprint(f"Error: {len(missing)} referenced patch(es) not found (--strict)")
+        return 2
+
+    patch_keys = [fingerprint(path)["sha256"] for _, path in book_patches]
+    to_scan = {key: path for (_, path), key in zip(book_patches, patch_keys) if key not in old_scans}
+    scans = {key: old_scans[key] for key in patch_keys if key in old_scans}
+    scans.update(zip(to_scan, _precheck_sql_patches(list(to_scan.values()), jobs)))
+    reports = [scans[key] for key in patch_keys]
+
+    columns = _build_db_columns()
+    checks = [
+        {"book_id": book_id, "file": path.name, "problems": _build_db_problems(report, columns)}
+        for (book_id, path), report in zip(book_patches, reports)
+    ]
+    failed = [c for c in checks if c["problems"]]
+    for check in failed:
+        for problem in check["problems"]:
+            _eprint(f"- {check['file']}: {problem}")
+    if failed:
+        _eprint(f"Error: {len(failed)} patch(es) cannot be built, nothing written")
+        return 2
+
+    groups = [
+        {
+            "patches": idxs,
+            "key": _hash_key([BUILD_DB_VERSION] + [patch_keys[i] for i in idxs]),
+            # only the columns the patches wrote; ids are assigned again on merge
+            "columns": {
+                table: [
+                    c
+                    for c in columns[table]
+                    if any(c in (x.lower() for x in reports[i]["columns"].get(table, [])) for i in idxs)
+                ]
+                for table in BUILD_DB_TABLES
+                if table not in BUILD_DB_META_TABLES
+            },
+        }
+        for idxs in _build_db_groups(reports)
+    ]
+    build_key = _hash_key(
+        {"version": BUILD_DB_VERSION, "page_size": page_size, "json": json_keys, "groups": [g["key"] for g in groups]}
+    )
+    result: dict[str, Any] = {
+        "out": str(out_path),
+        "page_size": page_size,
+        "books": len(meta_rows["kotob"]),
+        "patches": [{"book_id": b, "file": p.name} for b, p in book_patches],
+        "missing": missing,
+        "groups": len(groups),
+        "groups_cached": 0,
+        "up_to_date": False,
+    }
 
-    if insert_content_count > 0 and delete_content_count == 0:
-        print("Warning: INSERT exists but DELETE for content is missing (risk of duplicates).")
-    if begin_count == 0 or commit_count == 0:
-        print("Warning: transaction markers are incomplete.")
+    old_output = manifest.get("output", {})
+    if out_path.exists() and old_output.get("key") == build_key and old_output.get("path") == str(out_path):
+        out_fp = _file_fingerprint(out_path, old_output.get("fingerprint"))
+        if out_fp["sha256"] == old_output.get("fingerprint", {}).get("sha256"):
+            result.update(up_to_date=True, groups_cached=len(groups), sha256=out_fp["sha256"], size=out_fp["size"])
+            result["seconds"] = round(time.perf_counter() - t0, 3)
+            if as_json:
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+            else:
+                print(f"{out_path} is up to date ({len(book_patches)} patch(es), nothing changed)")
+            return 0
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    old_groups = manifest.get("groups", {})
+    todo = [g for g in groups if not (g["key"] in old_groups and (cache_dir / f"{g['key']}.db").is_file())]
+    result["groups_cached"] = len(groups) - len(todo)
+    g0 = time.perf_counter()
+    try:
+        group_paths = [[book_patches[i][1] for i in g["patches"]] for g in todo]
+        group_dbs = [cache_dir / f"{g['key']}.db" for g in todo]
+        if jobs <= 1 or len(todo) <= 1:
+            counts = [_build_db_group(p, db) for p, db in zip(group_paths, group_dbs)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+                counts = list(pool.map(_build_db_group, group_paths, group_dbs))
+    except (OSError, ValueError, RuntimeError, sqlite3.Error) as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    group_counts = {g["key"]: old_groups.get(g["key"]) for g in groups}
+    group_counts.update({g["key"]: c for g, c in zip(todo, counts)})
+    say(f"Replayed {len(todo)} of {len(groups)} patch group(s) in {time.perf_counter() - g0:.2f}s")
+
+    # Merge in book order into a staging file, then VACUUM INTO writes the
+    # compact output with the requested page size.
+    staging = cache_dir / "staging.db"
+    staging.unlink(missing_ok=True)
+    m0 = time.perf_counter()
+    conn = sqlite3.connect(str(staging), isolation_level=None)
+    try:
+        conn.execute(f"PRAGMA page_size = {int(page_size)}")
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("BEGIN")
+        for ddl in BUILD_DB_TABLES.values():
+            conn.execute(ddl)
+        for table, rows in meta_rows.items():
+            cols = columns[table][1:] if table == "content_audio" else columns[table]
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})", rows
+            )
+        conn.execute("COMMIT")
+        for group in groups:
+            conn.execute("ATTACH DATABASE ? AS g", (str(cache_dir / f"{group['key']}.db"),))
+            conn.execute("BEGIN")
+            for table, cols in group["columns"].items():
+                if cols:
+                    names = ", ".join(cols)
+                    conn.execute(f"INSERT INTO main.{table} ({names}) SELECT {names} FROM g.{table} ORDER BY rowid")
+            conn.execute("COMMIT")
+            conn.execute("DETACH DATABASE g")
+        conn.execute("BEGIN")
+        for ddl in BUILD_DB_INDEXES:
+            conn.execute(ddl)
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE main")
+        rows = {t: _fetch_count(conn, t) for t in BUILD_DB_TABLES}
+        with atomic_io.atomic_path(out_path) as tmp_path:
+            conn.execute("VACUUM INTO ?", (str(tmp_path),))
+    except (OSError, sqlite3.Error) as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    finally:
+        conn.close()
+        staging.unlink(missing_ok=True)
+    out_fp = _file_fingerprint(out_path, None)
+
+    for stale in cache_dir.glob("*.db"):
+        if stale.stem not in group_counts:
+            stale.unlink(missing_ok=True)
+    _save_doctor_cache(
+        manifest_path,
+        {
+            "version": BUILD_DB_VERSION,
+            "files": files,
+            "scans": {key: report for key, report in zip(patch_keys, reports)},
+            "groups": group_counts,
+            "output": {"path": str(out_path), "key": build_key, "fingerprint": out_fp},
+        },
+    )
 
+    result.update(rows=rows, sha256=out_fp["sha256"], size=out_fp["size"])
+    result["merge_seconds"] = round(time.perf_counter() - m0, 3)
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    if as_json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    print(f"Out: {out_path} ({out_fp['size']} bytes, page_size={page_size})")
+    print(
+        f"- books: {result['books']}, patches: {len(book_patches)} in {len(groups)} group(s), "
+        f"{result['groups_cached']} from cache, missing: {len(missing)}"
+    )
+    print("- rows: " + ", ".join(f"{t}={n}" for t, n in rows.items()))
+    print(f"- sha256: {out_fp['sha256']}")
+    print(f"- {result['seconds']:.2f}s (merge {result['merge_seconds']:.2f}s)")
     return 0
 
 
@@ -500,14 +3665,90 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_doctor = sub.add_parser("doctor", help="Analyze metadata + SQLite consistency")
     p_doctor.add_argument("--db", default=None, help="Path to books.db")
+    p_doctor.add_argument(
+        "--fast",
+        action="store_true",
+        help="Create a (kotob_id, chapters_id) index on content if missing (writes to the DB) and show timings",
+    )
+    p_doctor.add_argument("--timings", action="store_true", help="Print time spent per check")
+    p_doctor.add_argument("--format", choices=("text", "json"), default="text", help="Output format (default: text)")
+    p_doctor.add_argument(
+        "--sql-dir",
+        default=None,
+        help="Also replay every SQL patch in this directory into a scratch schema and check it",
+    )
+    p_doctor.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for --sql-dir (default: CPU count)",
+    )
+    p_doctor.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Recompute everything and leave {DOCTOR_CACHE_DIR}/ untouched",
+    )
+    p_doctor.add_argument(
+        "--explain",
+        action="store_true",
+        help="Show EXPLAIN QUERY PLAN for the app's hot queries and flag full table scans",
+    )
+    p_doctor.add_argument("--queries", default=None, help="JSON file of hot queries replacing the built-in set")
 
     p_export = sub.add_parser("export-sql", help="Export one book content from DB to SQL patch")
     p_export.add_argument("--db", required=True, help="Path to books.db")
-    p_export.add_argument("--book-id", required=True, type=int, help="Book ID (kotob_id)")
+    p_export.add_argument(
+        "--book-id",
+        action="append",
+        type=int,
+        default=[],
+        help="Book ID (kotob_id); repeat to export several books in one pass. Text spellings "
+        "('3', ' 3') come from an index on content(kotob_id) if there is one (doctor --fast), "
+        "else are matched in the one scan of content",
+    )
+    p_export.add_argument(
+        "--all-local-only",
+        action="store_true",
+        help="Export every DB book that is missing from books_metadata.json",
+    )
     p_export.add_argument(
         "--out",
-        required=True,
-        help="Output SQL file path",
+        default=None,
+        help="Output SQL file path (single book only)",
+    )
+    p_export.add_argument(
+        "--out-dir",
+        default=None,
+        help="Output directory for multi-book exports (default: <repo>/kotob)",
+    )
+    p_export.add_argument(
+        "--jobs",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="Worker threads for multi-book exports",
+    )
+    p_export.add_argument(
+        "--insert-batch",
+        type=int,
+        default=1,
+        help=f"Rows per multi-row INSERT (max {SQL_INSERT_MAX_ROWS}; statements stay under "
+        f"{SQL_MAX_STATEMENT_BYTES} bytes)",
+    )
+    p_export.add_argument(
+        "--compact",
+        action="store_true",
+        help="Omit the column list; refused unless the DB's content columns are in the books.db order",
+    )
+    p_export.add_argument(
+        "--compress",
+        choices=sorted(COMPRESS_SUFFIXES),
+        default=None,
+        help="Write a compressed patch (.sql.gz, or .sql.zst with the zstandard package)",
+    )
+    p_export.add_argument(
+        "--measure-import",
+        action="store_true",
+        help="Single book: compare size and scratch-DB import time with the one-row-per-INSERT format",
     )
     p_export.add_argument(
         "--meta-out",
@@ -515,8 +3756,123 @@ def build_parser() -> argparse.ArgumentParser:
         help="Optional output path for metadata JSON snippet of this book",
     )
 
+    p_pack = sub.add_parser("export-db", help="Export one book as a standalone SQLite pack (.db)")
+    p_pack.add_argument("--db", required=True, help="Path to books.db")
+    p_pack.add_argument("--book-id", required=True, type=int, help="Book ID (kotob_id)")
+    p_pack.add_argument("--out", default=None, help="Output .db path (default: <repo>/kotob/book_<id>.db)")
+    p_pack.add_argument(
+        "--page-size",
+        type=int,
+        choices=PACK_PAGE_SIZES,
+        default=4096,
+        help="SQLite page size of the pack (default: 4096)",
+    )
+    p_pack.add_argument("--meta-out", default=None, help="Optional output path for the pack metadata JSON")
+
+    p_diff = sub.add_parser("diff-sql", help="Emit a minimal UPDATE/INSERT/DELETE patch between two book versions")
+    diff_old = p_diff.add_mutually_exclusive_group(required=True)
+    diff_old.add_argument("--old", help="Old SQL patch (.sql/.sql.gz/.sql.zst)")
+    diff_old.add_argument("--db", help="Use this books.db as the old side (needs --book-id)")
+    p_diff.add_argument("--book-id", type=int, default=None, help="Book ID (kotob_id) when the old side is --db")
+    p_diff.add_argument("--new", required=True, help="New SQL patch")
+    p_diff.add_argument("--out", required=True, help="Output path for the delta patch")
+
     p_inspect = sub.add_parser("inspect-sql", help="Inspect SQL patch file quickly")
-    p_inspect.add_argument("--sql", required=True, help="Path to SQL file")
+    inspect_src = p_inspect.add_mutually_exclusive_group(required=True)
+    inspect_src.add_argument("--sql", help="Path to SQL file")
+    inspect_src.add_argument("--dir", help="Inspect every .sql/.sql.gz/.sql.zst patch in this directory")
+    p_inspect.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for --dir (default: CPU count)",
+    )
+    p_inspect.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    p_import = sub.add_parser(
+        "import-audio",
+        help="Insert/update content_audio_metadata.json rows from CSV or JSON in one atomic write",
+    )
+    import_src = p_import.add_mutually_exclusive_group(required=True)
+    import_src.add_argument("--csv", help="CSV with a header row (kotob_id,chapters_id,lang,narrator,title,url)")
+    import_src.add_argument("--json-rows", help="JSON array of row objects")
+    p_import.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    p_import.add_argument("--strict", action="store_true", help="Write nothing if any row is rejected")
+    p_import.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    p_apply = sub.add_parser(
+        "apply-sql",
+        help="Load SQL patches into books.db: one transaction per patch, tuned PRAGMAs, checks first",
+    )
+    p_apply.add_argument("--db", required=True, help="Path to books.db (modified in place)")
+    p_apply.add_argument("sql", nargs="+", help="Patch files or directories of patches, applied in the given order")
+    p_apply.add_argument(
+        "--indexes",
+        choices=SQL_APPLY_INDEX_MODES,
+        default="auto",
+        help="Drop non-unique indexes during the load and rebuild them after "
+        "(auto: only when the patches insert more rows than the table holds)",
+    )
+    p_apply.add_argument("--force", action="store_true", help="Apply even if the checks report problems")
+    p_apply.add_argument("--dry-run", action="store_true", help="Only run the checks")
+    p_apply.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for the checks (default: CPU count)",
+    )
+    p_apply.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    p_search = sub.add_parser(
+        "build-search-index",
+        help="Build or incrementally update the FTS5 full-text index used by the panel's /search page",
+    )
+    search_src = p_search.add_mutually_exclusive_group(required=True)
+    search_src.add_argument("--db", help="Index the content table of this books.db")
+    search_src.add_argument("--sql-dir", help="Index what every SQL patch in this directory leaves in content")
+    p_search.add_argument(
+        "--out",
+        default=None,
+        help=f"Index file (default: <repo>/{DOCTOR_CACHE_DIR}/{SEARCH_INDEX_FILE})",
+    )
+    p_search.add_argument("--full", action="store_true", help="Discard the existing index and rebuild it")
+    p_search.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    p_optimize = sub.add_parser(
+        "optimize-db",
+        help="Create the indexes the hot queries miss, run ANALYZE + PRAGMA optimize, time each query before/after",
+    )
+    p_optimize.add_argument("--db", required=True, help="Path to books.db (modified in place)")
+    p_optimize.add_argument("--queries", default=None, help="JSON file of hot queries replacing the built-in set")
+    p_optimize.add_argument("--repeat", type=int, default=5, help="Timed runs per query; the best counts (default: 5)")
+    p_optimize.add_argument("--dry-run", action="store_true", help="Only show plans, timings and missing indexes")
+    p_optimize.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    p_build = sub.add_parser(
+        "build-db",
+        help="Build books.db from the JSON metadata and the kotob/ patches it references, reproducibly",
+    )
+    p_build.add_argument("--out", required=True, help="Output DB path (replaced atomically)")
+    p_build.add_argument(
+        "--page-size",
+        type=int,
+        choices=PACK_PAGE_SIZES,
+        default=4096,
+        help="SQLite page size of the output (default: 4096)",
+    )
+    p_build.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for scanning and replaying patches (default: CPU count)",
+    )
+    p_build.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Ignore {DOCTOR_CACHE_DIR}/{BUILD_DB_CACHE_DIR} and replay every patch",
+    )
+    p_build.add_argument("--strict", action="store_true", help="Fail if a referenced patch is not in kotob/")
+    p_build.add_argument("--json", action="store_true", help="Print the report as JSON")
 
     return parser
 
@@ -527,19 +3883,159 @@ def main() -> int:
 
     repo_root = Path(args.repo_root).resolve()
 
+    hot_queries: Iterable[dict[str, Any]] = HOT_QUERIES
+    if getattr(args, "queries", None):
+        try:
+            hot_queries = load_hot_queries(Path(args.queries).expanduser().resolve())
+        except (OSError, ValueError) as exc:
+            _eprint(f"Error: {exc}")
+            return 2
+
     if args.command == "doctor":
         db_arg = Path(args.db).expanduser().resolve() if args.db else _pick_default_db(repo_root).resolve()
-        return run_doctor(repo_root=repo_root, db_path=db_arg)
+        return run_doctor(
+            repo_root=repo_root,
+            db_path=db_arg,
+            fast=args.fast,
+            show_timings=args.timings,
+            output_format=args.format,
+            use_cache=not args.no_cache,
+            sql_dir=Path(args.sql_dir).expanduser().resolve() if args.sql_dir else None,
+            jobs=args.jobs,
+            explain=args.explain,
+            hot_queries=hot_queries,
+        )
+
+    if args.command == "optimize-db":
+        return run_optimize_db(
+            db_path=Path(args.db).expanduser().resolve(),
+            hot_queries=hot_queries,
+            repeat=args.repeat,
+            dry_run=args.dry_run,
+            as_json=args.json,
+        )
 
     if args.command == "export-sql":
         db_path = Path(args.db).expanduser().resolve()
-        out_path = Path(args.out).expanduser().resolve()
+        if args.compress == "zst":
+            try:
+                _load_zstandard()
+            except RuntimeError as exc:
+                _eprint(f"Error: {exc}")
+                return 2
+        if len(args.book_id) == 1 and not args.all_local_only and args.out:
+            out_path = Path(args.out).expanduser().resolve()
+            meta_out = Path(args.meta_out).expanduser().resolve() if args.meta_out else None
+            return run_export_sql(
+                db_path=db_path,
+                book_id=args.book_id[0],
+                out_path=out_path,
+                meta_out=meta_out,
+                insert_batch=args.insert_batch,
+                compact=args.compact,
+                measure_import=args.measure_import,
+                compress=args.compress,
+            )
+        if args.out or args.meta_out:
+            parser.error("--out/--meta-out need exactly one --book-id; use --out-dir for several books")
+        if args.measure_import:
+            parser.error("--measure-import needs exactly one --book-id and --out")
+        if not args.book_id and not args.all_local_only:
+            parser.error("export-sql needs --book-id or --all-local-only")
+        out_dir = Path(args.out_dir).expanduser().resolve() if args.out_dir else repo_root / "kotob"
+        return run_export_sql_many(
+            repo_root=repo_root,
+            db_path=db_path,
+            book_ids=args.book_id,
+            all_local_only=args.all_local_only,
+            out_dir=out_dir,
+            jobs=args.jobs,
+            insert_batch=args.insert_batch,
+            compact=args.compact,
+            compress=args.compress,
+        )
+
+    if args.command == "export-db":
+        db_path = Path(args.db).expanduser().resolve()
+        out_path = (
+            Path(args.out).expanduser().resolve() if args.out else repo_root / "kotob" / f"book_{args.book_id}.db"
+        )
         meta_out = Path(args.meta_out).expanduser().resolve() if args.meta_out else None
-        return run_export_sql(db_path=db_path, book_id=args.book_id, out_path=out_path, meta_out=meta_out)
+        return run_export_db(
+            db_path=db_path,
+            book_id=args.book_id,
+            out_path=out_path,
+            page_size=args.page_size,
+            meta_out=meta_out,
+        )
+
+    if args.command == "diff-sql":
+        if args.db and args.book_id is None:
+            parser.error("diff-sql --db needs --book-id")
+        return run_diff_sql(
+            old_sql=Path(args.old).expanduser().resolve() if args.old else None,
+            db_path=Path(args.db).expanduser().resolve() if args.db else None,
+            book_id=args.book_id,
+            new_sql=Path(args.new).expanduser().resolve(),
+            out_path=Path(args.out).expanduser().resolve(),
+        )
 
     if args.command == "inspect-sql":
+        if args.dir:
+            sql_dir = Path(args.dir).expanduser().resolve()
+            return run_inspect_sql_dir(sql_dir=sql_dir, jobs=args.jobs, as_json=args.json)
         sql_path = Path(args.sql).expanduser().resolve()
-        return run_inspect_sql(sql_path=sql_path)
+        return run_inspect_sql(sql_path=sql_path, as_json=args.json)
+
+    if args.command == "import-audio":
+        return run_import_audio(
+            repo_root=repo_root,
+            src_path=Path(args.csv or args.json_rows).expanduser().resolve(),
+            src_format="csv" if args.csv else "json",
+            dry_run=args.dry_run,
+            strict=args.strict,
+            as_json=args.json,
+        )
+
+    if args.command == "apply-sql":
+        sql_paths: list[Path] = []
+        for raw in args.sql:
+            path = Path(raw).expanduser().resolve()
+            sql_paths.extend(sql_patch_files(path) if path.is_dir() else [path])
+        return run_apply_sql(
+            db_path=Path(args.db).expanduser().resolve(),
+            sql_paths=sql_paths,
+            jobs=args.jobs,
+            indexes=args.indexes,
+            force=args.force,
+            dry_run=args.dry_run,
+            as_json=args.json,
+        )
+
+    if args.command == "build-search-index":
+        out_path = (
+            Path(args.out).expanduser().resolve()
+            if args.out
+            else repo_root / DOCTOR_CACHE_DIR / SEARCH_INDEX_FILE
+        )
+        return run_build_search_index(
+            out_path=out_path,
+            db_path=Path(args.db).expanduser().resolve() if args.db else None,
+            sql_dir=Path(args.sql_dir).expanduser().resolve() if args.sql_dir else None,
+            full=args.full,
+            as_json=args.json,
+        )
+
+    if args.command == "build-db":
+        return run_build_db(
+            repo_root=repo_root,
+            out_path=Path(args.out).expanduser().resolve(),
+            page_size=args.page_size,
+            jobs=args.jobs,
+            use_cache=not args.no_cache,
+            strict=args.strict,
+            as_json=args.json,
+        )
 
     return 1
 
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Move metadata and book files into json/, update/ and kotob/ and fix raw SQL links.
+
+Used by `kdini reorganize` and the control panel. Tracked files are renamed
+on disk and recorded with a single `git update-index --index-info` call instead
+of one `git mv` per file.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Callable
+
+import atomic_io
+
+BOOKS_JSON_REL = "json/books_metadata.json"
+URL_KEYS = ("sql_download_url", "download_url", "url")
+RAW_SQL_PATTERN = re.compile(
+    r"(https://raw\.githubusercontent\.com/kerim317gh/kdini/refs/heads/main/)(?!kotob/)([^\"\s]+\.(?:sql|sql\.gz|db))"
+)
+# Root-level files and the directory each belongs in.
+ROOT_FILES = {
+    "books_metadata.json": "json",
+    "content_audio_metadata.json": "json",
+    "structure_metadata.json": "json",
+    "update.json": "update",
+}
+BOOK_FILE_SUFFIXES = (".sql", ".sql.gz", ".db")
+BOOK_DIR = "kotob"
+
+
+def _eprint(msg: str) -> None:
+    print(msg, file=sys.stderr)
+
+
+def plan_moves(repo_dir: Path) -> tuple[list[tuple[str, str]], list[dict[str, str]]]:
+    """(moves, skipped): repo-relative (src, dst) pairs, and moves refused because dst exists."""
+    moves: list[tuple[str, str]] = []
+    skipped: list[dict[str, str]] = []
+    for entry in sorted(repo_dir.iterdir(), key=lambda p: p.name):
+        if not entry.is_file():
+            continue
+        if entry.name in ROOT_FILES:
+            dst = f"{ROOT_FILES[entry.name]}/{entry.name}"
+        elif entry.name.endswith(BOOK_FILE_SUFFIXES):
+            dst = f"{BOOK_DIR}/{entry.name}"
+        else:
+            continue
+        if (repo_dir / dst).exists():
+            skipped.append({"from": entry.name, "to": dst, "reason": "destination exists"})
+        else:
+            moves.append((entry.name, dst))
+    return moves, skipped
+
+
+def _tracked_entries(repo_dir: Path, paths: list[str]) -> dict[str, tuple[str, str, str]]:
+    """path -> (mode, object, stage) for the paths that are in the git index."""
+    if not paths:
+        return {}
+    proc = subprocess.run(
+        ["git", "ls-files", "-s", "-z", "--", *paths],
+        cwd=repo_dir,
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        return {}
+    entries: dict[str, tuple[str, str, str]] = {}
+    for record in proc.stdout.decode("utf-8").split("\0"):
+        if not record:
+            continue
+        meta, path = record.split("\t", 1)
+        mode, obj, stage = meta.split(" ")
+        entries[path] = (mode, obj, stage)
+    return entries
+
+
+def move_files(repo_dir: Path, moves: list[tuple[str, str]], log: Callable[[str], None]) -> None:
+    """Rename files, then record every tracked rename in the index with one update-index call."""
+    tracked = _tracked_entries(repo_dir, [src for src, _ in moves])
+    done: list[tuple[str, str]] = []
+    try:
+        for src, dst in moves:
+            (repo_dir / dst).parent.mkdir(parents=True, exist_ok=True)
+            os.rename(repo_dir / src, repo_dir / dst)
+            done.append((src, dst))
+            log(f"{'git mv' if src in tracked else 'mv'} {src} -> {dst}")
+        index_info = "".join(
+            f"0 {'0' * len(tracked[src][1])}\t{src}\n{tracked[src][0]} {tracked[src][1]} {tracked[src][2]}\t{dst}\n"
+            for src, dst in done
+            if src in tracked
+        )
+        if index_info:
+            proc = subprocess.run(
+                ["git", "update-index", "--index-info"],
+                cwd=repo_dir,
+                input=index_info.encode("utf-8"),
+                capture_output=True,
+                check=False,
+            )
+            if proc.returncode != 0:
+                raise RuntimeError(f"git update-index failed: {proc.stderr.decode('utf-8', 'replace').strip()}")
+    except BaseException:
+        for src, dst in reversed(done):
+            os.rename(repo_dir / dst, repo_dir / src)
+        raise
+
+
+def book_url_changes(books: Any) -> list[dict[str, Any]]:
+    """Raw GitHub SQL links that point outside kotob/, with their rewritten form."""
+    changes: list[dict[str, Any]] = []
+    if not isinstance(books, list):
+        return changes
+    for idx, row in enumerate(books):
+        if not isinstance(row, dict):
+            continue
+        for key in URL_KEYS:
+            value = row.get(key)
+            if isinstance(value, str):
+                new_value = RAW_SQL_PATTERN.sub(r"\1kotob/\2", value)
+                if new_value != value:
+                    changes.append({"idx": idx, "key": key, "old": value, "new": new_value})
+    return changes
+
+
+def apply_book_url_changes(books: list[Any], changes: list[dict[str, Any]]) -> None:
+    for change in changes:
+        books[change["idx"]][change["key"]] = change["new"]
+
+
+def _load_books_file(repo_dir: Path, rel_path: str) -> Any:
+    with (repo_dir / rel_path).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_books_file(repo_dir: Path, rel_path: str, data: Any) -> None:
+    atomic_io.atomic_write_text(repo_dir / rel_path, json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+
+
+def reorganize(
+    repo_dir: Path,
+    log: Callable[[str], None],
+    dry_run: bool = False,
+    load_books: Callable[[str], Any] | None = None,
+    save_books: Callable[[str, Any], None] | None = None,
+) -> dict[str, Any]:
+    """Plan (and unless dry_run, apply) the moves and URL rewrites; returns the report.
+
+    load_books/save_books default to reading and atomically writing the file;
+    the panel passes its own so the rewrite goes through its JSON store and locks.
+    """
+    load = load_books or (lambda rel: _load_books_file(repo_dir, rel))
+    save = save_books or (lambda rel, data: _save_books_file(repo_dir, rel, data))
+
+    moves, skipped = plan_moves(repo_dir)
+    for item in skipped:
+        log(f"skip {item['from']}: {item['to']} already exists")
+    if dry_run:
+        for src, dst in moves:
+            log(f"would move {src} -> {dst}")
+    else:
+        for name in ("json", "update", BOOK_DIR):
+            (repo_dir / name).mkdir(exist_ok=True)
+        move_files(repo_dir, moves, log)
+
+    # In a dry run the books file may still be at the root, waiting to be moved.
+    books_rel = BOOKS_JSON_REL
+    if dry_run and not (repo_dir / books_rel).exists():
+        books_rel = next((src for src, dst in moves if dst == BOOKS_JSON_REL), books_rel)
+    url_changes: list[dict[str, Any]] = []
+    if (repo_dir / books_rel).exists():
+        books = load(books_rel)
+        url_changes = book_url_changes(books)
+        for change in url_changes:
+            log(f"{'would fix' if dry_run else 'fix'} {books_rel}[{change['idx']}].{change['key']}: {change['new']}")
+        if url_changes and not dry_run:
+            apply_book_url_changes(books, url_changes)
+            save(books_rel, books)
+
+    suffix = " (dry run)" if dry_run else ""
+    log(f"Moves: {len(moves)}, skipped: {len(skipped)}, URL fixes: {len(url_changes)}{suffix}")
+    return {
+        "dry_run": dry_run,
+        "moves": [{"from": src, "to": dst} for src, dst in moves],
+        "skipped": skipped,
+        "url_changes": url_changes,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--repo-root",
+        default=str(Path(__file__).resolve().parent.parent),
+        help="Path to kdini_manage_clone root (default: parent of tools)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only report planned moves and URL changes")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    repo_dir = Path(args.repo_root).resolve()
+    log: Callable[[str], None] = (lambda line: None) if args.json else print
+    try:
+        report = reorganize(repo_dir, log, dry_run=args.dry_run)
+    except (OSError, ValueError, RuntimeError) as exc:
+        _eprint(f"Error: {exc}")
+        return 2
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif not args.dry_run:
+        print("Reorganization finished.")
+        subprocess.run(["git", "status", "--short"], cwd=repo_dir, check=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())